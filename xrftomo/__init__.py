@@ -44,8 +44,21 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+from xrftomo.precision import *
+from xrftomo.shift import *
+from xrftomo.registration import *
+from xrftomo.hotspot import *
+from xrftomo.reprojection import *
+from xrftomo.projection_matching import *
+from xrftomo.history import *
+from xrftomo.file_io.metadata_index import *
 from xrftomo.file_io.reader import *
 from xrftomo.file_io.writer import *
+from xrftomo.file_io.exporter import *
+from xrftomo.file_io.loader import *
+from xrftomo.file_io.lazy_stack import *
+from xrftomo.file_io.project import *
+from xrftomo.file_io.recon_sink import *
 
 from xrftomo.reco import *
 from xrftomo.elements import *
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Benchmark and mask regression check of the hotspot engine against the
+generic_filter implementations previously used by
+ImageProcessActions.remove_hotspot_blend and remove_hotspot_roi.
+
+Run with::
+
+    python -m xrftomo.benchmark.hotspot
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from scipy import ndimage as ndi
+
+from xrftomo.hotspot import ROI_HOTSPOT_THRESHOLDS, hotspot_thresholds, relax_thresholds, remove_hotspots, remove_hotspots_stack
+from xrftomo.benchmark.precision import make_stack, time_call
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+def hotspot_stack(num_projections, shape, dtype, num_hotspots=12, seed=2):
+    """
+    Smooth positive projections [projection, y, x] with single pixel and
+    small cluster hotspots
+    """
+    rng = np.random.default_rng(seed)
+    stack = make_stack((1, num_projections) + tuple(shape), 'float64', seed)[0]*100 + 10
+    for i in range(num_projections):
+        rows = rng.integers(2, shape[0]-2, num_hotspots)
+        cols = rng.integers(2, shape[1]-2, num_hotspots)
+        for j, (row, col) in enumerate(zip(rows, cols)):
+            size = 1 + j % 3
+            stack[i, row:row+size, col:col+size] *= rng.uniform(3, 20)
+    return stack.astype(dtype)
+
+
+def _valid(window):
+    window = window.flatten()
+    return window[~np.isnan(window)]
+
+def _neighbors(window):
+    center_idx = window.size // 2
+    return _valid(np.concatenate([window.flatten()[:center_idx], window.flatten()[center_idx+1:]]))
+
+def median_ignore_nan(window):
+    valid_values = _valid(window)
+    return np.median(valid_values) if len(valid_values) > 0 else np.nan
+
+def mean_ignore_nan(window):
+    valid_values = _valid(window)
+    return np.mean(valid_values) if len(valid_values) > 0 else np.nan
+
+def std_ignore_nan(window):
+    valid_values = _valid(window)
+    return np.std(valid_values) if len(valid_values) > 1 else 0.0
+
+def median_exclude_center(window):
+    valid_values = _neighbors(window)
+    return np.median(valid_values) if len(valid_values) > 0 else np.nan
+
+def std_exclude_center(window):
+    valid_values = _neighbors(window)
+    return np.std(valid_values) if len(valid_values) > 1 else 0.0
+
+
+def generic_blend(img, mask, size):
+    temp_img = img.copy()
+    temp_img[mask] = np.nan
+    blended_img = ndi.generic_filter(temp_img, median_ignore_nan, size=size, mode='nearest')
+    nan_mask = np.isnan(blended_img) & mask
+    if np.any(nan_mask):
+        blended_img[nan_mask] = ndi.generic_filter(temp_img, mean_ignore_nan, size=size, mode='nearest')[nan_mask]
+    return blended_img
+
+def generic_remove_hotspots(img, thresholds, kernel_sizes=(3, 5, 7, 11), expansions=3, blend_size=7, iterations=3):
+    """
+    Per-pixel generic_filter loop of remove_hotspot_blend for one projection
+
+    Returns
+    -------
+    img : ndarray
+        cleaned copy of the projection
+    masks : list
+        hotspot mask of every iteration that replaced pixels
+    """
+    img = img.copy()
+    masks = []
+    max_val_before = np.max(img)
+    z_high, z_medium, z_very_high, gradient, absolute_diff = thresholds
+    for iteration in range(iterations):
+        hotspot_mask = np.zeros(img.shape, dtype=bool)
+        for kernel_size in kernel_sizes:
+            local_median = ndi.generic_filter(img, median_exclude_center, size=kernel_size, mode='nearest')
+            local_std = np.maximum(ndi.generic_filter(img, std_exclude_center, size=kernel_size, mode='nearest'), 1e-10)
+            z_score = (img - local_median) / local_std
+            local_hotspot = z_score > z_high
+            min_absolute_diff = np.maximum(local_median * absolute_diff, local_std * 2.0)
+            local_hotspot = local_hotspot | ((img - local_median) > min_absolute_diff)
+            grad_y = ndi.sobel(img, axis=0, mode='nearest')
+            grad_x = ndi.sobel(img, axis=1, mode='nearest')
+            high_gradient = np.sqrt(grad_x**2 + grad_y**2) / (local_median + 1e-10) > gradient
+            local_hotspot = local_hotspot | (high_gradient & (z_score > z_medium)) | (z_score > z_very_high)
+            max_neighbor = ndi.maximum_filter(img, size=kernel_size, mode='nearest')
+            high_relative_to_max = (img > local_median * 2.0) & (img > max_neighbor * 0.98)
+            hotspot_mask = hotspot_mask | local_hotspot | (high_relative_to_max & (z_score > z_medium))
+
+        for expand_iter in range(expansions):
+            if not np.any(hotspot_mask):
+                break
+            non_hotspot_img = img.copy()
+            non_hotspot_img[hotspot_mask] = np.nan
+            local_median_safe = ndi.generic_filter(non_hotspot_img, median_ignore_nan, size=5, mode='nearest')
+            local_std_safe = np.maximum(ndi.generic_filter(non_hotspot_img, std_ignore_nan, size=5, mode='nearest'), 1e-10)
+            adjacent_pixels = ndi.binary_dilation(hotspot_mask, structure=np.ones((3, 3))) & ~hotspot_mask
+            if not np.any(adjacent_pixels):
+                break
+            z_score_adjacent = (img - local_median_safe) / local_std_safe
+            suspicious_adjacent = adjacent_pixels & (z_score_adjacent > max(2.0, z_medium - (iteration * 0.2)))
+            suspicious_adjacent = suspicious_adjacent & (img > local_median_safe + 2.0 * local_std_safe)
+            if not np.any(suspicious_adjacent):
+                break
+            hotspot_mask = hotspot_mask | suspicious_adjacent
+
+        if not np.any(hotspot_mask):
+            break
+        blended_img = generic_blend(img, hotspot_mask, blend_size)
+        nan_mask = np.isnan(blended_img) & hotspot_mask
+        if np.any(nan_mask):
+            blended_img[nan_mask] = ndi.uniform_filter(img, size=blend_size, mode='nearest')[nan_mask]
+        img[hotspot_mask] = blended_img[hotspot_mask]
+        masks.append(hotspot_mask)
+
+        max_val_after = np.max(img)
+        if max_val_after < max_val_before:
+            max_val_before = max_val_after
+        elif iteration < iterations - 1:
+            thresholds = relax_thresholds(thresholds)
+            z_high, z_medium, z_very_high, gradient, absolute_diff = thresholds
+        else:
+            y_max, x_max = np.unravel_index(np.argmax(img), img.shape)
+            force_mask = np.zeros(img.shape, dtype=bool)
+            force_mask[max(0, y_max - 2):y_max + 3, max(0, x_max - 2):x_max + 3] = True
+            img[force_mask] = generic_blend(img, force_mask, blend_size)[force_mask]
+    return img, masks
+
+
+def roi_options(shape):
+    """
+    Kernel and blend sizes remove_hotspot_roi uses for an ROI of this shape
+
+    Returns
+    -------
+    kernel_sizes : list
+    blend_size : int
+    """
+    kernel_sizes = [3, 5]
+    if min(shape) > 15:
+        kernel_sizes.append(7)
+    kernel_sizes = [kernel_size for kernel_size in kernel_sizes if kernel_size <= min(shape)]
+    blend_size = min(7, min(shape) // 2 * 2 - 1) if min(shape) > 7 else 3
+    return kernel_sizes, blend_size
+
+def generic_remove_hotspots_roi(roi, thresholds=ROI_HOTSPOT_THRESHOLDS, iterations=3):
+    """
+    Per-pixel generic_filter loop of remove_hotspot_roi for one ROI: no
+    neighbourhood maximum test, two expansion passes whose threshold drops
+    per pass, and a blend kernel sized to the ROI
+
+    Returns
+    -------
+    roi : ndarray
+        cleaned copy of the ROI
+    masks : list
+        hotspot mask of every iteration that replaced pixels
+    """
+    roi = roi.copy()
+    masks = []
+    max_val_before = np.max(roi)
+    kernel_sizes, blend_size = roi_options(roi.shape)
+    z_high, z_medium, z_very_high, gradient, absolute_diff = thresholds
+    for iteration in range(iterations):
+        hotspot_mask = np.zeros(roi.shape, dtype=bool)
+        for kernel_size in kernel_sizes:
+            local_median = ndi.generic_filter(roi, median_exclude_center, size=kernel_size, mode='nearest')
+            local_std = np.maximum(ndi.generic_filter(roi, std_exclude_center, size=kernel_size, mode='nearest'), 1e-10)
+            z_score = (roi - local_median) / local_std
+            local_hotspot = z_score > z_high
+            min_absolute_diff = np.maximum(local_median * absolute_diff, local_std * 2.0)
+            local_hotspot = local_hotspot | ((roi - local_median) > min_absolute_diff)
+            grad_y = ndi.sobel(roi, axis=0, mode='nearest')
+            grad_x = ndi.sobel(roi, axis=1, mode='nearest')
+            high_gradient = np.sqrt(grad_x**2 + grad_y**2) / (local_median + 1e-10) > gradient
+            hotspot_mask = hotspot_mask | local_hotspot | (high_gradient & (z_score > z_medium)) | (z_score > z_very_high)
+
+        for expand_iter in range(2):
+            if not np.any(hotspot_mask):
+                break
+            non_hotspot_roi = roi.copy()
+            non_hotspot_roi[hotspot_mask] = np.nan
+            local_median_safe = ndi.generic_filter(non_hotspot_roi, median_ignore_nan, size=5, mode='nearest')
+            local_std_safe = np.maximum(ndi.generic_filter(non_hotspot_roi, std_ignore_nan, size=5, mode='nearest'), 1e-10)
+            adjacent_pixels = ndi.binary_dilation(hotspot_mask, structure=np.ones((3, 3))) & ~hotspot_mask
+            if not np.any(adjacent_pixels):
+                break
+            z_score_adjacent = (roi - local_median_safe) / local_std_safe
+            suspicious_adjacent = adjacent_pixels & (z_score_adjacent > max(2.0, z_medium - (expand_iter * 0.2)))
+            suspicious_adjacent = suspicious_adjacent & (roi > local_median_safe + 2.0 * local_std_safe)
+            if not np.any(suspicious_adjacent):
+                break
+            hotspot_mask = hotspot_mask | suspicious_adjacent
+
+        if not np.any(hotspot_mask):
+            break
+        blended_roi = generic_blend(roi, hotspot_mask, blend_size)
+        nan_mask = np.isnan(blended_roi) & hotspot_mask
+        if np.any(nan_mask):
+            blended_roi[nan_mask] = ndi.uniform_filter(roi, size=blend_size, mode='nearest')[nan_mask]
+        roi[hotspot_mask] = blended_roi[hotspot_mask]
+        masks.append(hotspot_mask)
+
+        max_val_after = np.max(roi)
+        if max_val_after < max_val_before:
+            max_val_before = max_val_after
+        elif iteration < iterations - 1:
+            z_high, z_medium, z_very_high, gradient, absolute_diff = relax_thresholds((z_high, z_medium, z_very_high, gradient, absolute_diff))
+        else:
+            y_max, x_max = np.unravel_index(np.argmax(roi), roi.shape)
+            force_mask = np.zeros(roi.shape, dtype=bool)
+            force_mask[max(0, y_max - 2):y_max + 3, max(0, x_max - 2):x_max + 3] = True
+            roi[force_mask] = generic_blend(roi, force_mask, blend_size)[force_mask]
+    return roi, masks
+
+def roi_windows(shape):
+    """
+    (y0, y1, x0, x1) ROIs of several sizes, covering every kernel and blend size choice
+    """
+    windows = []
+    for height, width in ((6, 6), (10, 14), (16, 16), (24, 40)):
+        height, width = min(height, shape[0]), min(width, shape[1])
+        y0, x0 = (shape[0]-height)//3, (shape[1]-width)//2
+        windows.append((y0, y0+height, x0, x0+width))
+    return windows
+
+def check(stack, thresholds):
+    """
+    Compare the hotspot masks and cleaned projections of the engine and
+    the generic_filter loop
+
+    Returns
+    -------
+    mismatched : int
+        number of pixels whose hotspot mask differs, over all projections and iterations
+    max_diff : float
+        max abs difference of the cleaned projections
+    """
+    mismatched = 0
+    max_diff = 0.0
+    for image in stack:
+        reference, reference_masks = generic_remove_hotspots(image, thresholds)
+        cleaned, masks = remove_hotspots(image, thresholds)
+        if len(masks) != len(reference_masks):
+            mismatched += image.size
+        for mask, reference_mask in zip(masks, reference_masks):
+            mismatched += int(np.sum(mask != reference_mask))
+        max_diff = max(max_diff, float(np.abs(cleaned - reference).max()))
+    return mismatched, max_diff
+
+def check_roi(stack):
+    """
+    Compare the hotspot masks and cleaned ROIs of the engine, called as
+    remove_hotspot_roi calls it, and the generic_filter ROI loop
+
+    Returns
+    -------
+    mismatched : int
+        number of pixels whose hotspot mask differs, over all ROIs and iterations
+    max_diff : float
+        max abs difference of the cleaned ROIs
+    """
+    mismatched = 0
+    max_diff = 0.0
+    for image in stack:
+        for y0, y1, x0, x1 in roi_windows(image.shape):
+            roi = image[y0:y1, x0:x1]
+            kernel_sizes, blend_size = roi_options(roi.shape)
+            reference, reference_masks = generic_remove_hotspots_roi(roi)
+            cleaned, masks = remove_hotspots(roi, ROI_HOTSPOT_THRESHOLDS, kernel_sizes, neighbor_max=False,
+                                             expansions=2, blend_size=blend_size, relax_per_pass=True)
+            if len(masks) != len(reference_masks):
+                mismatched += roi.size
+            for mask, reference_mask in zip(masks, reference_masks):
+                mismatched += int(np.sum(mask != reference_mask))
+            max_diff = max(max_diff, float(np.abs(cleaned - reference).max()))
+    return mismatched, max_diff
+
+
+def run(num_projections=8, shape=(96, 96), repeats=1, dtype='float32', workers=None):
+    """
+    Time the generic_filter loop and the hotspot engine and check that their
+    masks match, for the whole-projection and the ROI configurations
+
+    Parameters
+    ----------
+    num_projections : int
+        projections in the benchmark stack
+    shape : tuple
+        projection shape [y, x]
+    repeats : int
+        number of timed repetitions, the best time is reported
+    dtype : str
+        dtype of the benchmark stack
+    workers : int, optional
+        threads of remove_hotspots_stack
+
+    Returns
+    -------
+    results : dict
+        {'loop': seconds, 'engine': seconds, 'mismatched': pixels, 'max_diff': float,
+        'roi_mismatched': pixels, 'roi_max_diff': float}
+    """
+    stack = hotspot_stack(num_projections, shape, dtype)
+    thresholds, count = hotspot_thresholds(stack[np.argmax(stack.reshape(len(stack), -1).max(axis=1))])
+    mismatched, max_diff = check(stack, thresholds)
+    roi_mismatched, roi_max_diff = check_roi(stack)
+    results = {"loop": time_call(lambda: [generic_remove_hotspots(image, thresholds) for image in stack], repeats),
+               "engine": time_call(lambda: remove_hotspots_stack(stack, thresholds, workers), repeats),
+               "mismatched": mismatched,
+               "max_diff": max_diff,
+               "roi_mismatched": roi_mismatched,
+               "roi_max_diff": roi_max_diff}
+
+    print("{} stack {}, {} reference hotspot pixels".format(dtype, (num_projections,) + tuple(shape), count))
+    print("{:>12}{:>12}{:>10}{:>14}{:>14}".format("loop (s)", "engine (s)", "speedup", "mask mismatch", "max |diff|"))
+    print("{:>12.3f}{:>12.3f}{:>10.1f}{:>14d}{:>14.2e}".format(results["loop"], results["engine"],
+                                                             results["loop"]/results["engine"], mismatched, max_diff))
+    print("{} ROIs: {} mask mismatch, max |diff| {:.2e}".format(len(stack)*len(roi_windows(shape)), roi_mismatched, roi_max_diff))
+    return results
+
+
+if __name__ == '__main__':
+    run()
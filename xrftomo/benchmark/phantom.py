@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Synthetic multi-element XRF phantoms with known jitter, noise and
+hotspots, written as a series of MAPS-style hdf files that read_mic_xrf
+and the file loader ingest like beamline data.
+
+Run with::
+
+    python -m xrftomo.benchmark.phantom [directory]
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import sys
+import h5py
+import numpy as np
+
+from xrftomo.reco import lamino_project
+from xrftomo.shift import shift_projections
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+ELEMENTS = ("Fe", "Ca", "Zn", "Cu")
+SCALERS = ("SRcurrent", "us_ic", "ds_ic")
+SCALER_VALUES = (102.0, 1.0e5, 5.0e4)
+DATA_TAGS = ("MAPS/XRF_roi", "MAPS/XRF_fits")
+ELEMENT_TAG = "MAPS/channel_names"
+SCALER_TAG = "MAPS/scaler_names"
+THETA_PATH = "MAPS/Scan/Extra_PVs/Values"
+THETA_PV = "2xfm:m60.VAL"
+
+
+def make_phantom(shape=(32, 64), elements=ELEMENTS, num_features=6, seed=0):
+    """
+    Multi-element volume: every element is a set of random ellipsoids inside
+    a cylinder that stays in the field of view at every angle, and the
+    first element also fills the cylinder with a weak matrix signal.
+
+    Parameters
+    ----------
+    shape : tuple
+        (rows, width) of the projections, the volume is [rows, width, width]
+    elements : sequence of str
+        element names, one volume each
+    num_features : int
+        ellipsoids per element
+    seed : int
+        random seed
+
+    Returns
+    -------
+    volume : ndarray
+        4D float32 array [element, z, y, x]
+    """
+    rng = np.random.default_rng(seed)
+    nz, n = shape
+    z, y, x = np.meshgrid(np.linspace(-1, 1, nz), np.linspace(-1, 1, n), np.linspace(-1, 1, n), indexing='ij')
+    support = (x**2 + y**2 < 0.6**2) & (np.abs(z) < 0.8)
+    volume = np.zeros((len(elements), nz, n, n), dtype=np.float32)
+    volume[0][support] = 0.2
+    for e in range(len(elements)):
+        for i in range(num_features):
+            radius = rng.uniform(0, 0.4)
+            angle = rng.uniform(0, 2*np.pi)
+            center = (rng.uniform(-0.6, 0.6), radius*np.sin(angle), radius*np.cos(angle))
+            axes = rng.uniform(0.06, 0.2, 3)
+            inside = ((z - center[0])/axes[0])**2 + ((y - center[1])/axes[1])**2 + ((x - center[2])/axes[2])**2 < 1
+            volume[e][inside & support] += rng.uniform(0.5, 2.0)
+    return volume
+
+
+def project_phantom(volume, thetas, tiltangle=90, workers=None):
+    """
+    Forward projects every element of a phantom
+
+    Parameters
+    ----------
+    volume : ndarray
+        4D array [element, z, y, x]
+    thetas : ndarray
+        projection angles in degrees
+    tiltangle : float
+        laminography tilt angle in degrees, 90 is tomography
+    workers : int, optional
+        threads of lamino_project
+
+    Returns
+    -------
+    stack : ndarray
+        4D float32 array [element, projection, z, x]
+    """
+    return np.stack([lamino_project(element, thetas, tiltangle, workers=workers) for element in volume])
+
+
+def add_jitter(stack, x_sigma=1.5, y_sigma=1.0, seed=0):
+    """
+    Shifts every projection by a random sub-pixel offset
+
+    Parameters
+    ----------
+    stack : ndarray
+        4D array [element, projection, y, x]
+    x_sigma, y_sigma : float
+        standard deviation of the shifts in pixels
+    seed : int
+        random seed
+
+    Returns
+    -------
+    stack : ndarray
+        shifted copy, in the convention of shift_projections
+    x_shifts, y_shifts : ndarray
+        the shifts that were applied, so -x_shifts, -y_shifts realigns the stack
+    """
+    rng = np.random.default_rng(seed)
+    x_shifts = rng.normal(0, x_sigma, stack.shape[1])
+    y_shifts = rng.normal(0, y_sigma, stack.shape[1])
+    stack = shift_projections(np.array(stack), x_shifts, y_shifts, mode="fourier")
+    return stack, x_shifts, y_shifts
+
+
+def add_noise(stack, counts=1000, seed=0):
+    """
+    Poisson counting noise, the brightest pixel of every element collects counts photons
+
+    Parameters
+    ----------
+    stack : ndarray
+        4D array [element, projection, y, x]
+    counts : float or None
+        counts of the brightest pixel, None leaves the stack unchanged
+    seed : int
+        random seed
+
+    Returns
+    -------
+    stack : ndarray
+        noisy copy
+    """
+    stack = np.array(stack)
+    if counts is None:
+        return stack
+    rng = np.random.default_rng(seed)
+    for e in range(stack.shape[0]):
+        scale = counts/max(float(stack[e].max()), 1e-12)
+        stack[e] = rng.poisson(np.clip(stack[e], 0, None)*scale)/scale
+    return stack
+
+
+def add_hotspots(stack, count=4, amplitude=(5, 20), seed=0):
+    """
+    Adds single pixel and 2x2 hotspots at random positions of every plane
+
+    Parameters
+    ----------
+    stack : ndarray
+        4D array [element, projection, y, x]
+    count : int
+        hotspots per plane
+    amplitude : tuple
+        range of the hotspot value, in multiples of the plane maximum
+    seed : int
+        random seed
+
+    Returns
+    -------
+    stack : ndarray
+        copy with hotspots
+    mask : ndarray
+        bool array [element, projection, y, x] of the hotspot pixels
+    """
+    rng = np.random.default_rng(seed)
+    stack = np.array(stack)
+    mask = np.zeros(stack.shape, dtype=bool)
+    rows, cols = stack.shape[2:]
+    for e in range(stack.shape[0]):
+        for j in range(stack.shape[1]):
+            peak = max(float(stack[e, j].max()), 1e-12)
+            for i in range(count):
+                size = 1 + i % 2
+                row = rng.integers(0, rows-size+1)
+                col = rng.integers(0, cols-size+1)
+                stack[e, j, row:row+size, col:col+size] = peak*rng.uniform(*amplitude)
+                mask[e, j, row:row+size, col:col+size] = True
+    return stack, mask
+
+
+def write_maps_files(stack, thetas, directory, elements=ELEMENTS, prefix="phantom", data_tags=DATA_TAGS):
+    """
+    Writes one MAPS-style hdf file per projection
+
+    Parameters
+    ----------
+    stack : ndarray
+        4D array [element, projection, y, x]
+    thetas : ndarray
+        projection angles in degrees, stored as the THETA_PV entry of MAPS/Scan/Extra_PVs
+    directory : str
+        output directory, created when missing
+    elements : sequence of str
+        channel names of the elements in stack
+    prefix : str
+        file name prefix, files are {prefix}_{0000}.h5
+    data_tags : sequence of str
+        datasets holding the element planes (ex. MAPS/XRF_roi)
+
+    Returns
+    -------
+    files : list
+        written file names, in projection order
+    """
+    os.makedirs(directory, exist_ok=True)
+    channel_names = np.array(list(elements), dtype='S')
+    scaler_names = np.array(list(SCALERS), dtype='S')
+    rows, cols = stack.shape[2:]
+    scalers = np.ones((len(SCALERS), rows, cols), dtype=np.float32)*np.array(SCALER_VALUES, dtype=np.float32)[:, None, None]
+    files = []
+    for j in range(stack.shape[1]):
+        fname = os.path.join(directory, "{}_{:04d}.h5".format(prefix, j))
+        with h5py.File(fname, "w") as img:
+            for tag in data_tags:
+                img.create_dataset(tag, data=np.asarray(stack[:, j], dtype=np.float32))
+            img.create_dataset(ELEMENT_TAG, data=channel_names)
+            img.create_dataset("MAPS/scalers", data=scalers)
+            img.create_dataset(SCALER_TAG, data=scaler_names)
+            img.create_dataset("MAPS/x_axis", data=np.arange(cols, dtype=np.float32))
+            img.create_dataset("MAPS/y_axis", data=np.arange(rows, dtype=np.float32))
+            img.create_dataset("MAPS/Scan/Extra_PVs/Names", data=np.array([THETA_PV], dtype='S'))
+            img.create_dataset(THETA_PATH, data=np.array(["{:.4f}".format(thetas[j])], dtype='S'))
+        files.append(fname)
+    return files
+
+
+def make_dataset(directory, shape=(32, 64), num_projections=60, theta_range=(0, 180), tiltangle=90, elements=ELEMENTS,
+                 x_sigma=1.5, y_sigma=1.0, counts=1000, hotspots=4, seed=0):
+    """
+    Builds a phantom, projects it, degrades the projections and writes them as MAPS-style hdf files
+
+    Parameters
+    ----------
+    directory : str
+        output directory of the hdf files
+    shape : tuple
+        (rows, width) of the projections
+    num_projections : int
+        number of projections, evenly spaced over theta_range
+    theta_range : tuple
+        first and end angle in degrees, the end angle is not included
+    tiltangle : float
+        laminography tilt angle in degrees, 90 is tomography
+    elements : sequence of str
+        element names
+    x_sigma, y_sigma : float
+        jitter in pixels, see add_jitter
+    counts : float or None
+        counts of the brightest pixel, see add_noise
+    hotspots : int
+        hotspots per plane, see add_hotspots
+    seed : int
+        random seed
+
+    Returns
+    -------
+    dataset : dict
+        'volume' [element, z, y, x], 'thetas', the projections [element, projection, y, x]
+        at every stage ('clean', 'noisy' after jitter and noise, the written 'stack' with
+        hotspots, and 'aligned' with noise but no jitter), the applied 'x_shifts' and
+        'y_shifts', the 'hotspot_mask', 'files' and the tags needed to read them back
+    """
+    thetas = np.linspace(theta_range[0], theta_range[1], num_projections, endpoint=False)
+    volume = make_phantom(shape, elements, seed=seed)
+    clean = project_phantom(volume, thetas, tiltangle)
+    #the stage jitters before the detector counts, hotspots come from the detector
+    jittered, x_shifts, y_shifts = add_jitter(clean, x_sigma, y_sigma, seed)
+    noisy = add_noise(jittered, counts, seed)
+    stack, hotspot_mask = add_hotspots(noisy, hotspots, seed=seed)
+    files = write_maps_files(stack, thetas, directory, elements)
+    return {"volume": volume,
+            "thetas": thetas,
+            "tiltangle": tiltangle,
+            "clean": clean,
+            "aligned": add_noise(clean, counts, seed),
+            "noisy": noisy,
+            "stack": stack,
+            "x_shifts": x_shifts,
+            "y_shifts": y_shifts,
+            "hotspot_mask": hotspot_mask,
+            "files": files,
+            "elements": list(elements),
+            "scalers": list(SCALERS),
+            "data_tag": DATA_TAGS[0],
+            "element_tag": ELEMENT_TAG,
+            "scaler_tag": SCALER_TAG,
+            "theta_path": THETA_PATH}
+
+
+if __name__ == '__main__':
+    dataset = make_dataset(sys.argv[1] if len(sys.argv) > 1 else "phantom")
+    print("wrote {} projections {} of {} to {}".format(len(dataset["files"]), dataset["stack"].shape[2:],
+                                                      ", ".join(dataset["elements"]), os.path.dirname(dataset["files"][0])))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Benchmark of the alignment and reconstruction paths in float32 and float64.
+
+Run with::
+
+    python -m xrftomo.benchmark.precision
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import time
+from scipy import ndimage
+from scipy import fft
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+def make_stack(shape, dtype, seed=0):
+    """
+    Smooth random 4D stack [element, projection, y, x] used as benchmark input
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.random(shape)
+    data = ndimage.gaussian_filter(data, sigma=(0, 0, 2, 2))
+    return data.astype(dtype)
+
+
+def time_call(func, repeats):
+    best = np.inf
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter()-t0)
+    return best
+
+
+def shift_stack(data, x_shifts, y_shifts):
+    """
+    Per-plane spline shift loop that SinogramActions.shift_all used before shift_projections
+    """
+    for i in range(data.shape[0]):
+        for j in range(data.shape[1]):
+            data[i, j] = ndimage.shift(data[i, j], (-y_shifts[j], x_shifts[j]), output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
+    return data
+
+
+def phase_correlate(data):
+    """
+    Same pairwise fft correlation as SinogramActions.phaseCorrelate, without applying the shifts.
+    scipy.fft keeps float32 input in single precision, as scipy.fftpack did there.
+    """
+    shifts = np.zeros((data.shape[0]-1, 2))
+    for i in range(data.shape[0]-1):
+        f1 = fft.fft2(data[i])
+        f2 = fft.fft2(data[i+1])
+        cross = f1*f2.conj()
+        cross /= np.abs(cross)+1e-12
+        corr = np.abs(fft.ifft2(cross))
+        shifts[i] = np.unravel_index(np.argmax(corr), corr.shape)
+    return shifts
+
+
+def run(shape=(4, 90, 96, 96), repeats=3, dtypes=('float64', 'float32')):
+    """
+    Time the alignment and reconstruction paths for each working dtype
+
+    Parameters
+    ----------
+    shape : tuple
+        benchmark stack shape [element, projection, y, x]
+    repeats : int
+        number of timed repetitions, the best time is reported
+    dtypes : tuple
+        dtypes to compare
+
+    Returns
+    -------
+    results : dict
+        {dtype: {stage: seconds}}
+    """
+    try:
+        import tomopy
+    except ImportError:
+        tomopy = None
+        print("tomopy not available, skipping reconstruction timings")
+
+    rng = np.random.default_rng(1)
+    x_shifts = rng.uniform(-3, 3, shape[1])
+    y_shifts = rng.uniform(-3, 3, shape[1])
+    thetas = np.linspace(0, np.pi, shape[1], endpoint=False)
+    results = {}
+    for dtype in dtypes:
+        data = make_stack(shape, dtype)
+        stages = {}
+        stages["copy (history)"] = time_call(lambda: data.copy(), repeats)
+        stages["shift_all"] = time_call(lambda: shift_stack(data.copy(), x_shifts, y_shifts), repeats)
+        stages["phase correlation"] = time_call(lambda: phase_correlate(data[0]), repeats)
+        if tomopy is not None:
+            stages["gridrec"] = time_call(lambda: tomopy.recon(data[0], thetas, algorithm='gridrec'), repeats)
+            stages["sirt (10 iters)"] = time_call(lambda: tomopy.recon(data[0], thetas, algorithm='sirt', num_iter=10), repeats)
+        stages["memory (MB)"] = data.nbytes/1e6
+        results[dtype] = stages
+
+    print("{:<20}".format("stage") + "".join("{:>12}".format(d) for d in dtypes) + "{:>10}".format("speedup"))
+    for stage in results[dtypes[0]]:
+        row = [results[d][stage] for d in dtypes]
+        print("{:<20}".format(stage) + "".join("{:>12.4f}".format(v) for v in row) + "{:>10.2f}".format(row[0]/row[-1]))
+    return results
+
+
+if __name__ == '__main__':
+    run()
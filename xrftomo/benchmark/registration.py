@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Benchmark of the batched registration engine against the per-projection
+loops previously used by SinogramActions: skimage phase_cross_correlation
+for xcor_sino and crossCorrelate2, fft2 pairs for phaseCorrelate.
+
+Run with::
+
+    python -m xrftomo.benchmark.registration
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from scipy import ndimage
+
+from xrftomo.registration import register_stack, phase_correlate_pairs
+from xrftomo.benchmark.precision import make_stack, time_call, phase_correlate
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+def shifted_stack(num_projections, shape, dtype, seed=1):
+    """
+    Copies of one smooth image at random sub-pixel offsets [projection, y, x]
+    """
+    rng = np.random.default_rng(seed)
+    image = make_stack((1, 1) + tuple(shape), 'float64', seed)[0, 0]
+    offsets = rng.uniform(-4, 4, (num_projections, 2))
+    stack = np.array([ndimage.shift(image, offset, order=3, mode='grid-wrap') for offset in offsets])
+    return stack.astype(dtype)
+
+
+def skimage_fixed(sino, phase_cross_correlation):
+    shifts = np.zeros((len(sino), 1))
+    for i in range(1, len(sino)):
+        shifts[i] = phase_cross_correlation(sino[0], sino[i], upsample_factor=100)[0]
+    return shifts
+
+
+def skimage_chained(stack, phase_cross_correlation):
+    shifts = np.zeros((len(stack), 2))
+    for i in range(1, len(stack)):
+        shifts[i] = phase_cross_correlation(stack[i-1], stack[i], upsample_factor=100)[0]
+    return np.cumsum(shifts, axis=0)
+
+
+def run(num_projections=180, shape=(128, 128), repeats=3, dtype='float32'):
+    """
+    Time the per-projection registration loops and the batched engine
+
+    Parameters
+    ----------
+    num_projections : int
+        projections in the benchmark stack
+    shape : tuple
+        projection shape [y, x]
+    repeats : int
+        number of timed repetitions, the best time is reported
+    dtype : str
+        dtype of the benchmark stack
+
+    Returns
+    -------
+    results : dict
+        {method: (loop seconds, batched seconds, max abs difference)}
+    """
+    try:
+        from skimage.registration import phase_cross_correlation
+    except ImportError:
+        phase_cross_correlation = None
+        print("skimage not available, skipping the upsampled DFT comparisons")
+
+    stack = shifted_stack(num_projections, shape, dtype)
+    sino = stack[:, shape[0]//2]
+    results = {}
+
+    loop = phase_correlate(stack)
+    y_pairs, x_pairs = phase_correlate_pairs(stack)
+    batched = np.mod(np.stack([y_pairs, x_pairs], axis=1), shape)
+    results["phase correlation"] = (time_call(lambda: phase_correlate(stack), repeats),
+                                    time_call(lambda: phase_correlate_pairs(stack), repeats),
+                                    float(np.abs(loop - batched).max()))
+    if phase_cross_correlation is not None:
+        loop = skimage_fixed(sino, phase_cross_correlation)
+        batched = register_stack(sino, "fixed")
+        results["xcor_sino"] = (time_call(lambda: skimage_fixed(sino, phase_cross_correlation), repeats),
+                                time_call(lambda: register_stack(sino, "fixed"), repeats),
+                                float(np.abs(loop - batched).max()))
+        loop = skimage_chained(stack, phase_cross_correlation)
+        batched = register_stack(stack, "chained")
+        results["crossCorrelate2"] = (time_call(lambda: skimage_chained(stack, phase_cross_correlation), repeats),
+                                      time_call(lambda: register_stack(stack, "chained"), repeats),
+                                      float(np.abs(loop - batched).max()))
+
+    print("{} stack {}".format(dtype, (num_projections,) + tuple(shape)))
+    print("{:<20}{:>12}{:>12}{:>10}{:>14}".format("method", "loop (s)", "batched (s)", "speedup", "max |diff|"))
+    for method, (loop_time, batched_time, diff) in results.items():
+        print("{:<20}{:>12.4f}{:>12.4f}{:>10.2f}{:>14.2e}".format(method, loop_time, batched_time, loop_time/batched_time, diff))
+    return results
+
+
+if __name__ == '__main__':
+    run()
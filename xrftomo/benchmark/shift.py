@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Benchmark of the batched projection shift modes against the per-plane
+ndimage.shift loop previously used by SinogramActions.shift_all.
+
+Run with::
+
+    python -m xrftomo.benchmark.shift
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+from xrftomo.shift import SHIFT_MODES, shift_projections
+from xrftomo.benchmark.precision import make_stack, time_call, shift_stack
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+def run(shape=(8, 180, 128, 128), repeats=3, dtype='float32'):
+    """
+    Time shift_all as a per-plane loop and as one batched call per mode
+
+    Parameters
+    ----------
+    shape : tuple
+        benchmark stack shape [element, projection, y, x]
+    repeats : int
+        number of timed repetitions, the best time is reported
+    dtype : str
+        dtype of the benchmark stack
+
+    Returns
+    -------
+    results : dict
+        {method: (seconds, max abs difference to the loop)}
+    """
+    rng = np.random.default_rng(1)
+    x_shifts = rng.uniform(-3, 3, shape[1])
+    y_shifts = rng.uniform(-3, 3, shape[1])
+    data = make_stack(shape, dtype)
+
+    reference = shift_stack(data.copy(), x_shifts, y_shifts)
+    results = {"ndimage loop": (time_call(lambda: shift_stack(data.copy(), x_shifts, y_shifts), repeats), 0.0)}
+    for mode in SHIFT_MODES:
+        shifted = shift_projections(data.copy(), x_shifts, -y_shifts, mode=mode)
+        seconds = time_call(lambda: shift_projections(data.copy(), x_shifts, -y_shifts, mode=mode), repeats)
+        results[mode] = (seconds, float(np.abs(shifted - reference).max()))
+
+    loop_time = results["ndimage loop"][0]
+    print("{} stack {}".format(dtype, shape))
+    print("{:<14}{:>12}{:>10}{:>14}".format("method", "seconds", "speedup", "max |diff|"))
+    for method, (seconds, diff) in results.items():
+        print("{:<14}{:>12.4f}{:>10.2f}{:>14.2e}".format(method, seconds, loop_time/seconds, diff))
+    return results
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Benchmark suite on a synthetic XRF phantom. Times the hdf loaders, the
+SinogramActions alignment methods, the hotspot filters and the
+reconstruction and laminography methods, records how accurate each one is
+and appends the run to a JSON history so runs can be compared over time.
+
+Run with::
+
+    python -m xrftomo.benchmark.suite [history.json]
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+import xrftomo
+from xrftomo.benchmark.phantom import make_dataset
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+SECTIONS = ("loaders", "alignment", "hotspots", "reconstruction")
+HISTORY = "xrftomo_benchmark.json"
+
+#how the sinogram widget applies the shifts returned by each method:
+#'shift_all' passes (x, y) to SinogramActions.shift_all, 'direct' to shift_projections
+ALIGNMENT_METHODS = (
+    ("center of mass", "shift_all", lambda actions, data, thetas, iters: actions.runCenterOfMass(0, data, thetas, apply=False)[1:]),
+    ("cross correlate", "shift_all", lambda actions, data, thetas, iters: actions.crossCorrelate2(0, data, apply=False)[1:]),
+    ("phase correlate", "shift_all", lambda actions, data, thetas, iters: actions.phaseCorrelate(0, data)[1:]),
+    ("xcor ysum", "shift_all", lambda actions, data, thetas, iters: actions.xcor_ysum(0, data)),
+    ("xcor dysum", "shift_all", lambda actions, data, thetas, iters: actions.xcor_dysum(0, data)),
+    ("xcor sino", "shift_all", lambda actions, data, thetas, iters: (actions.xcor_sino(0, data.shape[2]//2, data), None)),
+    ("fit peaks", "shift_all", lambda actions, data, thetas, iters: actions.run_fit_peaks(0, data)[1:]),
+    ("optical flow", None, lambda actions, data, thetas, iters: actions.runOpFlow(0, data)),
+    ("iterative align", "direct", lambda actions, data, thetas, iters: actions.iterative_align(
+        0, data, thetas, (0, 0), False, None, None, None, "sirt", 10, False, False, iters)[:2]),
+    ("sequential align", "direct", lambda actions, data, thetas, iters: actions.sequential_align(
+        0, data, thetas, (0, 0), False, None, None, None, "sirt", 10, False, False, iters)[:2]),
+    ("pyramid align", "direct", lambda actions, data, thetas, iters: actions.iterative_align(
+        0, data, thetas, (0, 0), False, None, None, None, "sirt", 10, False, False, iters, [4, 2, 1])[:2]),
+    ("projection matching", "direct", lambda actions, data, thetas, iters: xrftomo.projection_matching_align(
+        data[0], thetas, 0, iters)[:2]),
+)
+
+
+def profile_call(func, memory=True):
+    """
+    Times a call and, when memory is set, calls it again under tracemalloc
+    for the peak memory, so the timing is not slowed down by the tracing
+
+    Returns
+    -------
+    result :
+        return value of the timed call
+    seconds : float
+        wall time of the timed call
+    peak_mb : float or None
+        peak traced allocation in MB
+    """
+    t0 = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - t0
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1]/1e6
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def shift_rmse(true_shifts, applied_shifts):
+    """
+    RMS misalignment left after applying shifts to a stack displaced by
+    true_shifts, ignoring a common offset of all projections
+
+    Parameters
+    ----------
+    true_shifts : ndarray
+        displacement of every projection, in the convention of shift_projections
+    applied_shifts : ndarray or None
+        correction applied to every projection, None leaves the stack as it is
+
+    Returns
+    -------
+    rmse : float
+    """
+    residual = np.asarray(true_shifts, dtype=float)
+    if applied_shifts is not None:
+        residual = residual + np.asarray(applied_shifts, dtype=float)
+    return float(np.sqrt(np.mean((residual - residual.mean())**2)))
+
+
+def recon_mse(recon, truth):
+    """
+    Relative mean squared error of a reconstruction after the best intensity
+    scale and the best of the 8 in-plane flips and rotations, which absorb
+    the differences between the tomopy and phantom geometry conventions
+
+    Parameters
+    ----------
+    recon : ndarray
+        3D reconstruction [z, y, x]
+    truth : ndarray
+        3D phantom volume [z, y, x]
+
+    Returns
+    -------
+    mse : float
+        mean((scale*recon - truth)**2)/mean(truth**2)
+    """
+    recon = np.nan_to_num(np.asarray(recon, dtype=np.float64))
+    truth = np.asarray(truth, dtype=np.float64)
+    norm = max(float(np.mean(truth**2)), 1e-30)
+    best = np.inf
+    for transposed in (recon, np.swapaxes(recon, 1, 2)):
+        for k in range(4):
+            candidate = np.rot90(transposed, k, axes=(1, 2))
+            scale = np.sum(candidate*truth)/max(float(np.sum(candidate**2)), 1e-30)
+            best = min(best, float(np.mean((scale*candidate - truth)**2))/norm)
+    return best
+
+
+def _result(section, name, seconds=None, peak_mb=None, status="ok", **metrics):
+    result = {"section": section, "name": name, "seconds": seconds, "peak_mb": peak_mb, "status": status}
+    result.update(metrics)
+    return result
+
+
+def _run(section, name, func, memory, metrics):
+    """
+    Profiles func and scores its return value with metrics, a failing
+    method is recorded with its error instead of stopping the suite
+    """
+    try:
+        value, seconds, peak_mb = profile_call(func, memory)
+        return _result(section, name, seconds, peak_mb, **metrics(value))
+    except Exception as error:
+        return _result(section, name, status="{}: {}".format(type(error).__name__, error))
+
+
+def bench_loaders(dataset, memory=True, workers=4):
+    """
+    Times read_mic_xrf, load_mic_xrf and LazyXRFStack on the phantom files
+    and checks what they read against the written stack
+    """
+    args = (dataset["files"], dataset["elements"], dataset["data_tag"], dataset["element_tag"],
+            dataset["scalers"], dataset["scaler_tag"])
+    stack = dataset["stack"]
+    rows, cols = stack.shape[2:]
+    window = (rows//4, rows - rows//4, cols//4, cols - cols//4)
+    num_elements = len(dataset["elements"])
+
+    def max_diff(data, reference):
+        return {"max_diff": float(np.abs(np.asarray(data)[:num_elements] - reference).max())}
+
+    def lazy():
+        lazy_stack = xrftomo.LazyXRFStack(*args)
+        try:
+            return np.asarray(lazy_stack)
+        finally:
+            lazy_stack.close()
+
+    cases = (("read_mic_xrf", lambda: xrftomo.read_mic_xrf(*args), stack),
+             ("read_mic_xrf window", lambda: xrftomo.read_mic_xrf(*args, window=window),
+              stack[:, :, window[0]:window[1], window[2]:window[3]]),
+             ("read_mic_xrf binning 2", lambda: xrftomo.read_mic_xrf(*args, binning=2), xrftomo.bin_planes(stack, 2)),
+             ("load_mic_xrf", lambda: xrftomo.load_mic_xrf(*args, workers=workers), stack),
+             ("LazyXRFStack", lazy, stack),
+             ("load_thetas", lambda: xrftomo.load_thetas(dataset["files"], dataset["theta_path"], workers=workers)[0],
+              dataset["thetas"]))
+    results = []
+    for name, func, reference in cases:
+        if name == "load_thetas":
+            metrics = lambda thetas, reference=reference: {"max_diff": float(np.abs(np.asarray(thetas) - reference).max())}
+        else:
+            metrics = lambda data, reference=reference: max_diff(data, reference)
+        results.append(_run("loaders", name, func, memory, metrics))
+    return results
+
+
+def _sinogram_actions():
+    from PyQt5 import QtWidgets
+    if QtWidgets.QApplication.instance() is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        _sinogram_actions.app = QtWidgets.QApplication([])
+    return xrftomo.SinogramActions()
+
+
+def bench_alignment(dataset, memory=True, iters=10):
+    """
+    Runs every SinogramActions alignment method, and projection matching, on
+    the jittered noisy projections of the first element and scores the
+    shifts the sinogram widget would apply against the known jitter
+    """
+    try:
+        actions = _sinogram_actions()
+    except Exception as error:
+        print("SinogramActions unavailable: {}".format(error))
+        actions = None
+    data = dataset["noisy"][:1]
+    thetas = dataset["thetas"]
+    results = []
+    for name, convention, method in ALIGNMENT_METHODS:
+        if actions is None and name != "projection matching":
+            results.append(_result("alignment", name, status="skipped, SinogramActions unavailable"))
+            continue
+        def metrics(value, convention=convention):
+            if convention is None:
+                return {}
+            x_shifts, y_shifts = value
+            if convention == "shift_all" and y_shifts is not None:
+                y_shifts = -np.asarray(y_shifts)
+            return {"shift_rmse_x": shift_rmse(dataset["x_shifts"], x_shifts),
+                    "shift_rmse_y": shift_rmse(dataset["y_shifts"], y_shifts)}
+        results.append(_run("alignment", name, lambda method=method: method(actions, data.copy(), thetas.copy(), iters),
+                            memory, metrics))
+    return results
+
+
+def bench_hotspots(dataset, memory=True):
+    """
+    Runs the hotspot filters of ImageProcessActions on the first element and
+    scores the cleaned stack against the stack before hotspots were added
+    """
+    stack = dataset["stack"][0]
+    reference = dataset["noisy"][0]
+    brightest = int(np.argmax(stack.reshape(len(stack), -1).max(axis=1)))
+
+    def metrics(cleaned):
+        return {"mse": float(np.mean((cleaned - reference)**2)/np.mean(reference**2))}
+
+    def blend():
+        thresholds, count = xrftomo.hotspot_thresholds(stack[brightest])
+        return xrftomo.remove_hotspots_stack(stack, thresholds)
+
+    def roi():
+        return xrftomo.remove_hotspots_stack(stack, xrftomo.ROI_HOTSPOT_THRESHOLDS, kernel_sizes=[3, 5, 7], neighbor_max=False,
+                                             expansions=2, blend_size=7, relax_per_pass=True)
+
+    return [_result("hotspots", "none", 0.0, 0.0, **metrics(stack)),
+            _run("hotspots", "blend", blend, memory, metrics),
+            _run("hotspots", "roi thresholds", roi, memory, metrics)]
+
+
+def bench_reconstruction(dataset, memory=True, iters=10, lamino_tilt=60):
+    """
+    Reconstructs the first element of the aligned noisy projections with every
+    RECON_METHODS entry and back-projects laminography stacks of the same phantom
+    in the geometries of LaminographyActions.lam and ReconstructionActions.lam
+    """
+    stack = dataset["aligned"][0]
+    truth = dataset["volume"][0]
+    thetas = dataset["thetas"]
+    center = stack.shape[2]/2
+    results = []
+    for method in xrftomo.RECON_METHODS:
+        results.append(_run("reconstruction", method,
+                            lambda method=method: xrftomo.recon_volume(stack, thetas, center, method, iters=iters),
+                            memory, lambda recon: {"mse": recon_mse(recon, truth)}))
+
+    lamino_thetas = np.linspace(0, 360, len(thetas), endpoint=False)
+    for geometry in ("lamino", "victor"):
+        lamino_stack = xrftomo.lamino_project(truth, lamino_thetas, lamino_tilt, geometry)
+        results.append(_run("reconstruction", "{} backproject".format(geometry),
+                            lambda lamino_stack=lamino_stack, geometry=geometry: xrftomo.lamino_backproject(
+                                lamino_stack, lamino_thetas, lamino_tilt, "linear", geometry),
+                            memory, lambda recon: {"mse": recon_mse(recon, truth)}))
+    return results
+
+
+def load_history(path):
+    """
+    Reads the list of runs stored in a JSON history, empty when the file does not exist
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as history_file:
+        return json.load(history_file)
+
+
+def append_history(path, run):
+    """
+    Appends a run to a JSON history, writing through a temporary file so an
+    interrupted write does not lose earlier runs
+
+    Returns
+    -------
+    history : list
+        every run in the file, the new one last
+    """
+    history = load_history(path)
+    history.append(run)
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".json", delete=False) as history_file:
+        json.dump(history, history_file, indent=1)
+    os.replace(history_file.name, path)
+    return history
+
+
+def _format(value, spec):
+    return "-" if value is None else spec.format(value)
+
+
+def print_results(results, previous=None):
+    """
+    Prints a results table, with the speed ratio to a previous run of the same dataset when given
+    """
+    previous = {} if previous is None else {(r["section"], r["name"]): r for r in previous["results"]}
+    print("{:<16}{:<24}{:>10}{:>10}{:>10}{:>10}{:>11}{:>11}{:>10}".format(
+        "section", "method", "time (s)", "peak MB", "rmse x", "rmse y", "mse", "max |diff|", "vs last"))
+    for result in results:
+        if result["status"] != "ok":
+            print("{:<16}{:<24}  {}".format(result["section"], result["name"], result["status"]))
+            continue
+        last = previous.get((result["section"], result["name"]))
+        ratio = None
+        if last is not None and last.get("seconds") and result["seconds"]:
+            ratio = last["seconds"]/result["seconds"]
+        print("{:<16}{:<24}{:>10}{:>10}{:>10}{:>10}{:>11}{:>11}{:>10}".format(
+            result["section"], result["name"], _format(result["seconds"], "{:.3f}"), _format(result["peak_mb"], "{:.1f}"),
+            _format(result.get("shift_rmse_x"), "{:.2f}"), _format(result.get("shift_rmse_y"), "{:.2f}"),
+            _format(result.get("mse"), "{:.2e}"), _format(result.get("max_diff"), "{:.1e}"), _format(ratio, "{:.2f}x")))
+
+
+def run(history=HISTORY, sections=SECTIONS, directory=None, shape=(32, 64), num_projections=60, iters=10,
+        x_sigma=1.5, y_sigma=1.0, counts=1000, hotspots=4, seed=0, memory=True, workers=4):
+    """
+    Builds a phantom dataset, runs the selected benchmark sections and appends the run to the history
+
+    Parameters
+    ----------
+    history : str or None
+        JSON history file, None does not record the run
+    sections : sequence of str
+        any of SECTIONS
+    directory : str, optional
+        where the phantom hdf files are written, a temporary directory that
+        is removed afterwards by default
+    shape : tuple
+        (rows, width) of the phantom projections
+    num_projections : int
+        projections over 180 degrees
+    iters : int
+        iterations of the iterative alignment and reconstruction methods
+    x_sigma, y_sigma, counts, hotspots, seed
+        phantom degradation, see xrftomo.benchmark.phantom.make_dataset
+    memory : bool
+        measure the peak memory of every method, which runs it twice
+    workers : int
+        threads of the parallel loaders
+
+    Returns
+    -------
+    run : dict
+        {'date', 'platform', 'python', 'numpy', 'cores', 'dataset', 'results'} as stored in the history
+    """
+    config = {"shape": list(shape), "num_projections": num_projections, "iters": iters, "x_sigma": x_sigma,
+              "y_sigma": y_sigma, "counts": counts, "hotspots": hotspots, "seed": seed}
+    cleanup = directory is None
+    if cleanup:
+        directory = tempfile.mkdtemp(prefix="xrftomo_phantom_")
+    try:
+        dataset = make_dataset(directory, shape, num_projections, x_sigma=x_sigma, y_sigma=y_sigma, counts=counts,
+                               hotspots=hotspots, seed=seed)
+        print("phantom: {} elements, {} projections of {}, jitter {}/{} px".format(
+            len(dataset["elements"]), num_projections, tuple(shape), x_sigma, y_sigma))
+        results = []
+        if "loaders" in sections:
+            results += bench_loaders(dataset, memory, workers)
+        if "alignment" in sections:
+            results += bench_alignment(dataset, memory, iters)
+        if "hotspots" in sections:
+            results += bench_hotspots(dataset, memory)
+        if "reconstruction" in sections:
+            results += bench_reconstruction(dataset, memory, iters)
+    finally:
+        if cleanup:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    run = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "platform": platform.platform(),
+           "python": platform.python_version(),
+           "numpy": np.__version__,
+           "cores": os.cpu_count(),
+           "dataset": config,
+           "results": results}
+    previous = None
+    if history is not None:
+        for earlier in reversed(load_history(history)):
+            if earlier.get("dataset") == config:
+                previous = earlier
+                break
+        append_history(history, run)
+    print_results(results, previous)
+    return run
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else HISTORY)
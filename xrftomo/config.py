@@ -42,7 +42,31 @@ SECTIONS['gui'] = {
     'experimental': {
         'default': False,
         'help': "debug tools and unstable options become available on gui",
-        'action': "store_true"}}
+        'action': "store_true"},
+    'shift-mode': {
+        'default': 'spline',
+        'type': str,
+        'help': "Sub-pixel interpolation used when the sinogram tab applies alignment shifts, other tabs shift bilinearly",
+        'choices': ['spline', 'fourier', 'bilinear']},
+    'history-length': {
+        'default': 10,
+        'type': int,
+        'help': "number of undo steps kept",
+        'metavar': 'N'},
+    'history-checkpoint-interval': {
+        'default': 5,
+        'type': int,
+        'help': "undo steps stored as deltas between two full copies of the data",
+        'metavar': 'N'},
+    'history-memory': {
+        'default': 4096,
+        'type': int,
+        'help': "memory budget of the undo history in MB",
+        'metavar': 'MB'},
+    'history-spill': {
+        'default': False,
+        'help': "move undo checkpoints over the memory budget to disk",
+        'action': 'store_true'}}
 
 SECTIONS['file-io'] = {
     'load-settings': {
@@ -124,6 +148,34 @@ SECTIONS['file-io'] = {
         'default': '[]',
         'type': str,
         'help': "list of last loaded thetas for session restore"},
+    'load-workers': {
+        'default': 4,
+        'type': int,
+        'help': "number of files read in parallel when loading a dataset",
+        'metavar': 'N'},
+    'working-dtype': {
+        'default': 'float32',
+        'type': str,
+        'help': "floating point precision of data, reconstruction and history arrays",
+        'choices': ['float32', 'float64']},
+    'lazy-load': {
+        'default': False,
+        'action': 'store_true',
+        'help': "decode projections from disk only when they are displayed or processed"},
+    'no-metadata-index': {
+        'default': False,
+        'action': 'store_true',
+        'help': "do not cache channel names, shapes and thetas in a per-directory index file"},
+    'project-compression': {
+        'default': 'auto',
+        'type': str,
+        'help': "compression of saved projects, auto uses lz4 when hdf5plugin is installed and gzip otherwise",
+        'choices': ['auto', 'lz4', 'blosc', 'gzip', 'none']},
+    'export-workers': {
+        'default': 4,
+        'type': int,
+        'help': "number of slice files written in parallel when exporting tiffs",
+        'metavar': 'N'},
         }
 
 SECTIONS['reconstruction'] = {
@@ -145,7 +197,21 @@ SECTIONS['reconstruction'] = {
         'default': 'gridrec',
         'type': str,
         'help': "Reconstruction algorithm",
-        'choices': ['gridrec', 'fbp', 'mlem', 'sirt', 'sirtfbp']}}
+        'choices': ['gridrec', 'fbp', 'mlem', 'sirt', 'sirtfbp']},
+    'recon-workers': {
+        'default': 0,
+        'type': int,
+        'help': "number of elements reconstructed in parallel, 0 uses one per core",
+        'metavar': 'N'},
+    'recon-sink': {
+        'default': 'tiff',
+        'type': str,
+        'help': "format reconstructed slices are streamed to when saving while reconstructing",
+        'choices': ['tiff', 'hdf5']},
+    'recon-discard-volume': {
+        'default': False,
+        'action': 'store_true',
+        'help': "do not keep reconstructions in memory once they are written to disk"}}
 
 SECTIONS['ir'] = {
     'iteration-count': {
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for writing projection, sinogram and reconstruction stacks to TIFF
+and NPY files. Slices are converted to float32 a chunk at a time and
+written through a bounded pool of threads.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from skimage import io
+try:
+    import tifffile
+    TIFFFILE_AVAILABLE = True
+except ImportError:
+    TIFFFILE_AVAILABLE = False
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['BIGTIFF_LIMIT',
+           'slice_names',
+           'sinogram_stack',
+           'export_slices',
+           'export_tiff_stack',
+           'export_npy']
+
+#classic tiff offsets are 32 bit, leave room for the page headers
+BIGTIFF_LIMIT = 2**32 - 2**25
+
+
+def write_tiff(fname, img):
+    """
+    Writes a single float32 TIFF, through tifffile when it is installed
+    """
+    if TIFFFILE_AVAILABLE:
+        tifffile.imwrite(fname, img)
+    else:
+        io.imsave(fname, img, check_contrast=False)
+
+def _chunks(num_slices, chunk_size):
+    chunk_size = max(1, int(chunk_size))
+    for start in range(0, num_slices, chunk_size):
+        yield start, min(start+chunk_size, num_slices)
+
+def slice_names(directory, element, kind, num_slices, start=0):
+    """
+    File names used for individual slices: {directory}/{element}_{kind}_{0000}.tiff
+
+    Parameters
+    ----------
+    directory : str
+    element : str
+    kind : str
+        'proj', 'sino' or 'recon'
+    num_slices : int
+    start : int
+        number of the first slice
+
+    Returns
+    -------
+    names : list
+    """
+    return ["{}/{}_{}_{:04d}.tiff".format(directory, element, kind, start+i) for i in range(num_slices)]
+
+def sinogram_stack(data, element):
+    """
+    Sinograms of one element [y, projection, x] as a view of the 4D dataset
+
+    Parameters
+    ----------
+    data : ndarray
+        4D xrf dataset ndarray [elements, theta, y,x]
+    element : int
+        element index
+
+    Returns
+    -------
+    sino : ndarray
+    """
+    return np.asarray(data[element]).transpose(1, 0, 2)
+
+def export_slices(stack, names, workers=4, chunk_size=16, progress=None, cancel=None):
+    """
+    Writes every slice of a 3D stack to its own TIFF file
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [slice, y, x]
+    names : list
+        one file name per slice
+    workers : int
+        number of files written concurrently
+    chunk_size : int
+        slices converted to float32 at once, at most two chunks are held in memory
+    progress : callable, optional
+        called as progress(n, total) after each chunk
+    cancel : CancelToken, optional
+        stops before the next chunk once cancelled
+
+    Returns
+    -------
+    written : int
+        number of slices written
+    """
+    num_slices = len(names)
+    written = 0
+    pending = []
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        for start, end in _chunks(num_slices, chunk_size):
+            if cancel is not None and cancel.cancelled:
+                break
+            chunk = np.asarray(stack[start:end], dtype=np.float32)
+            #wait for the previous chunk so memory stays bounded
+            wait(pending)
+            for job in pending:
+                job.result()
+            written += len(pending)
+            if progress is not None and len(pending) > 0:
+                progress(written, num_slices)
+            pending = [pool.submit(write_tiff, names[start+i], chunk[i]) for i in range(end-start)]
+        wait(pending)
+        for job in pending:
+            job.result()
+        written += len(pending)
+    if progress is not None:
+        progress(written, num_slices)
+    return written
+
+def export_tiff_stack(stack, fname, bigtiff=None, chunk_size=16, progress=None):
+    """
+    Writes a 3D stack as one multi-page float32 TIFF
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [page, y, x]
+    fname : str
+    bigtiff : bool, optional
+        write a BigTIFF, by default only when the stack does not fit a classic TIFF
+    chunk_size : int
+        pages converted to float32 at once
+    progress : callable, optional
+        called as progress(n, total) after each chunk
+    """
+    shape = tuple(stack.shape)
+    if not TIFFFILE_AVAILABLE:
+        io.imsave(fname, np.asarray(stack, dtype=np.float32), check_contrast=False)
+        if progress is not None:
+            progress(shape[0], shape[0])
+        return
+    if bigtiff is None:
+        bigtiff = int(np.prod(shape))*4 > BIGTIFF_LIMIT
+
+    def pages():
+        for start, end in _chunks(shape[0], chunk_size):
+            chunk = np.asarray(stack[start:end], dtype=np.float32)
+            for page in chunk:
+                yield page
+            if progress is not None:
+                progress(end, shape[0])
+
+    with tifffile.TiffWriter(fname, bigtiff=bigtiff) as tif:
+        tif.write(pages(), shape=shape, dtype=np.float32)
+
+def export_npy(stack, fname, chunk_size=16, progress=None):
+    """
+    Writes a stack as a float32 .npy file through a memmap, one chunk of the
+    first axis at a time
+
+    Parameters
+    ----------
+    stack : ndarray
+    fname : str
+    chunk_size : int
+        entries of the first axis converted at once
+    progress : callable, optional
+        called as progress(n, total) after each chunk
+    """
+    shape = tuple(stack.shape)
+    out = np.lib.format.open_memmap(fname, mode="w+", dtype=np.float32, shape=shape)
+    for start, end in _chunks(shape[0], chunk_size):
+        out[start:end] = np.asarray(stack[start:end], dtype=np.float32)
+        if progress is not None:
+            progress(end, shape[0])
+    out.flush()
+    del out
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for lazily loading xrf hdf file series through an on-disk cache.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import h5py
+import os
+import tempfile
+from numpy.lib.mixins import NDArrayOperatorsMixin
+from xrftomo.file_io.reader import read_mic_xrf_shapes, indexed_channel_names
+from xrftomo.precision import get_working_dtype
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+class LazyXRFStack(NDArrayOperatorsMixin):
+    """
+    4D [element, projection, y, x] stack that decodes planes from the source
+    hdf files only when they are first indexed. Decoded planes are kept in a
+    np.memmap cache file so memory use stays bounded by what is on screen.
+
+    Indexing, assignment, shape and copy() behave like the ndarray returned by
+    read_mic_xrf. Basic indexing returns views of the cache, so chained
+    assignments such as stack[e][i] = v write through. Boolean masks,
+    arithmetic, ufuncs and reductions load every plane first and return
+    regular ndarrays; in-place operators update the stack. Single rows of
+    planes that are not decoded yet are read-only copies.
+
+    Parameters
+    ----------
+    path_files: list
+        List of (path + filenames)
+    elements : list
+        element names to read
+    data_tag: str
+        data tag for corresponding roi_tag (ex. MAPS/XRF_roi)
+    element_tag : str
+        String defining the hdf5 channel tag name (ex. channel_names)
+    scalers : list
+        scaler names to read
+    scaler_tag : str
+        String defining the hdf5 scaler tag name (ex. scaler_names)
+    cache_dir : str, optional
+        directory holding the memmap cache, defaults to the system temp directory
+    dtype : numpy dtype, optional
+        dtype of the cached planes, defaults to the working dtype
+    """
+    def __init__(self, path_files, elements, data_tag, element_tag, scalers, scaler_tag, cache_dir=None, dtype=None):
+        self.path_files = list(path_files)
+        self.elements = list(elements)
+        self.scalers = list(scalers)
+        self.data_tag = data_tag
+        self.element_tag = element_tag
+        self.scaler_tag = scaler_tag
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype if dtype is not None else get_working_dtype())
+
+        max_y, max_x = 0, 0
+        self.frame_shapes = read_mic_xrf_shapes(self.path_files, data_tag)
+        for frame in self.frame_shapes:
+            if frame is not None:
+                max_y = max(max_y, frame[0])
+                max_x = max(max_x, frame[1])
+        self.shape = (len(self.elements)+len(self.scalers), len(self.path_files), max_y, max_x)
+        self._open_cache()
+
+    def _open_cache(self):
+        fd, self.cache_path = tempfile.mkstemp(prefix="xrftomo_", suffix=".dat", dir=self.cache_dir)
+        os.close(fd)
+        if np.prod(self.shape) > 0:
+            self._cache = np.memmap(self.cache_path, dtype=self.dtype, mode="w+", shape=self.shape)
+        else:
+            self._cache = np.zeros(self.shape, dtype=self.dtype)
+        self._loaded = np.zeros(self.shape[:2], dtype=bool)
+
+    def close(self):
+        """
+        Releases the memmap cache and removes its file
+        """
+        self._cache = None
+        try:
+            os.remove(self.cache_path)
+        except (OSError, AttributeError):
+            pass
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size*self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "LazyXRFStack(shape={}, dtype={}, loaded={}/{})".format(self.shape, self.dtype, int(self._loaded.sum()), self._loaded.size)
+
+    def _expand_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            idx = [i for i, k in enumerate(key) if k is Ellipsis][0]
+            fill = (slice(None),)*(4-len(key)+1)
+            key = key[:idx] + fill + key[idx+1:]
+        return key + (slice(None),)*(4-len(key))
+
+    def _offsets(self, j):
+        img_y, img_x = self.frame_shapes[j]
+        return (self.shape[2]-img_y)//2, (self.shape[3]-img_x)//2
+
+    def _read(self, j, channels, row=None):
+        """
+        Reads the requested channels of projection j from its source file,
+        either whole planes or a single row, padded to the stack size.
+        """
+        num_elements = len(self.elements)
+        if row is None:
+            out = np.zeros((len(channels), self.shape[2], self.shape[3]), dtype=self.dtype)
+        else:
+            out = np.zeros((len(channels), self.shape[3]), dtype=self.dtype)
+        if self.frame_shapes[j] is None:
+            return out
+        dy, dx = self._offsets(j)
+        img_y, img_x = self.frame_shapes[j]
+        if row is not None and not dy <= row < dy+img_y:
+            return out
+        sources = [(self.elements, self.data_tag, self.element_tag, False),
+                   (self.scalers, self.data_tag.split("/")[0]+"/scalers", self.scaler_tag, True)]
+        try:
+            with h5py.File(self.path_files[j], "r") as img:
+                for names, data_tag, name_tag, is_scaler in sources:
+                    selected = [k for k, c in enumerate(channels) if (c >= num_elements) == is_scaler]
+                    if len(selected) == 0:
+                        continue
+                    offset = num_elements if is_scaler else 0
+                    wanted = [names[channels[k]-offset] for k in selected]
+                    channel_names = indexed_channel_names(self.path_files[j], name_tag)
+                    if channel_names is None:
+                        channel_names = [x.decode("utf-8") if isinstance(x, bytes) else str(x) for x in img[name_tag][...]]
+                    found = [k for k, name in zip(selected, wanted) if name in channel_names]
+                    if len(found) < len(selected):
+                        print("WARNING: missing channels in file: {}. Filling with zeros.".format(self.path_files[j]))
+                    if len(found) == 0:
+                        continue
+                    channel_idx = np.array([channel_names.index(names[channels[k]-offset]) for k in found])
+                    unique_idx, inverse = np.unique(channel_idx, return_inverse=True)
+                    dset = img[data_tag]
+                    if row is None:
+                        planes = dset[unique_idx.tolist()][inverse]
+                        if is_scaler:
+                            planes = np.roll(planes, 1, axis=2)
+                        out[found, dy:dy+planes.shape[1], dx:dx+planes.shape[2]] = planes
+                    else:
+                        rows = dset[unique_idx.tolist(), row-dy, :][inverse]
+                        if is_scaler:
+                            rows = np.roll(rows, 1, axis=1)
+                        out[found, dx:dx+rows.shape[1]] = rows
+        except Exception as error:
+            print(error)
+            print("WARNING: possible error with file: {}. Check file integrity. Filling with zeros for this projection.".format(self.path_files[j]))
+        out[~np.isfinite(out)] = 0.0001
+        return out
+
+    def _ensure(self, channels, projections):
+        channels = np.atleast_1d(channels)
+        for j in np.atleast_1d(projections):
+            missing = channels[~self._loaded[channels, j]]
+            if len(missing) == 0:
+                continue
+            missing = np.unique(missing)
+            self._cache[missing, j] = self._read(j, missing.tolist())
+            self._loaded[missing, j] = True
+
+    def _whole(self, key):
+        """
+        True for keys that need every plane, e.g. boolean masks of the stack
+        """
+        for k in (key if isinstance(key, tuple) else (key,)):
+            if isinstance(k, LazyXRFStack) or (isinstance(k, np.ndarray) and k.ndim > 1):
+                return True
+        return False
+
+    def _loaded_cache(self):
+        self.load_all()
+        return self._cache.view(np.ndarray)
+
+    def _touched(self, key):
+        channels = np.arange(self.shape[0])[key[0]]
+        projections = np.arange(self.shape[1])[key[1]]
+        return channels, projections
+
+    def __getitem__(self, key):
+        if self._whole(key):
+            return self._loaded_cache()[np.asarray(key) if isinstance(key, LazyXRFStack) else key]
+        key = self._expand_key(key)
+        channels, projections = self._touched(key)
+        row = key[2]
+        basic = all(isinstance(k, (int, np.integer, slice)) for k in key[:2])
+        loaded = self._loaded[np.ix_(np.atleast_1d(channels), np.atleast_1d(projections))].all()
+        if isinstance(row, (int, np.integer)) and basic and not loaded:
+            #single row requests (sinograms) read hyperslabs without decoding whole planes
+            row = int(row) % self.shape[2]
+            ch = np.atleast_1d(channels)
+            pj = np.atleast_1d(projections)
+            rows = np.zeros((ch.size, pj.size, self.shape[3]), dtype=self.dtype)
+            for n, j in enumerate(pj):
+                loaded = self._loaded[ch, j]
+                for m in np.where(loaded)[0]:
+                    rows[m, n] = self._cache[ch[m], j, row]
+                if not loaded.all():
+                    missing = np.where(~loaded)[0]
+                    rows[missing, n] = self._read(j, ch[missing].tolist(), row=row)
+            sel = tuple(0 if isinstance(k, (int, np.integer)) else slice(None) for k in key[:2])
+            rows = rows[sel + (key[3],)]
+            #not a view of the cache, writing to it would be lost
+            if isinstance(rows, np.ndarray):
+                rows.flags.writeable = False
+            return rows
+        self._ensure(channels, projections)
+        result = self._cache[key]
+        return result.view(np.ndarray) if isinstance(result, np.ndarray) else result
+
+    def __setitem__(self, key, value):
+        if self._whole(key):
+            self._loaded_cache()[np.asarray(key) if isinstance(key, LazyXRFStack) else key] = value
+            return
+        key = self._expand_key(key)
+        channels, projections = self._touched(key)
+        self._ensure(channels, projections)
+        self._cache[key] = value
+
+    def load_all(self):
+        """
+        Decodes every plane that has not been read yet
+        """
+        self._ensure(np.arange(self.shape[0]), np.arange(self.shape[1]))
+
+    def __array__(self, dtype=None, copy=None):
+        self.load_all()
+        return np.array(self._cache, dtype=dtype)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(x._loaded_cache() if isinstance(x, LazyXRFStack) else x for x in inputs)
+        out = kwargs.get("out", ())
+        if out:
+            kwargs["out"] = tuple(x._loaded_cache() if isinstance(x, LazyXRFStack) else x for x in out)
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+        if out:
+            #in-place operators such as stack *= 2 return the stack itself
+            return out[0] if len(out) == 1 else out
+        if isinstance(result, tuple):
+            return tuple(np.asarray(r) for r in result)
+        return result if result is None else np.asarray(result)
+
+    def sum(self, *args, **kwargs):
+        return self._loaded_cache().sum(*args, **kwargs)
+
+    def mean(self, *args, **kwargs):
+        return self._loaded_cache().mean(*args, **kwargs)
+
+    def std(self, *args, **kwargs):
+        return self._loaded_cache().std(*args, **kwargs)
+
+    def min(self, *args, **kwargs):
+        return self._loaded_cache().min(*args, **kwargs)
+
+    def max(self, *args, **kwargs):
+        return self._loaded_cache().max(*args, **kwargs)
+
+    def any(self, *args, **kwargs):
+        return self._loaded_cache().any(*args, **kwargs)
+
+    def all(self, *args, **kwargs):
+        return self._loaded_cache().all(*args, **kwargs)
+
+    def astype(self, dtype):
+        return np.array(self._loaded_cache(), dtype=dtype)
+
+    def copy(self):
+        """
+        Returns an independent stack over the same files. Only planes that were
+        already decoded are copied; the rest are still read on demand.
+        """
+        new = object.__new__(type(self))
+        new.__dict__.update({k: v for k, v in self.__dict__.items() if k not in ("_cache", "_loaded", "cache_path")})
+        new.frame_shapes = list(self.frame_shapes)
+        new._open_cache()
+        for c in range(self.shape[0]):
+            loaded = np.where(self._loaded[c])[0]
+            if len(loaded) > 0:
+                new._cache[c, loaded] = self._cache[c, loaded]
+                new._loaded[c, loaded] = True
+        return new
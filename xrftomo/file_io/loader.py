@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for loading xrf hdf file series with a pool of workers.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from xrftomo.file_io.reader import read_mic_xrf_file, read_mic_xrf_shapes, select_projections, clip_window, frame_window, place_projection
+from xrftomo.precision import get_working_dtype
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+
+class CancelToken(object):
+    """
+    Thread safe flag used to stop a running load
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def reset(self):
+        self._event.clear()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def load_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_tag, workers=4, progress=None, cancel=None, window=None, projections=None, stride=1, binning=1):
+    """
+    Loads a series of xrf hdf files into a 4D array using a pool of worker threads.
+    Projections are written into the array as the files finish.
+
+    Parameters
+    ----------
+    path_files: list
+        List of (path + filenames)
+    elements : list
+        element names to read
+    data_tag: str
+        data tag for corresponding roi_tag (ex. MAPS/XRF_roi)
+    element_tag : str
+        String defining the hdf5 channel tag name (ex. channel_names)
+    scalers : list
+        scaler names to read
+    scaler_tag : str
+        String defining the hdf5 scaler tag name (ex. scaler_names)
+    workers : int
+        number of files read concurrently
+    progress : callable, optional
+        called as progress(n, total) from the calling thread each time a file finishes
+    cancel : CancelToken, optional
+        token checked between files; pending files are dropped once it is cancelled
+    window : tuple, optional
+        (y0, y1, x0, x1) region of the dataset frame to read, only this
+        hyperslab is read from each file
+    projections : list, optional
+        indices of the files to read, defaults to all of them
+    stride : int
+        read every stride-th of the selected files
+    binning : int
+        preview mode, each projection is block-mean binned by this factor as it arrives
+
+    Returns
+    -------
+    ndarray: ndarray
+        4D array [elements, projection, y, x], or None when cancelled
+    """
+    selection = select_projections(len(path_files), projections, stride)
+    num_files = len(selection)
+    num_channels = len(elements) + len(scalers)
+    workers = max(1, int(workers))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        #get max dimensons from the dataset headers only, over all files so the window
+        #refers to the same frame whatever subset is read
+        max_y, max_x = 0, 0
+        shapes = read_mic_xrf_shapes(path_files, data_tag, workers)
+        for shape in shapes:
+            if shape is not None:
+                max_y = max(max_y, shape[0])
+                max_x = max(max_x, shape[1])
+        window = clip_window(window, (max_y, max_x))
+        frame_shape = (window[1]-window[0], window[3]-window[2])
+        binning = max(1, int(binning))
+
+        data = np.zeros([num_channels, num_files, frame_shape[0]//binning, frame_shape[1]//binning], dtype=get_working_dtype())
+        jobs = {}
+        targets = {}
+        for j, i in enumerate(selection):
+            if shapes[i] is None:
+                continue
+            file_window, targets[j] = frame_window(shapes[i], (max_y, max_x), window)
+            if file_window is None:
+                continue
+            job = pool.submit(read_mic_xrf_file, path_files[i], elements, data_tag, element_tag, scalers, scaler_tag, file_window)
+            jobs[job] = j
+
+        loaded = 0
+        pending = set(jobs)
+        while len(pending) > 0:
+            if cancel is not None and cancel.cancelled:
+                for job in pending:
+                    job.cancel()
+                print("loading cancelled after {}/{} files".format(loaded, len(jobs)))
+                return None
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for job in done:
+                j = jobs[job]
+                fname = path_files[selection[j]]
+                loaded += 1
+                try:
+                    planes, elapsed = job.result()
+                    print("{}/{} read {} in {:.3f} s".format(loaded, len(jobs), os.path.basename(fname), elapsed))
+                    place_projection(data, j, planes, targets[j], frame_shape, binning)
+                except Exception as error:
+                    print(error)
+                    print("WARNING: possible error with file: {}. Check file integrity. Filling with zeros for this projection.".format(fname))
+                if progress is not None:
+                    progress(loaded, len(jobs))
+
+    data[np.isnan(data)] = 0.0001
+    data[data == np.inf] = 0.0001
+
+    return data
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for the per-directory index of xrf hdf file metadata.
+
+The index is a small SQLite file stored next to the scan files (or in
+~/.xrftomo/index when the scan directory is read-only) with one row per file.
+It keeps the channel names, data shapes and theta values read so far and
+drops a file's entries as soon as its modification time or size changes.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['INDEX_NAME',
+           'MetadataIndex',
+           'get_metadata_index',
+           'set_metadata_index_enabled',
+           'read_theta',
+           'read_theta_value']
+
+INDEX_NAME = ".xrftomo_index.sqlite"
+_enabled = True
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def set_metadata_index_enabled(enabled):
+    """
+    Turn the metadata index used by load_thetas and read_mic_xrf_shapes on or off
+
+    Parameters
+    ----------
+    enabled : bool
+    """
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def get_metadata_index(directory):
+    """
+    Returns the shared MetadataIndex of a directory
+
+    Parameters
+    ----------
+    directory : str
+
+    Returns
+    -------
+    index : MetadataIndex or None
+        None when the index is disabled or cannot be opened
+    """
+    if not _enabled:
+        return None
+    directory = os.path.abspath(directory)
+    with _indexes_lock:
+        if directory not in _indexes:
+            try:
+                _indexes[directory] = MetadataIndex(directory)
+            except (sqlite3.Error, OSError) as error:
+                print("metadata index unavailable for {}: {}".format(directory, error))
+                return None
+        return _indexes[directory]
+
+
+def read_theta_value(img, theta_path, row=0, col=0):
+    """
+    Reads the raw theta entry of an open xrf hdf file, fetching only that
+    element of the dataset
+
+    Parameters
+    ----------
+    img : h5py.File
+        open hdf file
+    theta_path : str
+        path of the theta dataset (ex. MAPS/extra_pvs_as_csv)
+    row : int
+        row of the theta entry
+    col : int
+        column of the theta entry for 2D datasets
+
+    Returns
+    -------
+    value : float or str
+        numeric entries as float, string PVs decoded but not parsed
+    """
+    dset = img[theta_path]
+    if len(dset.shape) == 1:
+        value = dset[row]
+    elif len(dset.shape) == 2:
+        value = dset[row, col]
+    elif len(dset.shape) == 0:
+        value = dset[()]
+    else:
+        raise ValueError("unsupported theta dataset shape {}".format(dset.shape))
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    if isinstance(value, str):
+        return value
+    return float(value)
+
+
+def read_theta(img, theta_path, row=0, col=0):
+    """
+    Reads the theta value of an open xrf hdf file
+
+    Parameters
+    ----------
+    img : h5py.File
+        open hdf file
+    theta_path : str
+        path of the theta dataset (ex. MAPS/extra_pvs_as_csv)
+    row : int
+        row of the theta entry
+    col : int
+        column of the theta entry for 2D datasets
+
+    Returns
+    -------
+    theta : float
+    """
+    return float(read_theta_value(img, theta_path, row, col))
+
+
+def _default_index_path(directory):
+    local = os.path.join(directory, INDEX_NAME)
+    if os.access(directory, os.W_OK):
+        return local
+    cache = os.path.join(os.path.expanduser("~"), ".xrftomo", "index")
+    os.makedirs(cache, exist_ok=True)
+    return os.path.join(cache, hashlib.sha1(directory.encode("utf-8")).hexdigest() + ".sqlite")
+
+
+class MetadataIndex(object):
+    """
+    Cached metadata of the xrf hdf files of one directory.
+
+    Every lookup first compares the file's current modification time and size
+    with the stored ones; files that changed are read again, the others are
+    answered from the index without opening them.
+
+    Parameters
+    ----------
+    directory : str
+        scan directory
+    index_path : str, optional
+        location of the SQLite file, defaults to INDEX_NAME in the directory
+    """
+    def __init__(self, directory, index_path=None):
+        self.directory = os.path.abspath(directory)
+        self.index_path = index_path or _default_index_path(self.directory)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, mtime REAL, size INTEGER, info TEXT)")
+        self._db.commit()
+        self._infos = {}
+        for name, mtime, size, info in self._db.execute("SELECT name, mtime, size, info FROM files"):
+            self._infos[name] = (mtime, size, json.loads(info))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _info(self, fname):
+        #cached info dict of a file, emptied when the file changed
+        name = os.path.basename(fname)
+        st = os.stat(fname)
+        stamp = (st.st_mtime, st.st_size)
+        cached = self._infos.get(name)
+        if cached is None or cached[:2] != stamp:
+            cached = stamp + ({},)
+            self._infos[name] = cached
+        return name, cached
+
+    def _store(self, names):
+        with self._lock:
+            rows = [(name,) + self._infos[name][:2] + (json.dumps(self._infos[name][2]),) for name in set(names)]
+            self._db.executemany("INSERT OR REPLACE INTO files (name, mtime, size, info) VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _lookup(self, files, section, key, read, workers=1):
+        #values of one (section, key) for several files, reading only the stale ones
+        values = [None]*len(files)
+        stale = []
+        with self._lock:
+            for i, fname in enumerate(files):
+                try:
+                    name, (mtime, size, info) = self._info(fname)
+                except OSError as error:
+                    values[i] = {"error": str(error)}
+                    continue
+                entry = info.get(section, {})
+                if key in entry:
+                    values[i] = entry[key]
+                else:
+                    stale.append(i)
+
+        def read_one(i):
+            try:
+                with h5py.File(files[i], "r") as img:
+                    return {"value": read(img)}
+            except Exception as error:
+                return {"error": str(error)}
+
+        if len(stale) > 0:
+            if workers > 1 and len(stale) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(read_one, stale))
+            else:
+                results = [read_one(i) for i in stale]
+            stored = []
+            with self._lock:
+                for i, result in zip(stale, results):
+                    values[i] = result
+                    #read errors may be transient (locks, network filesystems), retry them next time
+                    if "value" not in result:
+                        continue
+                    try:
+                        name, (mtime, size, info) = self._info(files[i])
+                    except OSError:
+                        continue
+                    info.setdefault(section, {})[key] = result
+                    stored.append(name)
+                self._store(stored)
+        return values
+
+    def channel_names(self, files, tag, workers=1):
+        """
+        Channel names (elements or scalers) of each file
+
+        Parameters
+        ----------
+        files : list
+            List of (path + filenames)
+        tag : str
+            String defining the hdf5 channel tag name (ex. MAPS/channel_names)
+        workers : int
+            number of stale files read concurrently
+
+        Returns
+        -------
+        names : list
+            one list of channel names per file, None where the file could not be read
+        """
+        def read(img):
+            return [x.decode("utf-8") if isinstance(x, bytes) else str(x) for x in img[tag][...]]
+        return [v.get("value") for v in self._lookup(files, "channels", tag, read, workers)]
+
+    def data_shapes(self, files, data_tag, workers=1):
+        """
+        Projection dimensions of each file
+
+        Parameters
+        ----------
+        files : list
+            List of (path + filenames)
+        data_tag : str
+            data tag for corresponding dataset (ex. MAPS/XRF_roi)
+        workers : int
+            number of stale files read concurrently
+
+        Returns
+        -------
+        shapes : list
+            (y, x) per file, or the error message where the file could not be read
+        """
+        values = self._lookup(files, "shapes", data_tag, lambda img: list(img[data_tag].shape[-2:]), workers)
+        return [tuple(v["value"]) if "value" in v else v["error"] for v in values]
+
+    def theta_values(self, files, theta_path, row=0, col=0, workers=1):
+        """
+        Raw theta entry of each file, see read_theta_value
+
+        Parameters
+        ----------
+        files : list
+            List of (path + filenames)
+        theta_path : str
+            path of the theta dataset
+        row : int
+        col : int
+        workers : int
+            number of stale files read concurrently
+
+        Returns
+        -------
+        values : list
+            float or str per file, None where it could not be read
+        """
+        key = "{}|{}|{}".format(theta_path, row, col)
+        values = self._lookup(files, "thetas", key, lambda img: read_theta_value(img, theta_path, row, col), workers)
+        return [v.get("value") for v in values]
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for saving and reopening xrftomo projects: a single hdf file holding
+the dataset, thetas, filenames, alignment, reconstructions and processing
+history. Planes are stored in compressed per (element, projection) chunks so
+a project can be reopened lazily.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import h5py
+from xrftomo.file_io.lazy_stack import LazyXRFStack
+from xrftomo.precision import get_working_dtype
+try:
+    import hdf5plugin
+    HDF5PLUGIN_AVAILABLE = True
+except ImportError:
+    HDF5PLUGIN_AVAILABLE = False
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['PROJECT_FORMAT',
+           'PROJECT_COMPRESSIONS',
+           'ProjectStack',
+           'is_project',
+           'save_project',
+           'open_project']
+
+PROJECT_FORMAT = "xrftomo-project"
+PROJECT_VERSION = 1
+PROJECT_COMPRESSIONS = ("auto", "lz4", "blosc", "gzip", "none")
+
+
+def compression_filters(compression):
+    """
+    h5py dataset keywords for a compression name. lz4 and blosc need the
+    hdf5plugin package, without it they fall back to gzip level 1.
+    """
+    if compression == "auto":
+        compression = "lz4" if HDF5PLUGIN_AVAILABLE else "gzip"
+    if compression in ("lz4", "blosc") and not HDF5PLUGIN_AVAILABLE:
+        print("WARNING: hdf5plugin not installed, {} not available. Using gzip.".format(compression))
+        compression = "gzip"
+    if compression == "lz4":
+        return dict(hdf5plugin.LZ4())
+    if compression == "blosc":
+        return dict(hdf5plugin.Blosc(cname="lz4", clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+    if compression == "gzip":
+        return {"compression": "gzip", "compression_opts": 1, "shuffle": True}
+    return {}
+
+def _encode(strings):
+    return np.array([str(s).encode("utf-8") for s in strings], dtype=h5py.string_dtype("utf-8"))
+
+def _decode(values):
+    return [v.decode("utf-8") if isinstance(v, bytes) else str(v) for v in values]
+
+def is_project(path):
+    """
+    True if path is a project saved by save_project
+    """
+    try:
+        with h5py.File(path, "r") as fid:
+            return fid.attrs.get("format", "") == PROJECT_FORMAT
+    except (OSError, IOError):
+        return False
+
+def save_project(path, data, thetas, fnames, elements, x_shifts=None, y_shifts=None, recon_dict=None, history=None, compression="auto"):
+    """
+    Writes a project file
+
+    Parameters
+    ----------
+    path : str
+        output hdf file
+    data : ndarray
+        4D xrf dataset [elements, theta, y, x], may be a LazyXRFStack
+    thetas : ndarray
+    fnames : list
+    elements : list
+    x_shifts : ndarray, optional
+    y_shifts : ndarray, optional
+    recon_dict : dict, optional
+        element name: 3D reconstruction [slice, y, x]
+    history : DataHistory, optional
+        processing steps recorded so far, only their kind, thetas, filenames
+        and shifts are saved
+    compression : str
+        one of PROJECT_COMPRESSIONS
+    """
+    filters = compression_filters(compression)
+    num_projections = data.shape[1]
+    with h5py.File(path, "w") as fid:
+        fid.attrs["format"] = PROJECT_FORMAT
+        fid.attrs["version"] = PROJECT_VERSION
+        fid.create_dataset("elements", data=_encode(elements))
+        fid.create_dataset("names", data=_encode([name.split("/")[-1] for name in fnames]))
+        fid.create_dataset("thetas", data=np.asarray(thetas, dtype=float))
+        for name, shifts in (("x_shifts", x_shifts), ("y_shifts", y_shifts)):
+            if shifts is None or len(shifts) != num_projections:
+                shifts = np.zeros(num_projections)
+            fid.create_dataset(name, data=np.asarray(shifts, dtype=float))
+
+        dset = fid.create_dataset("data", shape=data.shape, dtype=getattr(data, "dtype", get_working_dtype()),
+                                  chunks=(1, 1) + tuple(data.shape[2:]), **filters)
+        #one projection at a time so a lazy stack is never loaded whole
+        for j in range(num_projections):
+            dset[:, j] = data[:, j]
+
+        recons = fid.create_group("recons")
+        for element, recon in (recon_dict or {}).items():
+            recon = np.asarray(recon)
+            if recon.ndim != 3 or recon.size == 0:
+                continue
+            recons.create_dataset(element, data=recon, chunks=(1,) + recon.shape[1:], **filters)
+
+        steps = fid.create_group("history")
+        for i, entry in enumerate(getattr(history, "entries", [])):
+            step = steps.create_group("{:04d}".format(i))
+            step.attrs["kind"] = entry["kind"]
+            meta = entry["meta"]
+            step.create_dataset("thetas", data=np.asarray(meta["thetas"], dtype=float))
+            step.create_dataset("names", data=_encode(meta["fnames"]))
+            step.create_dataset("x_shifts", data=np.asarray(meta["x_shifts"], dtype=float))
+            step.create_dataset("y_shifts", data=np.asarray(meta["y_shifts"], dtype=float))
+
+def open_project(path, lazy=False):
+    """
+    Reads a project file
+
+    Parameters
+    ----------
+    path : str
+        project hdf file
+    lazy : bool
+        return the dataset as a ProjectStack that decodes planes on first use,
+        otherwise the whole dataset is read into an ndarray
+
+    Returns
+    -------
+    project : dict
+        'data', 'thetas', 'fnames', 'elements', 'x_shifts', 'y_shifts',
+        'recon_dict' and 'history', a list of dicts with the saved steps
+    """
+    with h5py.File(path, "r") as fid:
+        project = {"elements": _decode(fid["elements"][...]),
+                   "fnames": _decode(fid["names"][...]),
+                   "thetas": np.asarray(fid["thetas"][...], dtype=float)}
+        num_projections = len(project["thetas"])
+        for name in ("x_shifts", "y_shifts"):
+            project[name] = np.asarray(fid[name][...], dtype=float) if name in fid else np.zeros(num_projections)
+        project["recon_dict"] = {}
+        if "recons" in fid:
+            for element in fid["recons"]:
+                project["recon_dict"][element] = np.asarray(fid["recons"][element][...], dtype=get_working_dtype())
+        project["history"] = []
+        if "history" in fid:
+            for key in sorted(fid["history"]):
+                step = fid["history"][key]
+                project["history"].append({"kind": step.attrs["kind"],
+                                           "thetas": step["thetas"][...],
+                                           "fnames": _decode(step["names"][...]),
+                                           "x_shifts": step["x_shifts"][...],
+                                           "y_shifts": step["y_shifts"][...]})
+        if not lazy:
+            project["data"] = np.asarray(fid["data"][...], dtype=get_working_dtype())
+    if lazy:
+        project["data"] = ProjectStack(path)
+    return project
+
+
+class ProjectStack(LazyXRFStack):
+    """
+    LazyXRFStack over the chunked dataset of a project file. Planes are
+    decompressed the first time they are indexed.
+
+    Parameters
+    ----------
+    path : str
+        project hdf file
+    data_tag : str
+        dataset holding the 4D stack
+    cache_dir : str, optional
+        directory holding the memmap cache, defaults to the system temp directory
+    dtype : numpy dtype, optional
+        dtype of the cached planes, defaults to the working dtype
+    """
+    def __init__(self, path, data_tag="data", cache_dir=None, dtype=None):
+        self.path = path
+        self.data_tag = data_tag
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype if dtype is not None else get_working_dtype())
+        with h5py.File(path, "r") as fid:
+            self.shape = tuple(fid[data_tag].shape)
+        self.frame_shapes = []
+        self._open_cache()
+
+    def __repr__(self):
+        return "ProjectStack(shape={}, dtype={}, loaded={}/{})".format(self.shape, self.dtype, int(self._loaded.sum()), self._loaded.size)
+
+    def _read(self, j, channels, row=None):
+        if row is None:
+            out = np.zeros((len(channels), self.shape[2], self.shape[3]), dtype=self.dtype)
+        else:
+            out = np.zeros((len(channels), self.shape[3]), dtype=self.dtype)
+        unique_idx, inverse = np.unique(channels, return_inverse=True)
+        try:
+            with h5py.File(self.path, "r") as fid:
+                dset = fid[self.data_tag]
+                if row is None:
+                    out[:] = dset[unique_idx.tolist(), j][inverse]
+                else:
+                    out[:] = dset[unique_idx.tolist(), j, row][inverse]
+        except Exception as error:
+            print(error)
+            print("WARNING: possible error with project file: {}. Filling with zeros for this projection.".format(self.path))
+        return out
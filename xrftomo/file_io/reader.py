@@ -56,6 +56,10 @@ from skimage import io
 import csv
 import os
 import sys
+import time
+from xrftomo.precision import get_working_dtype
+from xrftomo.file_io.metadata_index import get_metadata_index, read_theta_value
+from concurrent.futures import ThreadPoolExecutor
 
 __author__ = "Francesco De Carlo, Fabricio S. Marin"
 __copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
@@ -87,9 +91,30 @@ def find_elements(channel_names):
     return elements
 
 
+def indexed_channel_names(fname, tag):
+    """
+    Channel names of a file from its directory's metadata index
+
+    Parameters
+    ----------
+    fname : str
+        String defining the file name
+    tag : str
+        String defining the hdf5 channel tag name (ex. MAPS/channel_names)
+
+    Returns
+    -------
+    channel_names : list or None
+        None when the index is disabled or the names could not be read
+    """
+    index = get_metadata_index(os.path.dirname(os.path.abspath(fname)))
+    if index is None:
+        return None
+    return index.channel_names([fname], tag)[0]
+
 def read_channel_names(fname, element_tag):
     """
-    Read the channel names
+    Read the channel names, through the directory's metadata index when enabled
 
     Parameters
     ----------
@@ -103,8 +128,11 @@ def read_channel_names(fname, element_tag):
         List of channel names
 
     """
-    img = h5py.File(fname, "r")
-    element_list = list(img[element_tag])
+    element_list = indexed_channel_names(fname, element_tag)
+    if element_list is not None:
+        return element_list
+    with h5py.File(fname, "r") as img:
+        element_list = list(img[element_tag])
     element_list = [x.decode("utf-8") for x in element_list]
     return(element_list)
 
@@ -138,34 +166,126 @@ def read_projection(fname, element, data_tag, element_tag):
     projection = img[data_tag][idx]
     return projection
 
-def load_thetas(files, theta_path, row=0, col=0):
-    thetas = []
-    loaded_files = []
-    for file in files:
-        img = h5py.File(file, "r")
+def parse_thetas(values):
+    """
+    Converts raw theta entries to floats in bulk
+
+    Parameters
+    ----------
+    values : list
+        float, str or None per file, as returned by read_theta_value
+
+    Returns
+    -------
+    thetas : ndarray
+        float64 thetas, NaN where the entry is missing or not a number
+    errors : ndarray
+        bool mask of the entries that could not be converted
+    """
+    thetas = np.full(len(values), np.nan)
+    strings = np.array([isinstance(v, str) for v in values], dtype=bool)
+    numbers = np.array([v is not None and not isinstance(v, str) for v in values], dtype=bool)
+    if numbers.any():
+        thetas[numbers] = np.array([values[i] for i in np.nonzero(numbers)[0]], dtype=np.float64)
+    if strings.any():
+        idx = np.nonzero(strings)[0]
+        text = np.char.strip(np.array([values[i] for i in idx], dtype=str))
         try:
-            if len(img[theta_path].shape) == 1:
-                if img[theta_path][row] is bytes:
-                    theta = float(img[theta_path][row].decode("utf-8"))
-                else:
-                    theta = float(img[theta_path][row])
-            elif len(img[theta_path].shape) == 2:
-                if img[theta_path][row][col] is bytes:
-                    theta = float(img[theta_path][row][col].decode("utf-8"))
-                else:
-                    theta = float(img[theta_path][row][col])
-            elif len(img[theta_path].shape) == 0:
-                if img[theta_path][0] is bytes:
-                    theta = float(img[theta_path][0].decode("utf-8"))
-                else:
-                    theta = float(img[theta_path][0])
-            else:
-                print("error reading thetas position for file: {}".format(file))
-            thetas.append(theta)
-            loaded_files.append(file)
-        except:
-            print("error reading thetas position for file: {}".format(file))
-    return thetas, loaded_files
+            thetas[idx] = text.astype(np.float64)
+        except ValueError:
+            #at least one entry is not a number, fall back to one at a time
+            for i, t in zip(idx, text):
+                try:
+                    thetas[i] = float(t)
+                except ValueError:
+                    pass
+    errors = np.isnan(thetas)
+    return thetas, errors
+
+def scan_thetas(files, theta_path, row=0, col=0, workers=4):
+    """
+    Reads the theta value of each file on a pool of worker threads, through
+    the directory's metadata index when enabled. Only the single theta entry
+    is read from each file.
+
+    Parameters
+    ----------
+    files : list
+        List of (path + filenames)
+    theta_path : str
+        path of the theta dataset (ex. MAPS/extra_pvs_as_csv)
+    row : int
+        row of the theta entry
+    col : int
+        column of the theta entry for 2D datasets
+    workers : int
+        number of files read concurrently
+
+    Returns
+    -------
+    thetas : ndarray
+        float64 theta per file, NaN where it could not be read
+    errors : ndarray
+        bool mask of the files whose theta could not be read
+    """
+    files = list(files)
+    workers = max(1, int(workers))
+    values = [None]*len(files)
+
+    def read_one(fname):
+        try:
+            with h5py.File(fname, "r") as img:
+                return read_theta_value(img, theta_path, row, col)
+        except Exception:
+            return None
+
+    by_directory = {}
+    for i, file in enumerate(files):
+        by_directory.setdefault(os.path.dirname(os.path.abspath(file)), []).append(i)
+    for directory, idx in by_directory.items():
+        index = get_metadata_index(directory)
+        if index is not None:
+            found = index.theta_values([files[i] for i in idx], theta_path, row, col, workers)
+        elif workers > 1 and len(idx) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                found = list(pool.map(read_one, [files[i] for i in idx]))
+        else:
+            found = [read_one(files[i]) for i in idx]
+        for i, value in zip(idx, found):
+            values[i] = value
+    return parse_thetas(values)
+
+def load_thetas(files, theta_path, row=0, col=0, workers=4):
+    """
+    Reads the theta value of each file, dropping the files where it could not be read
+
+    Parameters
+    ----------
+    files : list
+        List of (path + filenames)
+    theta_path : str
+        path of the theta dataset (ex. MAPS/extra_pvs_as_csv)
+    row : int
+        row of the theta entry
+    col : int
+        column of the theta entry for 2D datasets
+    workers : int
+        number of files read concurrently
+
+    Returns
+    -------
+    thetas : list
+        theta of each file that could be read
+    loaded_files : list
+        files matching thetas
+    """
+    files = list(files)
+    thetas, errors = scan_thetas(files, theta_path, row, col, workers)
+    if errors.any():
+        print("error reading thetas position for {} of {} files: {}".format(int(errors.sum()), len(files),
+              ", ".join(os.path.basename(files[i]) for i in np.nonzero(errors)[0])))
+    keep = np.nonzero(~errors)[0]
+    return [float(thetas[i]) for i in keep], [files[i] for i in keep]
 
 def load_thetas_file(path_file):
 
@@ -201,7 +321,308 @@ def load_thetas_file(path_file):
     else:
         return
 
-def read_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_tag):
+def read_planes(img, names, data_tag, name_tag, window=None, channel_names=None):
+    """
+    Reads several channel planes from an already open xrf hdf file in a single read
+
+    Parameters
+    ----------
+    img : h5py.File
+        open hdf file
+    names : list
+        channel names to select (elements or scalers)
+    data_tag : str
+        data tag for corresponding dataset (ex. MAPS/XRF_roi)
+    name_tag : str
+        String defining the hdf5 channel tag name (ex. MAPS/channel_names)
+    window : tuple, optional
+        (y0, y1, x0, x1) region to read as a hyperslab, parts outside the
+        dataset are filled with zeros
+    channel_names : list, optional
+        names stored under name_tag when already known, e.g. from the metadata index
+
+    Returns
+    -------
+    planes : ndarray
+        3D array [channel, y, x], zeros for channels not found in the file
+    missing : list
+        channel names not found in the file
+    """
+    if channel_names is None:
+        channel_names = [x.decode("utf-8") if isinstance(x, bytes) else str(x) for x in img[name_tag][...]]
+    dset = img[data_tag]
+    if window is None:
+        window = (0, dset.shape[1], 0, dset.shape[2])
+    y0, y1, x0, x1 = window
+    planes = np.zeros((len(names), y1-y0, x1-x0), dtype=get_working_dtype())
+    lookup = {name: i for i, name in reversed(list(enumerate(channel_names)))}
+    missing = [name for name in names if name not in lookup]
+    found = [i for i, name in enumerate(names) if name in lookup]
+    if len(found) == 0:
+        return planes, missing
+
+    #h5py fancy indexing requires increasing, unique indices
+    channel_idx = np.array([lookup[names[i]] for i in found])
+    unique_idx, inverse = np.unique(channel_idx, return_inverse=True)
+    y_end = min(y1, dset.shape[1])
+    x_end = min(x1, dset.shape[2])
+    if y_end > y0 and x_end > x0:
+        region = dset[unique_idx.tolist(), y0:y_end, x0:x_end]
+        planes[found, :y_end-y0, :x_end-x0] = region[inverse]
+    return planes, missing
+
+def read_mic_xrf_file(fname, elements, data_tag, element_tag, scalers, scaler_tag, window=None):
+    """
+    Reads all selected element and scaler planes from a single xrf hdf file,
+    opening the file once.
+
+    Parameters
+    ----------
+    fname : str
+        String defining the file name
+    elements : list
+        element names to read
+    data_tag : str
+        data tag for corresponding dataset (ex. MAPS/XRF_roi)
+    element_tag : str
+        String defining the hdf5 channel tag name (ex. MAPS/channel_names)
+    scalers : list
+        scaler names to read
+    scaler_tag : str
+        String defining the hdf5 scaler tag name (ex. MAPS/scaler_names)
+    window : tuple, optional
+        (y0, y1, x0, x1) region of the projection to read, defaults to all of it
+
+    Returns
+    -------
+    planes : ndarray
+        3D array [elements + scalers, y, x]
+    elapsed : float
+        time spent reading the file in seconds
+    """
+    t0 = time.perf_counter()
+    num_elements = len(elements)
+    element_names = indexed_channel_names(fname, element_tag) if num_elements > 0 else None
+    scaler_names = indexed_channel_names(fname, scaler_tag) if len(scalers) > 0 else None
+    with h5py.File(fname, "r") as img:
+        if window is None:
+            window = (0,) + img[data_tag].shape[1:2] + (0,) + img[data_tag].shape[2:3]
+        y0, y1, x0, x1 = window
+        planes = np.zeros((num_elements + len(scalers), y1-y0, x1-x0), dtype=get_working_dtype())
+        if num_elements > 0:
+            planes[:num_elements], missing = read_planes(img, elements, data_tag, element_tag, window, element_names)
+            if len(missing) > 0:
+                print("WARNING: {} not found in file: {}. Filling with zeros.".format(", ".join(missing), fname))
+        if len(scalers) > 0:
+            try:
+                scaler_data_tag = data_tag.split("/")[0]+"/scalers"
+                #full scaler rows are read since the scalers are rolled by one column
+                scaler_width = img[scaler_data_tag].shape[2]
+                scaler_planes, missing = read_planes(img, scalers, scaler_data_tag, scaler_tag, (y0, y1, 0, scaler_width), scaler_names)
+                if len(missing) > 0:
+                    print("WARNING: {} not found in file: {}. Filling with zeros.".format(", ".join(missing), fname))
+                scaler_planes = np.roll(scaler_planes, 1, axis=2)[:, :, x0:x1]
+                planes[num_elements:, :, :scaler_planes.shape[2]] = scaler_planes
+            except Exception as error:
+                print(error)
+                print("WARNING: possible error with scaler data in file: {}. Check file integrity. Filling with zeros for this scaler.".format(fname))
+    elapsed = time.perf_counter() - t0
+    return planes, elapsed
+
+def read_mic_xrf_shape(fname, data_tag):
+    """
+    Reads the projection dimensions of a single xrf hdf file without reading the data
+
+    Parameters
+    ----------
+    fname : str
+        String defining the file name
+    data_tag : str
+        data tag for corresponding dataset (ex. MAPS/XRF_roi)
+
+    Returns
+    -------
+    shape : tuple
+        (y, x) dimensions of the projection
+    """
+    with h5py.File(fname, "r") as img:
+        return img[data_tag].shape[-2:]
+
+def select_projections(num_files, projections=None, stride=1):
+    """
+    Indices of the files to load
+
+    Parameters
+    ----------
+    num_files : int
+        number of files in the series
+    projections : list, optional
+        indices of the projections to load, defaults to all of them
+    stride : int
+        keep every stride-th of the selected projections
+
+    Returns
+    -------
+    selection : ndarray
+        file indices
+    """
+    if projections is None:
+        selection = np.arange(num_files)
+    else:
+        selection = np.asarray(projections, dtype=int).reshape(-1)
+    return selection[::max(1, int(stride))]
+
+def clip_window(window, frame_shape):
+    """
+    Clips a (y0, y1, x0, x1) window to a frame, None selects the whole frame
+
+    Parameters
+    ----------
+    window : tuple or None
+    frame_shape : tuple
+        (y, x) frame dimensions
+
+    Returns
+    -------
+    window : tuple
+        (y0, y1, x0, x1) inside the frame
+    """
+    max_y, max_x = frame_shape
+    if window is None:
+        return (0, max_y, 0, max_x)
+    y0, y1, x0, x1 = [int(round(v)) for v in window]
+    y0 = min(max(y0, 0), max_y)
+    x0 = min(max(x0, 0), max_x)
+    return (y0, min(max(y1, y0), max_y), x0, min(max(x1, x0), max_x))
+
+def frame_window(frame_shape, padded_shape, window):
+    """
+    Maps a window of the padded dataset frame onto one file's projection.
+    Projections smaller than the dataset frame are centred in it.
+
+    Parameters
+    ----------
+    frame_shape : tuple
+        (y, x) dimensions of the file's projection
+    padded_shape : tuple
+        (y, x) dimensions of the dataset frame
+    window : tuple
+        (y0, y1, x0, x1) inside the dataset frame
+
+    Returns
+    -------
+    file_window : tuple or None
+        (y0, y1, x0, x1) to read from the file, None if the window misses the projection
+    target : tuple
+        (y slice, x slice) where the read region goes in the windowed dataset
+    """
+    dy = (padded_shape[0]-frame_shape[0])//2
+    dx = (padded_shape[1]-frame_shape[1])//2
+    y0, y1, x0, x1 = window
+    fy0 = max(y0-dy, 0)
+    fy1 = min(y1-dy, frame_shape[0])
+    fx0 = max(x0-dx, 0)
+    fx1 = min(x1-dx, frame_shape[1])
+    if fy1 <= fy0 or fx1 <= fx0:
+        return None, None
+    return (fy0, fy1, fx0, fx1), (slice(fy0+dy-y0, fy1+dy-y0), slice(fx0+dx-x0, fx1+dx-x0))
+
+def bin_planes(planes, factor):
+    """
+    Block-mean reduction of the last two axes. Rows and columns left over
+    when the frame is not a multiple of factor are dropped.
+
+    Parameters
+    ----------
+    planes : ndarray
+        array [..., y, x]
+    factor : int
+        block size
+
+    Returns
+    -------
+    binned : ndarray
+        array [..., y//factor, x//factor]
+    """
+    factor = int(factor)
+    if factor <= 1:
+        return planes
+    y = planes.shape[-2]//factor
+    x = planes.shape[-1]//factor
+    blocks = planes[..., :y*factor, :x*factor].reshape(planes.shape[:-2] + (y, factor, x, factor))
+    return blocks.mean(axis=(-3, -1), dtype=planes.dtype)
+
+def place_projection(data, index, planes, target, frame_shape, binning=1):
+    """
+    Writes the planes read from one file into projection index of data,
+    binning the frame first when loading a preview
+
+    Parameters
+    ----------
+    data : ndarray
+        4D array [channel, projection, y, x]
+    index : int
+        projection index
+    planes : ndarray
+        3D array [channel, y, x] read from the file
+    target : tuple
+        (y slice, x slice) of the planes in the full resolution frame
+    frame_shape : tuple
+        (y, x) full resolution frame dimensions
+    binning : int
+        block size of the preview, 1 for full resolution
+    """
+    if binning > 1:
+        frame = np.zeros((planes.shape[0],) + tuple(frame_shape), dtype=data.dtype)
+        frame[:, target[0], target[1]] = planes
+        data[:, index] = bin_planes(frame, binning)
+    else:
+        data[:, index, target[0], target[1]] = planes
+
+def read_mic_xrf_shapes(path_files, data_tag, workers=1):
+    """
+    Reads the projection dimensions of several xrf hdf files, through the
+    directory's metadata index when enabled
+
+    Parameters
+    ----------
+    path_files: list
+        List of (path + filenames)
+    data_tag : str
+        data tag for corresponding dataset (ex. MAPS/XRF_roi)
+    workers : int
+        number of files read concurrently
+
+    Returns
+    -------
+    shapes : list
+        (y, x) dimensions per file, None for files that could not be read
+    """
+    path_files = list(path_files)
+    shapes = [None]*len(path_files)
+    by_directory = {}
+    for i, fname in enumerate(path_files):
+        by_directory.setdefault(os.path.dirname(os.path.abspath(fname)), []).append(i)
+    for directory, idx in by_directory.items():
+        index = get_metadata_index(directory)
+        if index is not None:
+            found = index.data_shapes([path_files[i] for i in idx], data_tag, workers)
+        else:
+            found = []
+            for i in idx:
+                try:
+                    found.append(tuple(read_mic_xrf_shape(path_files[i], data_tag)))
+                except Exception as error:
+                    found.append(str(error))
+        for i, shape in zip(idx, found):
+            if isinstance(shape, tuple):
+                shapes[i] = shape
+            else:
+                print(shape)
+                print("WARNING: possible error with file: {}. Skipping file when determining dimensions.".format(path_files[i]))
+    return shapes
+
+def read_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_tag, window=None, projections=None, stride=1, binning=1):
     """
     Converts hdf files to numpy arrays for plotting and manipulation
 
@@ -209,13 +630,25 @@ def read_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_ta
     ----------
     path_files: list
         List of (path + filenames)
-    theta_index : int
-        Index where theta is saved under in the hdf MAPS/extra_pvs_as_csv tag
-        This is: 2-ID-E: 663; 2-ID-E (prior 2017): *657*; BNP: 8
+    elements : list
+        element names to read
     data_tag: str
         data tag for corresponding roi_tag (ex. MAPS/XRF_roi)
-    channel_tag : str
+    element_tag : str
         String defining the hdf5 channel tag name (ex. channel_names)
+    scalers : list
+        scaler names to read
+    scaler_tag : str
+        String defining the hdf5 scaler tag name (ex. scaler_names)
+    window : tuple, optional
+        (y0, y1, x0, x1) region of the dataset frame to read, only this
+        hyperslab is read from each file
+    projections : list, optional
+        indices of the files to read, defaults to all of them
+    stride : int
+        read every stride-th of the selected files
+    binning : int
+        preview mode, each projection is block-mean binned by this factor as it is read
 
     Returns
     -------
@@ -224,80 +657,52 @@ def read_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_ta
     """
 
     max_y, max_x = 0, 0
-    num_files = len(path_files)
     num_elements = len(elements)
     num_scalers = len(scalers)
-    #get max dimensons
-    for i in range(num_files):
+    selection = select_projections(len(path_files), projections, stride)
+    num_files = len(selection)
+    #get max dimensons from the dataset headers only, over all files so the window
+    #refers to the same frame whatever subset is read
+    shapes = read_mic_xrf_shapes(path_files, data_tag)
+    for shape in shapes:
+        if shape is not None:
+            max_y = max(max_y, shape[0])
+            max_x = max(max_x, shape[1])
+    window = clip_window(window, (max_y, max_x))
+    frame_shape = (window[1]-window[0], window[3]-window[2])
+    binning = max(1, int(binning))
+
+    data = np.zeros([num_elements+num_scalers, num_files, frame_shape[0]//binning, frame_shape[1]//binning], dtype=get_working_dtype())
+    timings = np.zeros(num_files)
+    #get data, one open per file
+    for j, i in enumerate(selection):
+        if shapes[i] is None:
+            continue
+        file_window, target = frame_window(shapes[i], (max_y, max_x), window)
+        if file_window is None:
+            continue
         try:
-            proj = read_projection(path_files[i], elements[0], data_tag, element_tag)
+            planes, timings[j] = read_mic_xrf_file(path_files[i], elements, data_tag, element_tag, scalers, scaler_tag, file_window)
         except Exception as error:
             print(error)
-            print("WARNING: possible error with file: {}. Skipping file when determining dimensions.".format(path_files[i]))
-            proj = None
-        if proj is not None:
-            if proj.shape[0] > max_y:
-                max_y = proj.shape[0]
-            if proj.shape[1] > max_x:
-                max_x = proj.shape[1]
-
-    data = np.zeros([num_elements+num_scalers,num_files, max_y, max_x])
-    #get data
-    for i in range(num_elements):
-        for j in range(num_files):
-            try:
-                proj = read_projection(path_files[j], elements[i], data_tag, element_tag)
-            except Exception as error:
-                print(error)
-                print("WARNING: possible error with file: {}. Check file integrity. Filling with zeros for this projection.".format(path_files[j]))
-                proj = None
-            if proj is not None:
-                img_y = proj.shape[0]
-                img_x = proj.shape[1]
-                dx = (max_x-img_x)//2
-                dy = (max_y-img_y)//2
-                try:
-                    data[i, j, dy:img_y+dy, dx:img_x+dx] = proj
-                except Exception as error:
-                    print(error)
-                    print("WARNING: possible error with file: {}. Check file integrity. ".format(path_files[j]))
-                    data[i, j] = np.zeros([max_y,max_x])
-            else:
-                data[i, j] = np.zeros([max_y,max_x])
-
-    for i in range(num_scalers):
-        k = i+num_elements
-        for j in range(num_files):
-            try:
-                proj = read_projection(path_files[j], scalers[i], data_tag.split("/")[0]+"/scalers", scaler_tag)
-            except Exception as error:
-                print(error)
-                print("WARNING: possible error with scaler data in file: {}. Check file integrity. Filling with zeros for this scaler.".format(path_files[j]))
-                proj = None
-            if proj is not None:
-                proj = np.roll(proj,1, axis=1)
-                img_y = proj.shape[0]
-                img_x = proj.shape[1]
-                dx = (max_x-img_x)//2
-                dy = (max_y-img_y)//2
-                try:
-                    data[k, j, dy:img_y+dy, dx:img_x+dx] = proj
-                except Exception as error:
-                    print(error)
-                    print("WARNING: possible error with file: {}. Check file integrity. ".format(path_files[j]))
-                    data[k, j] = np.zeros([max_y,max_x])
-            else:
-                data[k, j] = np.zeros([max_y,max_x])
+            print("WARNING: possible error with file: {}. Check file integrity. Filling with zeros for this projection.".format(path_files[i]))
+            continue
+        print("{}/{} read {} in {:.3f} s".format(j+1, num_files, os.path.basename(path_files[i]), timings[j]))
+        place_projection(data, j, planes, target, frame_shape, binning)
 
+    if num_files > 0:
+        slowest = int(np.argmax(timings))
+        print("read {} files in {:.3f} s, slowest: {} ({:.3f} s)".format(num_files, timings.sum(), path_files[selection[slowest]], timings[slowest]))
 
     data[np.isnan(data)] = 0.0001
     data[data == np.inf] = 0.0001
 
     return data
 
-def read_tiffs(fnames):
+def read_tiffs(fnames, binning=1):
 
     #TODO:check if fnames is a series of tiffs or a single tiff stack
+    #binning > 1 loads a block-mean binned preview
     max_x, max_y = 0,0
     num_files = len(fnames)
     for i in fnames:
@@ -306,7 +711,8 @@ def read_tiffs(fnames):
             max_y = im.shape[0]
         if im.shape[1] > max_x:
             max_x = im.shape[1]
-    data = np.zeros([1,num_files, max_y, max_x])
+    binning = max(1, int(binning))
+    data = np.zeros([1,num_files, max_y//binning, max_x//binning], dtype=get_working_dtype())
 
     for i in range(len(fnames)):
         im = io.imread(fnames[i])
@@ -314,6 +720,6 @@ def read_tiffs(fnames):
         img_x = im.shape[1]
         dx = (max_x-img_x)//2
         dy = (max_y-img_y)//2
-        data[0,i, dy:img_y+dy, dx:img_x+dx] = im
+        place_projection(data, i, im[np.newaxis], (slice(dy, img_y+dy), slice(dx, img_x+dx)), (max_y, max_x), binning)
 
     return data
\ No newline at end of file
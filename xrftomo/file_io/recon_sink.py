@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for sinks that receive reconstructed slices while a reconstruction
+runs and write them to disk in the background.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import h5py
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from xrftomo.file_io.exporter import slice_names, write_tiff
+from xrftomo.file_io.project import compression_filters
+from xrftomo.precision import get_working_dtype
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['RECON_SINKS',
+           'SliceSink',
+           'TiffSink',
+           'HDF5Sink',
+           'open_recon_sink']
+
+RECON_SINKS = ("tiff", "hdf5")
+
+
+class SliceSink(ABC):
+    """
+    Receives blocks of reconstructed slices and writes them asynchronously.
+
+    A volume is written with begin(name, shape), any number of
+    push(name, start, slices) calls and end(name). Writes run on a thread
+    pool while the caller keeps reconstructing; at most max_pending blocks
+    are queued, push blocks once that many are waiting. Subclasses implement
+    _write and may override _begin, _end and _close.
+
+    Parameters
+    ----------
+    keep : bool
+        also assemble each volume in memory and return it from end()
+    workers : int
+        number of blocks written concurrently
+    max_pending : int
+        largest number of blocks queued for writing
+    """
+    def __init__(self, keep=True, workers=1, max_pending=4):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)))
+        self._slots = threading.Semaphore(max(1, int(max_pending)))
+        self._jobs = {}
+        self._volumes = {}
+
+    def begin(self, name, shape):
+        """
+        Starts a volume
+
+        Parameters
+        ----------
+        name : str
+            element name
+        shape : tuple
+            (slices, y, x) of the full volume
+        """
+        self._jobs[name] = []
+        self._volumes[name] = np.zeros(shape, dtype=get_working_dtype()) if self.keep else None
+        self._begin(name, tuple(shape))
+
+    def push(self, name, start, slices):
+        """
+        Queues slices [start, start+len(slices)) of a volume for writing
+
+        Parameters
+        ----------
+        name : str
+        start : int
+            index of the first slice in the volume
+        slices : ndarray
+            3D block [slice, y, x]
+        """
+        block = np.array(slices, dtype=np.float32)
+        if self._volumes.get(name) is not None:
+            self._volumes[name][start:start+len(block)] = block
+        self._slots.acquire()
+        job = self._pool.submit(self._write, name, start, block)
+        job.add_done_callback(lambda job: self._slots.release())
+        self._jobs[name].append(job)
+
+    def end(self, name):
+        """
+        Waits until every block of a volume is written
+
+        Returns
+        -------
+        volume : ndarray or None
+            the assembled volume when keep is set
+        """
+        jobs = self._jobs.pop(name, [])
+        wait(jobs)
+        for job in jobs:
+            if job.exception() is not None:
+                print(job.exception())
+                print("WARNING: failed to write part of the reconstruction for: {}".format(name))
+        self._end(name)
+        return self._volumes.pop(name, None)
+
+    def close(self):
+        """
+        Finishes open volumes and releases the writer threads
+        """
+        for name in list(self._jobs):
+            self.end(name)
+        self._pool.shutdown(wait=True)
+        self._close()
+
+    def _begin(self, name, shape):
+        pass
+
+    @abstractmethod
+    def _write(self, name, start, block):
+        """
+        Writes slices [start, start+len(block)) of a volume, called on a writer thread
+        """
+
+    def _end(self, name):
+        pass
+
+    def _close(self):
+        pass
+
+
+class TiffSink(SliceSink):
+    """
+    Writes each slice as {savedir}/{element}/{element}_recon_{0000}.tiff
+
+    Parameters
+    ----------
+    savedir : str
+        output directory, one sub folder per element
+    start_idx : int
+        number of the first slice in the file names
+    keep, workers, max_pending
+        see SliceSink
+    """
+    def __init__(self, savedir, start_idx=0, keep=True, workers=4, max_pending=8):
+        super(TiffSink, self).__init__(keep, workers, max_pending)
+        self.savedir = savedir
+        self.start_idx = start_idx
+
+    def _begin(self, name, shape):
+        os.makedirs(os.path.join(self.savedir, name), exist_ok=True)
+
+    def _write(self, name, start, block):
+        names = slice_names(os.path.join(self.savedir, name), name, "recon", len(block), self.start_idx+start)
+        for fname, img in zip(names, block):
+            write_tiff(fname, img)
+
+
+class HDF5Sink(SliceSink):
+    """
+    Writes each volume to {savedir}/{element}/{element}_recon.h5 as the
+    dataset recons/{element}, chunked per slice and compressed. Writes are
+    serialized on one thread since h5py files are not shared between threads.
+
+    Parameters
+    ----------
+    savedir : str
+        output directory, one sub folder per element
+    start_idx : int
+        row index of the first slice, stored as the start_idx attribute
+    compression : str
+        see xrftomo.PROJECT_COMPRESSIONS
+    keep, max_pending
+        see SliceSink
+    """
+    def __init__(self, savedir, start_idx=0, compression="auto", keep=True, max_pending=4):
+        super(HDF5Sink, self).__init__(keep, 1, max_pending)
+        self.savedir = savedir
+        self.start_idx = start_idx
+        self.filters = compression_filters(compression)
+        self._files = {}
+
+    def _begin(self, name, shape):
+        subdir = os.path.join(self.savedir, name)
+        os.makedirs(subdir, exist_ok=True)
+        fid = h5py.File(os.path.join(subdir, "{}_recon.h5".format(name)), "w")
+        dset = fid.create_dataset("recons/{}".format(name), shape=shape, dtype=np.float32,
+                                  chunks=(1,) + shape[1:], **self.filters)
+        dset.attrs["start_idx"] = self.start_idx
+        self._files[name] = fid
+
+    def _write(self, name, start, block):
+        self._files[name]["recons/{}".format(name)][start:start+len(block)] = block
+
+    def _end(self, name):
+        fid = self._files.pop(name, None)
+        if fid is not None:
+            fid.close()
+
+
+def open_recon_sink(kind, savedir, start_idx=0, keep=True, workers=4):
+    """
+    Creates the sink named kind, one of RECON_SINKS
+
+    Parameters
+    ----------
+    kind : str
+        'tiff' or 'hdf5'
+    savedir : str
+        output directory
+    start_idx : int
+        row index of the first slice
+    keep : bool
+        also return the reconstructed volumes
+    workers : int
+        writer threads for tiff output
+
+    Returns
+    -------
+    sink : SliceSink
+    """
+    if kind == "hdf5":
+        return HDF5Sink(savedir, start_idx, keep=keep)
+    return TiffSink(savedir, start_idx, keep=keep, workers=workers)
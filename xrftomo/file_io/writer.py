@@ -53,6 +53,7 @@ import numpy as np
 from skimage import io
 import h5py
 import sys
+import threading
 import xrftomo
 
 
@@ -63,6 +64,37 @@ class SaveOptions(object):
 		super(SaveOptions, self).__init__()
 		self.parent = parent
 
+	def export_workers(self):
+		try:
+			return self.parent.params.export_workers
+		except AttributeError:
+			return 4
+
+	def run_export(self, label, tasks):
+		'''
+		runs export tasks on a background thread while keeping the GUI responsive.
+		each task is called with a progress(n, total) callback.
+		'''
+		result = {}
+
+		def progress(n, total):
+			print("{}: {}/{}".format(label, n, total))
+
+		def run():
+			try:
+				for task in tasks:
+					task(progress)
+			except Exception as error:
+				result["error"] = error
+
+		worker = threading.Thread(target=run, daemon=True)
+		worker.start()
+		while worker.is_alive():
+			QApplication.processEvents()
+			worker.join(0.05)
+		if "error" in result:
+			raise result["error"]
+
 	def save_scatter_plot(self, fig):
 		try:
 			savedir = QFileDialog.getSaveFileName()[0]
@@ -85,9 +117,11 @@ class SaveOptions(object):
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
+			tasks = []
 			for j in range(data.shape[0]):  # element index
-				img = data[j]
-				io.imsave("{}/{}_proj.tiff".format(savedir,elements[j]), np.float32(img))
+				fname = "{}/{}_proj.tiff".format(savedir,elements[j])
+				tasks.append(lambda progress, j=j, fname=fname: xrftomo.export_tiff_stack(data[j], fname, progress=progress))
+			self.run_export("projections", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -101,15 +135,14 @@ class SaveOptions(object):
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
+			workers = self.export_workers()
+			tasks = []
 			for j in range(data.shape[0]):			#elemen t index
 				subdir = "{}/{}_proj".format(savedir,elements[j])
 				os.mkdir(subdir)
-				for i in range(data.shape[1]):		#angle index
-					indx = "0000"
-					recon_index = indx[:-len(str(i))] + str(i)
-					img = data[j, i]
-					img = img.astype(np.float32)
-					io.imsave("{}/{}_proj_{}.tiff".format(subdir,elements[j],str(recon_index)), np.float32(img))
+				names = xrftomo.slice_names(subdir, elements[j], "proj", data.shape[1])
+				tasks.append(lambda progress, j=j, names=names: xrftomo.export_slices(data[j], names, workers, progress=progress))
+			self.run_export("projections", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -123,9 +156,11 @@ class SaveOptions(object):
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
+			tasks = []
 			for j in range(data.shape[0]):  # elemen t index
-				stack = data[j]
-				np.save("{}/{}_proj.npy".format(savedir,elements[j]), np.float32(stack))
+				fname = "{}/{}_proj.npy".format(savedir,elements[j])
+				tasks.append(lambda progress, j=j, fname=fname: xrftomo.export_npy(data[j], fname, progress=progress))
+			self.run_export("projections", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -137,9 +172,11 @@ class SaveOptions(object):
 				savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
+			tasks = []
 			for key in recon_dict:  # elemen t index
-				recon = recon_dict[key]
-				io.imsave("{}/{}_recon.tiff".format(savedir,key),np.float32(recon))
+				fname = "{}/{}_recon.tiff".format(savedir,key)
+				tasks.append(lambda progress, key=key, fname=fname: xrftomo.export_tiff_stack(recon_dict[key], fname, progress=progress))
+			self.run_export("reconstructions", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -155,19 +192,17 @@ class SaveOptions(object):
 			if index == -1:
 				subdir = "{}/{}_recon".format(savedir,element)
 				os.mkdir(subdir)
-				for i in range(recon.shape[0]):
-					# recon = tomopy.circ_mask(recon, axis=0)
-					indx = "0000"
-					recon_index = indx[:-len(str(i))] + str(i)
-					io.imsave("{}/{}_recon_{}.tiff".format(subdir, element, str(recon_index)), np.float32(recon[i]))
-
+				# recon = tomopy.circ_mask(recon, axis=0)
+				names = xrftomo.slice_names(subdir, element, "recon", recon.shape[0])
+				stack = recon
 			else:
 				subdir = "{}/{}_proj".format(savedir,element)
 				os.mkdir(subdir)
 				# recon = tomopy.circ_mask(recon, axis=0)
-				indx = "0000"
-				recon_index = indx[:-len(str(index))]+str(index)
-				io.imsave("{}/{}_recon_{}.tiff".format(subdir, element, str(recon_index)), np.float32(recon[0]))
+				names = xrftomo.slice_names(subdir, element, "recon", 1, index)
+				stack = recon[:1]
+			workers = self.export_workers()
+			self.run_export("reconstruction", [lambda progress: xrftomo.export_slices(stack, names, workers, progress=progress)])
 
 			return
 		except IOError:
@@ -176,15 +211,27 @@ class SaveOptions(object):
 			print("Something went horribly wrong.")
 		return
 
+	def save_reconstruction(self, recon, savedir, index=0):
+		'''
+		save reconstruction slices as {savedir}_recon_{0000}.tiff, numbered from index
+		'''
+		try:
+			xrftomo.save_recon_slices(recon, savedir, index)
+		except Exception as e:
+			print(e)
+		return
+
 	def save_recon_npy(self, recon_dict):
 		try:
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
 			# recon = tomopy.circ_mask(recon, axis=0)
+			tasks = []
 			for key in recon_dict:  # elemen t index
-				recon = recon_dict[key]
-				np.save("{}/{}_recon.npy".format(savedir,key), np.float32(recon))
+				fname = "{}/{}_recon.npy".format(savedir,key)
+				tasks.append(lambda progress, key=key, fname=fname: xrftomo.export_npy(recon_dict[key], fname, progress=progress))
+			self.run_export("reconstructions", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -200,13 +247,11 @@ class SaveOptions(object):
 			if savedir == "":
 				raise IOError
 
-			sino = np.zeros((data.shape[0], data.shape[2], data.shape[1], data.shape[3]))
-			for i in range(data.shape[0]):
-				for j in range(data.shape[2]):
-					sino[i,j] = data[i,:,j,:]
-			for j in range(sino.shape[0]):  # elemen t index
-				img = sino[j]
-				io.imsave("{}/{}_sino.tiff".format(savedir,elements[j]), np.float32(img))
+			tasks = []
+			for j in range(data.shape[0]):  # elemen t index
+				fname = "{}/{}_sino.tiff".format(savedir,elements[j])
+				tasks.append(lambda progress, j=j, fname=fname: xrftomo.export_tiff_stack(xrftomo.sinogram_stack(data, j), fname, progress=progress))
+			self.run_export("sinograms", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -220,18 +265,14 @@ class SaveOptions(object):
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
-			sino = np.zeros((data.shape[0], data.shape[2], data.shape[1], data.shape[3]))
-			for i in range(data.shape[0]):
-				for j in range(data.shape[2]):
-					sino[i,j] = data[i,:,j,:]
-			for i in range(sino.shape[0]):  # elemen t index
+			workers = self.export_workers()
+			tasks = []
+			for i in range(data.shape[0]):  # elemen t index
 				subdir = "{}/{}_sino".format(savedir,elements[i])
 				os.mkdir(subdir)
-				for j in range(sino.shape[1]):  # angle index
-					indx = "0000"
-					recon_index = indx[:-len(str(j))] + str(j)
-					img = sino[i,j]
-					io.imsave("{}/{}_sino_{}.tiff".format(subdir, elements[i], str(recon_index)), np.float32(img))
+				names = xrftomo.slice_names(subdir, elements[i], "sino", data.shape[2])
+				tasks.append(lambda progress, i=i, names=names: xrftomo.export_slices(xrftomo.sinogram_stack(data, i), names, workers, progress=progress))
+			self.run_export("sinograms", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -245,13 +286,11 @@ class SaveOptions(object):
 			savedir = QFileDialog.getExistingDirectory()
 			if savedir == "":
 				raise IOError
-			sino = np.zeros((data.shape[0], data.shape[2], data.shape[1], data.shape[3]))
-			for i in range(data.shape[0]):
-				for j in range(data.shape[2]):
-					sino[i,j] = data[i,:,j,:]
-			for i in range(sino.shape[0]):  # elemen t index
-				stack = sino[i]
-				np.save("{}/{}_sino.npy".format(savedir,elements[i]), np.float32(stack))
+			tasks = []
+			for i in range(data.shape[0]):  # elemen t index
+				fname = "{}/{}_sino.npy".format(savedir,elements[i])
+				tasks.append(lambda progress, i=i, fname=fname: xrftomo.export_npy(xrftomo.sinogram_stack(data, i), fname, progress=progress))
+			self.run_export("sinograms", tasks)
 			return
 		except IOError:
 			print("type the header name")
@@ -336,12 +375,14 @@ class SaveOptions(object):
 			print("type the header name")
 		except Exception as e:
 			print(e)
-	def save_hdf5(self, fnames, data, thetas, elements, recon_dict):
-		""" H5
+	def save_hdf5(self, fnames, data, thetas, elements, recon_dict, x_shifts=None, y_shifts=None, history=None, compression="auto"):
+		""" H5 project, see xrftomo.save_project
 				elements
 				[fnames,thetas]
-				data[elem,theta,img[y,x]] #
-				recons[elem, slice, img[y,x]]
+				data[elem,theta,img[y,x]] # compressed, one chunk per plane
+				x_shifts, y_shifts
+				recons/element[slice, img[y,x]]
+				history/step
 		"""
 		try:
 			savedir = QFileDialog.getSaveFileName()[0]
@@ -349,18 +390,7 @@ class SaveOptions(object):
 				raise IOError
 			if str(savedir).rfind(".h5") == -1:
 				savedir = str(savedir) + ".h5"
-			with h5py.File(savedir, 'w') as fid:
-				# frst_key = list(recon_dict.keys())[0]
-				# npy_recons = np.zeros((len(recon_dict),recon_dict[frst_key].shape[0], recon_dict[frst_key].shape[1], recon_dict[frst_key].shape[2]))
-				# for i, key in enumerate(recon_dict.keys()):
-				# 	npy_recons[i] = recon_dict[key]
-				fnames = [name.split("/")[-1] for name in fnames]
-				fid.create_dataset('elements', data=elements)
-				fid.create_dataset('names', data=fnames)
-				fid.create_dataset('thetas', data=thetas)
-				fid.create_dataset('data', data=data)
-				# fid.create_dataset('recons', data=npy_recons)
-			fid.close()
+			xrftomo.save_project(savedir, data, thetas, fnames, elements, x_shifts, y_shifts, recon_dict, history, compression)
 
 		except Exception as error:
 			print(error)
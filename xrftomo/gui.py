@@ -323,6 +323,8 @@ class xrftomoGui(QMainWindow):
     def __init__(self, app, params):
         super(QMainWindow, self).__init__()
         self.params = params
+        xrftomo.set_working_dtype(getattr(params, 'working_dtype', 'float32'))
+        xrftomo.set_metadata_index_enabled(not getattr(params, 'no_metadata_index', False))
         self.param_list = {}
         self.shifts = []
         self.app = app
@@ -378,6 +380,15 @@ class xrftomoGui(QMainWindow):
         matchFilenamesThetasAction = QAction('match filenames to thetas', self)
         matchFilenamesThetasAction.triggered.connect(self.match_filenames_to_thetas)
 
+        reloadROIAction = QAction('reload with current ROI', self)
+        reloadROIAction.triggered.connect(self.reload_with_roi)
+
+        previewLoadAction = QAction('preview load (binned)', self)
+        previewLoadAction.triggered.connect(self.preview_load)
+
+        fullResolutionAction = QAction('upgrade preview to full resolution', self)
+        fullResolutionAction.triggered.connect(self.upgrade_preview)
+
         self.saveCorrAnalysisAction = QAction("Corelation Analysis", self)
         self.saveCorrAnalysisAction.triggered.connect(self.saveCorrAlsys)
         self.saveCorrAnalysisAction.setVisible(False)
@@ -438,6 +449,7 @@ class xrftomoGui(QMainWindow):
         # data update
         self.imageProcessWidget.dataChangedSig.connect(self.update_history)
         self.sinogramWidget.dataChangedSig.connect(self.update_history)
+        self.laminographyWidget.dataChangedSig.connect(self.update_history)
 
         # theta update
         self.imageProcessWidget.thetaChangedSig.connect(self.update_theta)
@@ -453,6 +465,7 @@ class xrftomoGui(QMainWindow):
         #alignment changed
         self.imageProcessWidget.alignmentChangedSig.connect(self.update_alignment)
         self.sinogramWidget.alignmentChangedSig.connect(self.update_alignment)
+        self.laminographyWidget.alignmentChangedSig.connect(self.update_alignment)
         self.sinogramWidget.restoreSig.connect(self.restore)
 
         #fnames changed 
@@ -506,6 +519,9 @@ class xrftomoGui(QMainWindow):
         self.fileMenu.addAction(openStackAction)
         self.fileMenu.addAction(openThetaAction)
         self.fileMenu.addAction(matchFilenamesThetasAction)
+        self.fileMenu.addAction(reloadROIAction)
+        self.fileMenu.addAction(previewLoadAction)
+        self.fileMenu.addAction(fullResolutionAction)
         self.fileMenu.addAction(exitAction)
         self.fileMenu.addAction(closeAction)
 
@@ -2121,17 +2137,15 @@ class xrftomoGui(QMainWindow):
         if file == []:
             print("check file extension")
             return
-        img = h5py.File(file, 'r')
-        fnames = img["names"]
-        data = img["data"]
-        elements = img["elements"]
-        thetas = [float(theta) for theta in list(img["thetas"])]
-        # recons = img["recons"]
-
-        self.fnames = [fname.decode("utf-8").split("/")[-1] for fname in list(fnames)]
-        self.data = np.array(data)
-        self.elements = [element.decode("utf-8") for element in list(elements)]
-        self.thetas = np.array(thetas)
+        #with lazy-load, planes are decompressed as they are displayed
+        project = xrftomo.open_project(file, lazy=getattr(self.params, 'lazy_load', False))
+        thetas = list(project["thetas"])
+
+        #files written by the old save_hdf5 may hold full paths
+        self.fnames = [fname.split("/")[-1] for fname in project["fnames"]]
+        self.data = project["data"]
+        self.elements = project["elements"]
+        self.thetas = project["thetas"]
 
         self.tab_widget.setTabEnabled(1, False)
         self.tab_widget.setTabEnabled(2, False)
@@ -2147,10 +2161,14 @@ class xrftomoGui(QMainWindow):
         #     self.recon_dict[element] = recons[i]
 
         self.updateImages(True)
-        # self.reconstructionWidget.recon_dict = self.recon_dict
-        # self.reconstructionWidget.recon = recons[0]
-        # self.laminographyWidget.recon_dict = self.recon_dict
-        # self.laminographyWidget.recon = recons[0]
+        self.update_alignment(project["x_shifts"], project["y_shifts"])
+        self.recon_dict = {}
+        for element in self.elements:
+            self.recon_dict[element] = project["recon_dict"].get(element, np.zeros((self.data.shape[2],self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype()))
+        self.reconstructionWidget.recon_dict = self.recon_dict
+        self.laminographyWidget.recon_dict = self.recon_dict
+        if len(project["history"]) > 0:
+            print("project history: {}".format(", ".join(step["kind"] for step in project["history"])))
         self.fileTableWidget.fileTableModel.update_fnames(self.fnames)
         self.fileTableWidget.fileTableModel.update_thetas(thetas)
         self.fileTableWidget.fileTableView.sortByColumn(1, 0)
@@ -2192,7 +2210,7 @@ class xrftomoGui(QMainWindow):
         if file[0] == '':
             return
         im = io.imread(file[0])
-        data = np.zeros([1, im.shape[0], im.shape[1], im.shape[2]])
+        data = np.zeros([1, im.shape[0], im.shape[1], im.shape[2]], dtype=xrftomo.get_working_dtype())
         data[0] = im
         self.data = data
         self.fnames = ["file_{}".format(i) for i in range(self.data.shape[1])]
@@ -2414,7 +2432,8 @@ class xrftomoGui(QMainWindow):
         self.writer.save_thetas_txt(self.fnames, self.thetas)
 
     def save_hdf5(self):
-        self.writer.save_hdf5(self.fnames, self.data, self.thetas, self.elements, self.recon_dict)
+        self.writer.save_hdf5(self.fnames, self.data, self.thetas, self.elements, self.recon_dict, self.x_shifts, self.y_shifts,
+                              self.history, getattr(self.params, 'project_compression', 'auto'))
 
     def saveCorrAlsys(self):
         try:
@@ -2589,22 +2608,21 @@ class xrftomoGui(QMainWindow):
         applied_count = np.sum((self.x_shifts != 0) | (self.y_shifts != 0))
         print(f"Applied shifts to {applied_count} projections")
 
-    def updateImages(self, from_open=False):
+    def updateImages(self, from_open=False, window=None, fnames=None, stride=1, binning=1):
         self.prevTab = self.tab_widget.currentIndex()
-        self.data_history = []
-        self.x_shifts_history = []
-        self.y_shifts_history = []
-        self.theta_history = []
-        self.fname_history = []
-        # self.centers_history = []
+        self.reset_history()
+        self.load_window = None
+        self.load_binning = 1
 
         if not from_open:
             self.app.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
-            self.data, self.elements, self.thetas, self.fnames = self.fileTableWidget.onSaveDataInMemory()
+            self.data, self.elements, self.thetas, self.fnames = self.fileTableWidget.onSaveDataInMemory(window, fnames, stride, binning)
+            self.load_window = window
+            self.load_binning = binning
             #create empty recon_dict here
             self.recon_dict = {}
             for element in self.elements:
-                self.recon_dict[element] = np.zeros((self.data.shape[2],self.data.shape[3],self.data.shape[3]))
+                self.recon_dict[element] = np.zeros((self.data.shape[2],self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype())
             #populate scatter plot combo box windows
             self.first_run = True
 
@@ -2728,21 +2746,91 @@ class xrftomoGui(QMainWindow):
         self.update_filenames(self.fnames, index)
         self.update_alignment(self.x_shifts, self.y_shifts)
 
-        self.data_history.append(data.copy())
-        self.theta_history.append(self.thetas.copy())
-        self.x_shifts_history.append(self.x_shifts.copy())
-        self.y_shifts_history.append(self.y_shifts.copy())
-        # self.centers_history.append(self.centers.copy())
-        self.fname_history.append(self.fnames.copy())
-        print('history save event: ', len(self.data_history))
-
-        if len(self.data_history) > 10:
-            del self.data_history[0]
-            del self.theta_history[0]
-            del self.x_shifts_history[0]
-            del self.y_shifts_history[0]
-            # del self.centers[0]
-            del self.fname_history[0]
+        kind = self.history.record(data, self.thetas, self.fnames, self.x_shifts, self.y_shifts)
+        print('history save event: ', len(self.history), kind)
+        return
+
+    def reload_with_roi(self):
+        '''
+        Reloads the files from the file table reading only the current ROI and the
+        projections currently in memory, optionally keeping every n-th projection.
+        '''
+        try:
+            frame_height, frame_width = self.data.shape[2:]
+            original_shape = self.original_data.shape[2:]
+        except AttributeError:
+            print("load a dataset first")
+            return
+        if (frame_height, frame_width) != original_shape:
+            print("ROI reload needs the frame as loaded, restore the data before selecting the ROI")
+            return
+        view = self.imageProcessWidget.imageView
+        y0 = int(round(frame_height - view.y_pos - view.ySize))
+        x0 = int(round(view.x_pos))
+        #a preview ROI is scaled back to full resolution pixels
+        binning = getattr(self, 'load_binning', 1)
+        window = [binning*y0, binning*(y0 + int(view.ySize)), binning*x0, binning*(x0 + int(view.xSize))]
+        previous = getattr(self, 'load_window', None)
+        if previous is not None:
+            #ROI of an already windowed load, offset it into the full frame
+            window = [window[0]+previous[0], window[1]+previous[0], window[2]+previous[2], window[3]+previous[2]]
+        stride, ok = QInputDialog.getInt(self, "reload with current ROI", "keep every n-th projection:", 1, 1, max(1, len(self.fnames)))
+        if not ok:
+            return
+        self.updateImages(window=tuple(window), fnames=list(self.fnames), stride=stride, binning=binning)
+        return
+
+    def preview_load(self):
+        '''
+        Loads the selected files binned 2x, 4x or 8x for a quick first look.
+        '''
+        factor, ok = QInputDialog.getItem(self, "preview load", "binning:", ["2", "4", "8"], 1, False)
+        if not ok:
+            return
+        self.updateImages(binning=int(factor))
+        return
+
+    def upgrade_preview(self):
+        '''
+        Reloads a preview at full resolution, keeping its projections and ROI window, and
+        applies the alignment found on the preview scaled to full resolution pixels.
+        '''
+        binning = getattr(self, 'load_binning', 1)
+        if binning == 1:
+            print("data already loaded at full resolution")
+            return
+        x_shifts = np.asarray(self.x_shifts, dtype=float)*binning
+        y_shifts = np.asarray(self.y_shifts, dtype=float)*binning
+        view = self.imageProcessWidget.imageView
+        frame_height = self.data.shape[2]
+        roi_row = frame_height - view.y_pos - view.ySize
+        roi = [view.x_pos*binning, roi_row*binning, view.xSize*binning, view.ySize*binning]
+
+        self.updateImages(window=self.load_window, fnames=list(self.fnames), binning=1)
+        if len(self.data) == 0 or self.data.shape[1] != len(x_shifts):
+            print("full resolution reload failed, preview alignment not applied")
+            return
+
+        if np.any(x_shifts != 0) or np.any(y_shifts != 0):
+            self.data = self.sinogramWidget.actions.shift_all(self.data, x_shifts, y_shifts)
+            self.x_shifts, self.y_shifts = x_shifts, y_shifts
+            self.update_history(self.data)
+
+        frame_height, frame_width = self.data.shape[2:]
+        x_pos, y_pos, x_size, y_size = view.update_roi(roi[0], frame_height - roi[1] - roi[3], roi[2], roi[3], frame_height, frame_width)
+        view.xSize, view.ySize = x_size, y_size
+        view.ROI.setPos([x_pos, y_pos], finish=False)
+        return
+
+    def reset_history(self):
+        try:
+            self.history.clear()
+        except AttributeError:
+            pass
+        self.history = xrftomo.DataHistory(max_entries=getattr(self.params, 'history_length', 10),
+                                           checkpoint_interval=getattr(self.params, 'history_checkpoint_interval', 5),
+                                           memory_mb=getattr(self.params, 'history_memory', 4096),
+                                           spill=getattr(self.params, 'history_spill', False))
         return
 
     def update_recon(self, recon):
@@ -2817,10 +2905,7 @@ class xrftomoGui(QMainWindow):
         return
 
     def clear_all(self):
-        self.data_history = []
-        self.x_shifts_history = []
-        self.y_shifts_history = []
-        self.fname_history = []
+        self.reset_history()
         self.update_alignment([],[])
 
         self.imageProcessWidget.sld.setValue(0)
@@ -2853,21 +2938,11 @@ class xrftomoGui(QMainWindow):
 
     def undo(self):
         try:
-            if len(self.data_history) <=1:
-                print("maximum history stplt.imshow(self.data_history[1][0])ate reached, cannot undo further")
+            state = self.history.undo()
+            if state is None:
+                print("maximum history state reached, cannot undo further")
             else:
-                del self.data_history[-1]
-                del self.x_shifts_history[-1]
-                del self.y_shifts_history[-1]
-                del self.theta_history[-1]
-                del self.fname_history[-1]
-                # del self.centers_history[-1]
-                self.data = self.data_history[-1].copy()
-                self.x_shifts = self.x_shifts_history[-1].copy()
-                self.y_shifts = self.y_shifts_history[-1].copy()
-                self.thetas = self.theta_history[-1].copy()
-                self.fnames = self.fname_history[-1].copy()
-                # self.centers = self.centers_history[-1]
+                self.data, self.thetas, self.fnames, self.x_shifts, self.y_shifts = state
 
                 self.update_alignment(self.x_shifts, self.y_shifts)
                 self.update_slider_range(self.thetas)
@@ -2881,7 +2956,7 @@ class xrftomoGui(QMainWindow):
         except AttributeError:
             print("Load dataset first")
             return
-        print(len(self.data_history))
+        print(len(self.history))
         return
 
     def restore(self):
@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for the undo history of the 4D xrf dataset.
+
+Each edit is stored as the smallest delta that reproduces it from the
+previous state: the planes that changed, a shift vector, a crop rectangle
+or the excluded projection indices. Full copies are only kept at
+checkpoints, which are spilled to disk once the memory budget is reached.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+import os
+import shutil
+import tempfile
+from xrftomo.precision import working_copy
+from xrftomo.shift import SHIFT_MODES, shift_projections
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['DataHistory']
+
+#above this fraction of changed planes a plane diff is no cheaper than a checkpoint
+_MAX_PLANE_FRACTION = 0.5
+#largest number of crop offsets searched before falling back to a checkpoint
+_MAX_CROP_OFFSETS = 4096
+
+
+def _copy(value):
+    if value is None:
+        return None
+    if hasattr(value, "copy"):
+        return value.copy()
+    return list(value)
+
+
+def _planes_equal(a, b):
+    #[element, projection] mask of identical planes, NaN compares equal to NaN
+    same = np.empty(a.shape[:2], dtype=bool)
+    for i in range(a.shape[0]):
+        eq = (a[i] == b[i]) | (np.isnan(a[i]) & np.isnan(b[i]))
+        same[i] = eq.all(axis=(1, 2))
+    return same
+
+
+def _kept_projections(old_thetas, new_thetas):
+    #indices of old_thetas that survive as new_thetas, in order, or None
+    old_thetas = np.asarray(old_thetas)
+    new_thetas = np.asarray(new_thetas)
+    kept = []
+    j = 0
+    for i in range(len(old_thetas)):
+        if j < len(new_thetas) and old_thetas[i] == new_thetas[j]:
+            kept.append(i)
+            j += 1
+    if j != len(new_thetas):
+        return None
+    return np.asarray(kept, dtype=np.intp)
+
+
+class DataHistory(object):
+    """
+    Undo history of the dataset and its thetas, filenames and shifts.
+
+    Parameters
+    ----------
+    max_entries : int
+        number of states that can be restored
+    checkpoint_interval : int
+        largest number of deltas replayed on top of a checkpoint
+    memory_mb : float
+        memory budget for checkpoints and deltas held in RAM
+    spill : bool
+        move checkpoints over the budget to disk instead of dropping history
+    spill_dir : str, optional
+        parent directory of the spill files, defaults to the system temp directory
+    """
+    def __init__(self, max_entries=10, checkpoint_interval=5, memory_mb=4096, spill=False, spill_dir=None):
+        self.max_entries = max(1, int(max_entries))
+        self.checkpoint_interval = max(1, int(checkpoint_interval))
+        self.memory_bytes = memory_mb*1e6
+        self.spill = spill
+        self.spill_dir = spill_dir
+        self._tmpdir = None
+        self._spill_count = 0
+        self.entries = []
+        self._tip = None
+        self._tip_shared = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __del__(self):
+        try:
+            self.clear()
+        except Exception:
+            pass
+
+    @property
+    def nbytes(self):
+        """
+        bytes held in RAM by checkpoints, deltas and the latest state
+        """
+        total = sum(self._entry_nbytes(entry) for entry in self.entries)
+        if self._tip is not None and not self._tip_shared:
+            total += self._tip.nbytes
+        return total
+
+    def _entry_nbytes(self, entry):
+        if entry.get("spilled"):
+            return 0
+        if entry["kind"] == "checkpoint":
+            return getattr(entry["payload"], "nbytes", 0)
+        if entry["kind"] == "planes":
+            return entry["payload"][1].nbytes
+        return 0
+
+    def clear(self):
+        """
+        Drop all history and remove spill files
+        """
+        self.entries = []
+        self._tip = None
+        self._tip_shared = False
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def record(self, data, thetas, fnames, x_shifts, y_shifts):
+        """
+        Add the current state to the history
+
+        Parameters
+        ----------
+        data : ndarray
+            4D xrf dataset ndarray [elements, theta, y,x]
+        thetas : ndarray
+        fnames : list
+        x_shifts : ndarray
+        y_shifts : ndarray
+
+        Returns
+        -------
+        kind : str
+            how the state was stored: 'checkpoint', 'planes', 'shift', 'crop', 'delete' or 'none'
+        """
+        meta = {"thetas": _copy(thetas), "fnames": _copy(fnames),
+                "x_shifts": _copy(x_shifts), "y_shifts": _copy(y_shifts)}
+        entry = None
+        since_checkpoint = 0
+        for previous in reversed(self.entries):
+            if previous["kind"] == "checkpoint":
+                break
+            since_checkpoint += 1
+        if self.entries and since_checkpoint+1 < self.checkpoint_interval:
+            entry = self._delta(data, self.entries[-1]["meta"], meta)
+
+        if entry is None:
+            payload = working_copy(data)
+            entry = {"kind": "checkpoint", "payload": payload}
+            if isinstance(payload, np.ndarray):
+                self._tip = payload
+                self._tip_shared = True
+            else:
+                self._tip = None
+                self._tip_shared = False
+        entry["meta"] = meta
+        self.entries.append(entry)
+        self._trim()
+        return entry["kind"]
+
+    def undo(self):
+        """
+        Step back one state
+
+        Returns
+        -------
+        state : tuple or None
+            (data, thetas, fnames, x_shifts, y_shifts) copies of the previous
+            state, None if there is nothing to undo
+        """
+        if len(self.entries) <= 1:
+            return None
+        self._discard(self.entries.pop())
+        self._tip, self._tip_shared = self._rebuild(len(self.entries)-1)
+        meta = self.entries[-1]["meta"]
+        if self._tip is None:
+            data = self.entries[-1]["payload"].copy()
+        else:
+            data = working_copy(self._tip)
+        return data, _copy(meta["thetas"]), _copy(meta["fnames"]), _copy(meta["x_shifts"]), _copy(meta["y_shifts"])
+
+    def _delta(self, data, old_meta, new_meta):
+        tip = self._tip
+        if tip is None or not isinstance(data, np.ndarray) or data.ndim != 4:
+            return None
+
+        if data.shape == tip.shape:
+            changed = ~_planes_equal(tip, data)
+            if not changed.any():
+                return {"kind": "none", "payload": None}
+            if changed.mean() <= _MAX_PLANE_FRACTION:
+                index = np.nonzero(changed)
+                planes = np.array(data[index], dtype=tip.dtype)
+                self._set_tip_planes(index, planes)
+                return {"kind": "planes", "payload": (index, planes)}
+            shift = self._find_shift(data, old_meta, new_meta)
+            if shift is not None:
+                self._tip = working_copy(data)
+                self._tip_shared = False
+                return {"kind": "shift", "payload": shift}
+            return None
+
+        if data.shape[0] == tip.shape[0] and data.shape[2:] == tip.shape[2:] and data.shape[1] < tip.shape[1]:
+            kept = _kept_projections(old_meta["thetas"], new_meta["thetas"])
+            if kept is None or not _planes_equal(tip[:, kept], data).all():
+                return None
+            removed = np.setdiff1d(np.arange(tip.shape[1]), kept)
+            self._tip = working_copy(data)
+            self._tip_shared = False
+            return {"kind": "delete", "payload": removed}
+
+        if data.shape[:2] == tip.shape[:2] and data.shape[2] <= tip.shape[2] and data.shape[3] <= tip.shape[3]:
+            offset = self._find_crop(data)
+            if offset is None:
+                return None
+            self._tip = working_copy(data)
+            self._tip_shared = False
+            return {"kind": "crop", "payload": offset + data.shape[2:]}
+        return None
+
+    def _set_tip_planes(self, index, planes):
+        if self._tip_shared:
+            self._tip = working_copy(self._tip)
+            self._tip_shared = False
+        self._tip[index] = planes
+
+    def _find_shift(self, data, old_meta, new_meta):
+        #the shift is taken from the change in the alignment vectors and accepted
+        #only if replaying it on the previous state reproduces the data
+        try:
+            dx = np.asarray(new_meta["x_shifts"], dtype=float) - np.asarray(old_meta["x_shifts"], dtype=float)
+            dy = np.asarray(new_meta["y_shifts"], dtype=float) - np.asarray(old_meta["y_shifts"], dtype=float)
+        except (TypeError, ValueError):
+            return None
+        if dx.shape != (data.shape[1],) or dy.shape != (data.shape[1],):
+            return None
+        scale = max(float(np.nanmax(np.abs(data[0]))), 1e-12)
+        for mode in SHIFT_MODES:
+            for sign in (1, -1):
+                trial = shift_projections(np.array(self._tip[:1]), dx, sign*dy, mode=mode)
+                if not np.allclose(trial, data[:1], rtol=1e-4, atol=1e-5*scale, equal_nan=True):
+                    continue
+                trial = shift_projections(np.array(self._tip), dx, sign*dy, mode=mode)
+                if np.allclose(trial, data, rtol=1e-4, atol=1e-5*scale, equal_nan=True):
+                    return dx, sign*dy, mode
+        return None
+
+    def _find_crop(self, data):
+        tip = self._tip
+        height, width = data.shape[2:]
+        rows = tip.shape[2] - height + 1
+        cols = tip.shape[3] - width + 1
+        if rows*cols > _MAX_CROP_OFFSETS:
+            return None
+        plane = data[0, 0]
+        for y0 in range(rows):
+            for x0 in range(cols):
+                if np.array_equal(tip[0, 0, y0:y0+height, x0:x0+width], plane, equal_nan=True):
+                    if _planes_equal(tip[:, :, y0:y0+height, x0:x0+width], data).all():
+                        return (y0, x0)
+        return None
+
+    def _apply(self, state, entry):
+        kind = entry["kind"]
+        payload = entry["payload"]
+        if kind == "planes":
+            index, planes = payload
+            state[index] = planes
+        elif kind == "shift":
+            dx, dy, mode = payload
+            state = shift_projections(state, dx, dy, mode=mode)
+        elif kind == "delete":
+            state = np.delete(state, payload, 1)
+        elif kind == "crop":
+            y0, x0, height, width = payload
+            state = np.ascontiguousarray(state[:, :, y0:y0+height, x0:x0+width])
+        return state
+
+    def _rebuild(self, index):
+        #state after entries[index]: latest checkpoint at or before it plus the deltas since
+        start = index
+        while self.entries[start]["kind"] != "checkpoint":
+            start -= 1
+        payload = self.entries[start]["payload"]
+        if not isinstance(payload, np.ndarray):
+            return None, False
+        if start == index:
+            return payload, True
+        state = working_copy(payload)
+        for entry in self.entries[start+1:index+1]:
+            state = self._apply(state, entry)
+        return state, False
+
+    def _discard(self, entry):
+        if entry.get("spilled"):
+            path = entry["payload"].filename
+            entry["payload"] = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _trim(self):
+        while len(self.entries) > self.max_entries:
+            self._drop_oldest()
+        if self.nbytes <= self.memory_bytes:
+            return
+        if self.spill:
+            for entry in self.entries[:-1]:
+                if self.nbytes <= self.memory_bytes:
+                    break
+                if entry["kind"] == "checkpoint" and isinstance(entry["payload"], np.ndarray) and not entry.get("spilled"):
+                    self._spill(entry)
+        #without spilling, or if that was not enough, give up the oldest states
+        while self.nbytes > self.memory_bytes and len(self.entries) > 1:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        if self.entries[1]["kind"] != "checkpoint":
+            #the next state becomes the oldest one and needs its own full copy
+            payload = self._rebuild(1)[0]
+            self.entries[1] = {"kind": "checkpoint", "payload": payload, "meta": self.entries[1]["meta"]}
+        self._discard(self.entries.pop(0))
+
+    def _spill(self, entry):
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="xrftomo_history_", dir=self.spill_dir)
+        path = os.path.join(self._tmpdir, "checkpoint_{:04d}.npy".format(self._spill_count))
+        self._spill_count += 1
+        np.save(path, entry["payload"])
+        if self._tip is entry["payload"]:
+            self._tip_shared = False
+        entry["payload"] = np.load(path, mmap_mode="r")
+        entry["spilled"] = True
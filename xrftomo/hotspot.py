@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for detecting and removing hotspots in projection stacks.
+
+Local statistics are computed from sliding windows over the edge padded
+image, the same neighbourhoods as ndimage.generic_filter with
+mode='nearest', so the detection matches the generic_filter callbacks
+previously used by ImageProcessActions.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import ndimage
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['HOTSPOT_KERNELS',
+           'ROI_HOTSPOT_THRESHOLDS',
+           'local_median',
+           'local_std',
+           'hotspot_thresholds',
+           'relax_thresholds',
+           'detect_hotspots',
+           'expand_hotspots',
+           'blend_hotspots',
+           'remove_hotspots',
+           'remove_hotspots_stack']
+
+
+HOTSPOT_KERNELS = (3, 5, 7, 11)
+# (z_high, z_medium, z_very_high, gradient, absolute_diff)
+ROI_HOTSPOT_THRESHOLDS = (3.5, 2.5, 5.0, 0.35, 0.35)
+
+
+def _windows(image, size):
+    pad = size//2
+    return sliding_window_view(np.pad(image, pad, mode='edge'), (size, size))
+
+def _reduce(values, statistic):
+    """
+    median, std or mean along the last axis ignoring NaN, with the results of
+    the generic_filter callbacks for windows without enough valid values
+    """
+    values = values.astype(np.float64)
+    valid = ~np.isnan(values)
+    if valid.all():
+        if statistic == "median":
+            return np.median(values, axis=-1)
+        if statistic == "std":
+            return np.std(values, axis=-1)
+        return np.mean(values, axis=-1)
+    count = valid.sum(axis=-1)
+    if statistic == "mean":
+        result = np.where(valid, values, 0).sum(axis=-1)/np.maximum(count, 1)
+        return np.where(count > 0, result, np.nan)
+    #rows without valid values are filled so nanmedian/nanstd stay quiet
+    values[count == 0] = 0
+    if statistic == "median":
+        return np.where(count > 0, np.nanmedian(values, axis=-1), np.nan)
+    return np.where(count > 1, np.nanstd(values, axis=-1), 0.0)
+
+def _window_statistic(image, size, statistic, exclude_center=False, mask=None, block_pixels=1 << 21):
+    """
+    statistic of the size x size neighbourhood of every pixel, or of the
+    pixels in mask only, computed in row blocks to bound memory
+    """
+    windows = _windows(image, size)
+    keep = np.arange(size*size) != (size*size)//2 if exclude_center else slice(None)
+    if mask is not None:
+        return _reduce(windows[mask].reshape(-1, size*size)[:, keep], statistic).astype(image.dtype)
+    result = np.empty(image.shape, dtype=image.dtype)
+    rows = max(1, block_pixels//(image.shape[1]*size*size))
+    for start in range(0, image.shape[0], rows):
+        block = windows[start:start+rows]
+        block = block.reshape(block.shape[:2] + (size*size,))[..., keep]
+        result[start:start+rows] = _reduce(block, statistic)
+    return result
+
+def local_median(image, size, exclude_center=True, mask=None):
+    """
+    Median of the size x size neighbourhood of each pixel ignoring NaN
+
+    Parameters
+    ----------
+    image : ndarray
+        2D image
+    size : int
+        odd window size, edges are padded like mode='nearest'
+    exclude_center : bool
+        leave the pixel itself out of its neighbourhood
+    mask : ndarray, optional
+        only compute the pixels in mask, returned as a flat array
+
+    Returns
+    -------
+    ndarray
+        local medians, NaN where the window has no valid value
+    """
+    return _window_statistic(image, size, "median", exclude_center, mask)
+
+def local_std(image, size, exclude_center=True, mask=None):
+    """
+    Standard deviation of the size x size neighbourhood of each pixel
+    ignoring NaN, 0 where fewer than two values are valid. Parameters as
+    local_median.
+    """
+    return _window_statistic(image, size, "std", exclude_center, mask)
+
+def _gradient(image):
+    grad_y = ndimage.sobel(image, axis=0, mode='nearest')
+    grad_x = ndimage.sobel(image, axis=1, mode='nearest')
+    return np.sqrt(grad_x**2 + grad_y**2)
+
+def hotspot_thresholds(reference):
+    """
+    Calibrate the detection thresholds from the obvious hotspots of a
+    reference projection
+
+    Parameters
+    ----------
+    reference : ndarray
+        2D reference projection
+
+    Returns
+    -------
+    thresholds : tuple
+        (z_high, z_medium, z_very_high, gradient, absolute_diff)
+    count : int
+        number of obvious hotspot pixels found in the reference
+    """
+    ref_local_median = local_median(reference, 5)
+    ref_local_std = np.maximum(local_std(reference, 5), 1e-10)
+    ref_z_scores = (reference - ref_local_median) / ref_local_std
+    ref_grad_normalized = _gradient(reference) / (ref_local_median + 1e-10)
+    ref_hotspot_mask = (ref_z_scores > 4.0) | ((ref_grad_normalized > 0.4) & (ref_z_scores > 3.5))
+
+    count = int(np.sum(ref_hotspot_mask))
+    if count:
+        ref_hotspot_z_scores = ref_z_scores[ref_hotspot_mask]
+        ref_abs_diffs = reference[ref_hotspot_mask] - ref_local_median[ref_hotspot_mask]
+        ref_abs_diff_ratios = ref_abs_diffs / (ref_local_median[ref_hotspot_mask] + 1e-10)
+        z_min = max(3.5, np.percentile(ref_hotspot_z_scores, 50))
+        z_med = max(2.5, np.percentile(ref_hotspot_z_scores, 30))
+        grad_min = max(0.3, np.percentile(ref_grad_normalized[ref_hotspot_mask], 50))
+        abs_diff_min = max(0.3, np.percentile(ref_abs_diff_ratios, 50))
+    else:
+        z_min, z_med, grad_min, abs_diff_min = 4.0, 3.0, 0.4, 0.4
+    return (z_min, z_med, max(z_min * 1.3, 4.5), grad_min, abs_diff_min), count
+
+def relax_thresholds(thresholds):
+    """
+    Slightly more aggressive thresholds for the next pass, bounded below
+    """
+    z_high, z_medium, z_very_high, gradient, absolute_diff = thresholds
+    return (max(2.5, z_high - 0.3), max(2.0, z_medium - 0.2), max(3.5, z_very_high - 0.5),
+            max(0.25, gradient - 0.03), max(0.25, absolute_diff - 0.03))
+
+def detect_hotspots(image, thresholds, kernel_sizes=HOTSPOT_KERNELS, neighbor_max=True):
+    """
+    Pixels that jump above their local neighbourhood at any of the kernel sizes
+
+    Parameters
+    ----------
+    image : ndarray
+        2D projection
+    thresholds : tuple
+        (z_high, z_medium, z_very_high, gradient, absolute_diff)
+    kernel_sizes : sequence of int
+        neighbourhood sizes
+    neighbor_max : bool
+        also flag pixels at the maximum of their neighbourhood and twice the local median
+
+    Returns
+    -------
+    hotspot_mask : ndarray
+        boolean mask
+    """
+    z_high, z_medium, z_very_high, gradient, absolute_diff = thresholds
+    grad_magnitude = _gradient(image)
+    hotspot_mask = np.zeros(image.shape, dtype=bool)
+    for kernel_size in kernel_sizes:
+        median = local_median(image, kernel_size)
+        std = np.maximum(local_std(image, kernel_size), 1e-10)
+        z_score = (image - median) / std
+        local_hotspot = z_score > z_high
+        min_absolute_diff = np.maximum(median * absolute_diff, std * 2.0)
+        local_hotspot = local_hotspot | ((image - median) > min_absolute_diff)
+        high_gradient = (grad_magnitude / (median + 1e-10)) > gradient
+        local_hotspot = local_hotspot | (high_gradient & (z_score > z_medium)) | (z_score > z_very_high)
+        if neighbor_max:
+            max_neighbor = ndimage.maximum_filter(image, size=kernel_size, mode='nearest')
+            high_relative_to_max = (image > median * 2.0) & (image > max_neighbor * 0.98)
+            local_hotspot = local_hotspot | (high_relative_to_max & (z_score > z_medium))
+        hotspot_mask = hotspot_mask | local_hotspot
+    return hotspot_mask
+
+def expand_hotspots(image, hotspot_mask, z_medium, passes=3, iteration=None):
+    """
+    Grow hotspot regions into adjacent pixels that stand out from the
+    non-hotspot neighbourhood. Statistics are only computed for the
+    pixels adjacent to the current mask.
+
+    Parameters
+    ----------
+    image : ndarray
+        2D projection
+    hotspot_mask : ndarray
+        boolean mask from detect_hotspots
+    z_medium : float
+        z-score threshold the adjacency threshold is derived from
+    passes : int
+        maximum number of expansion passes
+    iteration : int, optional
+        lowers the adjacency threshold by 0.2 per outer iteration, by 0.2 per
+        expansion pass when None
+
+    Returns
+    -------
+    hotspot_mask : ndarray
+        expanded boolean mask
+    """
+    for expand_iter in range(passes):
+        if not np.any(hotspot_mask):
+            break
+        adjacent_pixels = ndimage.binary_dilation(hotspot_mask, structure=np.ones((3, 3))) & ~hotspot_mask
+        if not np.any(adjacent_pixels):
+            break
+        non_hotspot_img = image.copy()
+        non_hotspot_img[hotspot_mask] = np.nan
+        median_safe = local_median(non_hotspot_img, 5, exclude_center=False, mask=adjacent_pixels)
+        std_safe = np.maximum(local_std(non_hotspot_img, 5, exclude_center=False, mask=adjacent_pixels), 1e-10)
+        step = expand_iter if iteration is None else iteration
+        z_score_threshold_adjacent = max(2.0, z_medium - (step * 0.2))
+        values = image[adjacent_pixels]
+        suspicious = ((values - median_safe) / std_safe > z_score_threshold_adjacent) & (values > median_safe + 2.0 * std_safe)
+        if not np.any(suspicious):
+            break
+        rows, cols = np.nonzero(adjacent_pixels)
+        hotspot_mask = hotspot_mask.copy()
+        hotspot_mask[rows[suspicious], cols[suspicious]] = True
+    return hotspot_mask
+
+def blend_hotspots(image, hotspot_mask, size=7, local_mean=True):
+    """
+    Replace the masked pixels with the median of the unmasked pixels around
+    them, falling back to their mean and then to the local image mean
+
+    Parameters
+    ----------
+    image : ndarray
+        2D projection, modified in place
+    hotspot_mask : ndarray
+        boolean mask of the pixels to replace
+    size : int
+        blending window size
+    local_mean : bool
+        fall back to the local mean of the image for windows without unmasked pixels
+
+    Returns
+    -------
+    image : ndarray
+    """
+    temp_img = image.copy()
+    temp_img[hotspot_mask] = np.nan
+    blended = local_median(temp_img, size, exclude_center=False, mask=hotspot_mask)
+    missing = np.isnan(blended)
+    if np.any(missing):
+        rows, cols = np.nonzero(hotspot_mask)
+        fallback = np.zeros(hotspot_mask.shape, dtype=bool)
+        fallback[rows[missing], cols[missing]] = True
+        blended[missing] = _window_statistic(temp_img, size, "mean", mask=fallback)
+        missing = np.isnan(blended)
+        if local_mean and np.any(missing):
+            blended[missing] = ndimage.uniform_filter(image, size=size, mode='nearest')[rows[missing], cols[missing]]
+    image[hotspot_mask] = blended
+    return image
+
+def remove_hotspots(image, thresholds, kernel_sizes=HOTSPOT_KERNELS, neighbor_max=True, expansions=3,
+                    blend_size=7, iterations=3, relax_per_pass=False, verbose=False):
+    """
+    Iteratively detect, expand and blend hotspots until the maximum of the
+    projection drops. Thresholds are relaxed when a pass does not lower the
+    maximum and the last pass forces the removal of the maximum pixel region.
+
+    Parameters
+    ----------
+    image : ndarray
+        2D projection
+    thresholds : tuple
+        (z_high, z_medium, z_very_high, gradient, absolute_diff)
+    kernel_sizes : sequence of int
+        detection neighbourhood sizes
+    neighbor_max : bool
+        see detect_hotspots
+    expansions : int
+        expansion passes per iteration
+    blend_size : int
+        blending window size
+    iterations : int
+        maximum number of detect/blend iterations
+    relax_per_pass : bool
+        lower the expansion threshold per expansion pass instead of per iteration
+    verbose : bool
+        print the hotspots found in every iteration
+
+    Returns
+    -------
+    image : ndarray
+        cleaned copy of the projection
+    masks : list
+        hotspot mask of every iteration that replaced pixels
+    """
+    img = image.copy()
+    masks = []
+    max_val_before = np.max(img)
+    for iteration in range(iterations):
+        hotspot_mask = detect_hotspots(img, thresholds, kernel_sizes, neighbor_max)
+        hotspot_mask = expand_hotspots(img, hotspot_mask, thresholds[1], expansions,
+                                       None if relax_per_pass else iteration)
+        if not np.any(hotspot_mask):
+            break
+        blend_hotspots(img, hotspot_mask, blend_size)
+        masks.append(hotspot_mask)
+
+        max_val_after = np.max(img)
+        if verbose:
+            print(f"  Iteration {iteration + 1}: Found {np.sum(hotspot_mask)} hotspot pixels, "
+                  f"max value: {max_val_before:.1f} -> {max_val_after:.1f}")
+        if max_val_after < max_val_before:
+            max_val_before = max_val_after
+        elif iteration < iterations - 1:
+            thresholds = relax_thresholds(thresholds)
+        else:
+            y_max, x_max = np.unravel_index(np.argmax(img), img.shape)
+            force_mask = np.zeros(img.shape, dtype=bool)
+            force_mask[max(0, y_max - 2):y_max + 3, max(0, x_max - 2):x_max + 3] = True
+            blend_hotspots(img, force_mask, blend_size, local_mean=False)
+            if verbose:
+                print("  Forced removal of maximum pixel region")
+    return img, masks
+
+def remove_hotspots_stack(stack, thresholds, workers=None, **options):
+    """
+    remove_hotspots on every projection of a stack, projections run
+    concurrently in a thread pool
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    thresholds : tuple
+        (z_high, z_medium, z_very_high, gradient, absolute_diff)
+    workers : int, optional
+        number of projections processed concurrently, defaults to one per core
+    options :
+        keyword arguments of remove_hotspots
+
+    Returns
+    -------
+    stack : ndarray
+        cleaned copy of the stack
+    """
+    cleaned = np.array(stack, copy=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, (img, masks) in enumerate(pool.map(lambda image: remove_hotspots(image, thresholds, **options), stack)):
+            cleaned[i] = img
+    return cleaned
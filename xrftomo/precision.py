@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module holding the working precision used for data, reconstruction and history arrays.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+
+WORKING_DTYPES = ('float32', 'float64')
+_working_dtype = np.dtype('float32')
+
+
+def set_working_dtype(dtype):
+    """
+    Set the dtype used for newly allocated data, reconstruction and history arrays
+
+    Parameters
+    ----------
+    dtype : str or numpy dtype
+        one of WORKING_DTYPES
+    """
+    global _working_dtype
+    dtype = np.dtype(dtype)
+    if dtype.name not in WORKING_DTYPES:
+        print("unsupported working dtype: {}, keeping {}".format(dtype.name, _working_dtype.name))
+        return
+    _working_dtype = dtype
+
+
+def get_working_dtype():
+    """
+    Returns
+    -------
+    dtype : numpy dtype
+        dtype used for newly allocated data, reconstruction and history arrays
+    """
+    return _working_dtype
+
+
+def as_working(data):
+    """
+    Cast an array to the working dtype, without copying if it already matches
+
+    Parameters
+    ----------
+    data : ndarray
+
+    Returns
+    -------
+    ndarray
+    """
+    if getattr(data, "dtype", None) == _working_dtype:
+        return data
+    return np.asarray(data, dtype=_working_dtype)
+
+
+def working_copy(data):
+    """
+    Copy an array into the working dtype with a single allocation.
+    Objects that are not ndarrays (e.g. lazy stacks) are copied with their own copy().
+
+    Parameters
+    ----------
+    data : ndarray
+
+    Returns
+    -------
+    ndarray
+    """
+    if not isinstance(data, np.ndarray):
+        return data.copy()
+    return np.array(data, dtype=_working_dtype, copy=True)
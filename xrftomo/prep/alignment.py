@@ -116,17 +116,10 @@ def centerOfMass(projections, data, comelem):
     self.center_of_mass: center of mass vector
     self.comelem: the element chosen for center of mass
     '''
-    center_of_mass = np.zeros(projections)
-    temp = np.zeros(data.shape[3])
-    temp2 = np.zeros(data.shape[3])
-    for i in np.arange(projections):
-        temp = sum(data[comelem, i, :, :] - data[comelem, i, :10, :10].mean(), axis=0)
-        # temp=sum(self.data[self.comelem,i,:,:]-1, axis=0)
-        numb2 = sum(temp)
-        for j in np.arange(data.shape[3]):
-            temp2[j] = temp[j] * j
-        numb = float(sum(temp2)) / numb2
-        center_of_mass[i] = numb
+    stack = data[comelem, :projections]
+    background = stack[:, :10, :10].mean(axis=(1, 2))
+    temp = stack.sum(axis=1) - background[:, None] * stack.shape[1]
+    center_of_mass = temp @ np.arange(data.shape[3]) / temp.sum(axis=1)
     return center_of_mass
 
 
@@ -339,9 +332,37 @@ def edgegauss(imagey, sigma=4):
 
 def run_unit_tests():
     '''
-    Run unit test on all the alignment functions
+    Run unit test on all the alignment functions, using projections of a
+    synthetic phantom with known shifts
+
+    Returns
+    -------
+    passed : bool
+        True when every test passed
     '''
-    pass
+    from xrftomo.benchmark.phantom import make_phantom, project_phantom
+
+    thetas = np.linspace(0, 180, 36, endpoint=False)
+    data = project_phantom(make_phantom((16, 64), num_features=4), thetas)
+    image = data[0, 0]
+    rolled = np.roll(image, (3, -5), axis=(0, 1))
+    tests = []
+    tests.append(("crossCorrelate", tuple(crossCorrelate(rolled, image)) == (3, -5)))
+    tests.append(("phaseCorrelate", tuple(phaseCorrelate(rolled, image)) == (3, -5)))
+
+    center_of_mass = centerOfMass(len(thetas), data, 0)
+    moved = data.copy()
+    moved[0, 0] = np.roll(moved[0, 0], 4, axis=1)
+    tests.append(("centerOfMass", abs(centerOfMass(len(thetas), moved, 0)[0] - center_of_mass[0] - 4) < 1e-3))
+
+    #the center of mass of a parallel projection follows a sinusoid of the angle
+    p1 = fitCenterOfMass(thetas, center_of_mass)
+    fit = p1[0] * np.sin(2 * np.pi / 360 * (thetas - p1[1])) + p1[2]
+    tests.append(("fitCenterOfMass", np.abs(fit - center_of_mass).max() < 0.5))
+
+    for name, passed in tests:
+        print("{}: {}".format(name, "passed" if passed else "FAILED"))
+    return all(passed for name, passed in tests)
 
 
 if __name__ == "__main__":
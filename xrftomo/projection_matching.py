@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for projection-matching alignment on the CPU, for tomography and
+laminography. Every iteration reconstructs the shifted projections by
+filtered backprojection, re-projects the reconstruction and moves each
+projection towards its re-projection by a linearised least squares step.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import time
+import numpy as np
+from scipy import fft
+
+from xrftomo.reco import lamino_backproject, lamino_project, _lamino_coefficients
+from xrftomo.shift import shift_projections
+from xrftomo.file_io.reader import bin_planes
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['PROJECTION_MATCHING_FILTERS',
+           'fbp_filter',
+           'projection_matching_step',
+           'projection_matching_align']
+
+
+PROJECTION_MATCHING_FILTERS = ("ramp", "shepp")
+
+
+def fbp_filter(stack, filter_name="shepp", workers=-1):
+    """
+    Filter the rows of a projection stack for filtered backprojection
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D projection stack [projection, y, x]
+    filter_name : str
+        'ramp' or 'shepp' (Shepp-Logan)
+    workers : int
+        scipy.fft workers
+
+    Returns
+    -------
+    filtered : ndarray
+        float32 stack of the same shape
+    """
+    n = stack.shape[-1]
+    padded = fft.next_fast_len(2*n)
+    freq = fft.rfftfreq(padded).astype(np.float32)
+    response = 2*freq
+    if filter_name == "shepp":
+        response[1:] *= np.sin(np.pi*freq[1:])/(np.pi*freq[1:])
+    spectra = fft.rfft(np.asarray(stack, dtype=np.float32), n=padded, axis=-1, workers=workers)
+    return fft.irfft(spectra*response, n=padded, axis=-1, workers=workers)[..., :n].astype(np.float32)
+
+def _high_pass(shape, cutoff):
+    """
+    Gaussian high pass over the last two axes, cutoff in cycles per pixel
+    """
+    ky = fft.fftfreq(shape[-2])[:, None]
+    kx = fft.fftfreq(shape[-1])[None, :]
+    if cutoff <= 0:
+        return np.ones((shape[-2], shape[-1])), ky, kx
+    return 1 - np.exp(-(kx**2 + ky**2)/(2*cutoff**2)), ky, kx
+
+def projection_matching_step(aligned, simulated, high_pass_filter=0.005, workers=-1):
+    """
+    Shift of every projection towards its re-projection, from one Gauss-Newton
+    step of the linearised misfit |aligned(r - d) - simulated|^2
+
+    Parameters
+    ----------
+    aligned : ndarray
+        3D stack of currently shifted projections [projection, y, x]
+    simulated : ndarray
+        re-projections of the same shape
+    high_pass_filter : float
+        Gaussian high pass cutoff in cycles per pixel, removes slow
+        intensity variations from the misfit
+    workers : int
+        scipy.fft workers
+
+    Returns
+    -------
+    x_update, y_update : ndarray
+        shifts in the convention of shift_projections
+    residual : float
+        norm of the high-passed misfit
+    """
+    weight, ky, kx = _high_pass(aligned.shape, high_pass_filter)
+    spectra = fft.fft2(aligned, workers=workers)*weight
+    residual = fft.fft2(simulated, workers=workers)*weight - spectra
+    grad_x = 2j*np.pi*kx*spectra
+    grad_y = 2j*np.pi*ky*spectra
+    #inner products by Parseval, d solves G d = -<grad, residual>
+    gxx = np.sum(np.abs(grad_x)**2, axis=(1, 2))
+    gyy = np.sum(np.abs(grad_y)**2, axis=(1, 2))
+    gxy = np.sum((grad_x.conj()*grad_y).real, axis=(1, 2))
+    bx = -np.sum((grad_x.conj()*residual).real, axis=(1, 2))
+    by = -np.sum((grad_y.conj()*residual).real, axis=(1, 2))
+    det = gxx*gyy - gxy**2
+    det = np.where(np.abs(det) > 1e-12*np.maximum(gxx*gyy, 1e-30), det, np.inf)
+    x_update = (gyy*bx - gxy*by)/det
+    y_update = (gxx*by - gxy*bx)/det
+    return x_update, y_update, float(np.sqrt(np.sum(np.abs(residual)**2)/residual[0].size))
+
+def _translation_basis(thetas, tiltangle):
+    """
+    Orthonormal [3, 2*projection] basis of the projection shifts (x then y)
+    produced by translating the volume, which no misfit can resolve
+    """
+    theta = np.deg2rad(np.asarray(thetas, dtype=np.float64))
+    tilt = np.deg2rad(tiltangle)
+    coefficients = [_lamino_coefficients(angle, tilt, "lamino") for angle in theta]
+    cu = np.array([c[0] for c in coefficients])
+    cv = np.array([c[1] for c in coefficients])
+    basis = np.stack([np.concatenate([cu[:, 0], cv[:, 0]]),
+                      np.concatenate([cu[:, 1], cv[:, 1]]),
+                      np.concatenate([np.zeros(len(theta)), np.full(len(theta), np.sin(tilt))])])
+    u, singular, vt = np.linalg.svd(basis, full_matrices=False)
+    return vt[singular > 1e-6*singular.max()]
+
+def _reconstruct(aligned, thetas, tiltangle, filter_name, positivity, workers):
+    rec = lamino_backproject(fbp_filter(aligned, filter_name), thetas, tiltangle, "linear", workers=workers)
+    if positivity:
+        rec = np.maximum(rec, 0)
+    simulated = lamino_project(rec, thetas, tiltangle, workers=workers)
+    #fit the amplitude so the misfit only carries the misalignment
+    scale = np.sum(aligned*simulated)/max(float(np.sum(simulated*simulated)), 1e-30)
+    return rec*scale, simulated*scale
+
+def projection_matching_align(stack, thetas, lamino_angle=0.0, iterations=50, stages=(4, 2, 1), rows=None,
+                              step_relax=0.5, min_step_size=0.01, max_step_size=0.5, high_pass_filter=0.005,
+                              momentum=True, memory=2, alpha=2.0, gain=0.5, filter_name="shepp",
+                              shift_mode="fourier", positivity=True, x_shifts=None, y_shifts=None,
+                              workers=None, progress=None):
+    """
+    Projection-matching alignment of a projection stack with downsampling
+    stages, coarsest first. The shifts of a stage are scaled up and start
+    the next one.
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D projection stack [projection, y, x]
+    thetas : ndarray
+        projection angles in degrees
+    lamino_angle : float
+        laminography angle in degrees, 0 for tomography. The tilt angle of
+        lamino_backproject is 90 - lamino_angle.
+    iterations : int
+        maximum number of iterations per stage
+    stages : sequence of int
+        downsampling factor of every stage
+    rows : slice or array, optional
+        detector rows used for tomography, every row is an independent slice
+        so a subset keeps each iteration cheap. The whole projections are
+        shifted before the rows are taken. Laminography uses every row.
+    step_relax : float
+        fraction of the Gauss-Newton step applied per iteration
+    min_step_size : float
+        a stage ends once no projection moves by more than this, in pixels of the stage
+    max_step_size : float
+        largest move of a projection per iteration, in pixels of the stage
+    high_pass_filter : float
+        high pass cutoff of the misfit in cycles per pixel
+    momentum : bool
+        accelerate updates that keep pointing the same way
+    memory : int
+        number of previous updates the momentum is computed from
+    alpha : float
+        exponent applied to the correlation of the update with the previous ones
+    gain : float
+        momentum gain
+    filter_name : str
+        'ramp' or 'shepp'
+    shift_mode : str
+        shift_projections mode, 'fourier' for FFT shifts
+    positivity : bool
+        clip negative values of the reconstruction
+    x_shifts, y_shifts : ndarray, optional
+        starting shifts, in full resolution pixels
+    workers : int, optional
+        threads of the backprojection and projection, defaults to one per core
+    progress : callable, optional
+        called with (stage, iteration, max update) after every iteration
+
+    Returns
+    -------
+    x_shifts, y_shifts : ndarray
+        full resolution shifts that align the stack with shift_projections
+    report : list
+        {'binning', 'iterations', 'updates', 'residuals', 'seconds'} for every stage
+    """
+    stack = np.nan_to_num(np.asarray(stack, dtype=np.float32), nan=0.0, posinf=0.0, neginf=0.0)
+    num_projections = stack.shape[0]
+    tiltangle = 90.0 - lamino_angle
+    row_mask = np.ones(stack.shape[1], dtype=bool)
+    if rows is not None:
+        if lamino_angle == 0:
+            row_mask[:] = False
+            row_mask[rows] = True
+        else:
+            print("projection matching: laminography uses every detector row, rows ignored")
+    sx = np.zeros(num_projections) if x_shifts is None else np.array(x_shifts, dtype=float)
+    sy = np.zeros(num_projections) if y_shifts is None else np.array(y_shifts, dtype=float)
+
+    basis = _translation_basis(thetas, tiltangle)
+    report = []
+    for stage in stages:
+        factor = max(1, int(stage))
+        t0 = time.perf_counter()
+        binned = bin_planes(stack, factor)
+        #rows are selected after shifting so vertical shifts do not wrap inside the subset
+        binned_rows = row_mask[:binned.shape[1]*factor].reshape(-1, factor).any(axis=1)
+        lx = sx/factor
+        ly = sy/factor
+        history = []
+        updates = []
+        residuals = []
+        for n in range(iterations):
+            aligned = shift_projections(binned.copy(), lx, ly, mode=shift_mode)[:, binned_rows]
+            rec, simulated = _reconstruct(aligned, thetas, tiltangle, filter_name, positivity, workers)
+            dx, dy, residual = projection_matching_step(aligned, simulated, high_pass_filter)
+            step = np.stack([dx, dy])*step_relax
+            #drop the part of the step that only translates the reconstruction
+            flat = step.ravel()
+            step = (flat - basis.T @ (basis @ flat)).reshape(step.shape)
+            if momentum and len(history) >= memory:
+                previous = np.mean(history[-memory:], axis=0)
+                correlation = np.sum(step*previous)/max(np.sqrt(np.sum(step**2)*np.sum(previous**2)), 1e-30)
+                if correlation > 0:
+                    step = step + gain*correlation**alpha*previous
+            step = np.clip(step, -max_step_size, max_step_size)
+            history.append(step)
+            lx = lx + step[0]
+            ly = ly + step[1]
+            updates.append(float(np.abs(step).max()))
+            residuals.append(residual)
+            if progress is not None:
+                progress(factor, n, updates[-1]*factor)
+            if updates[-1] < min_step_size:
+                break
+        sx = lx*factor
+        sy = ly*factor
+        level = {"binning": factor,
+                 "iterations": len(updates),
+                 "updates": [update*factor for update in updates],
+                 "residuals": residuals,
+                 "seconds": time.perf_counter() - t0}
+        report.append(level)
+        if len(updates) == 0:
+            print("projection matching {}x: no iterations, shifts unchanged".format(factor))
+            continue
+        print("projection matching {}x: {} iterations, max update {:.3f} -> {:.3f} px, residual {:.4g} -> {:.4g}, {:.2f} s".format(
+            factor, level["iterations"], level["updates"][0], level["updates"][-1], residuals[0], residuals[-1], level["seconds"]))
+    return sx, sy, report
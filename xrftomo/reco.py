@@ -39,14 +39,21 @@
 ###########################################################################
 
 import logging
+import multiprocessing
+import os
 import numpy as np
 import tomopy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scipy import ndimage
+from skimage import io
+from xrftomo.precision import as_working, get_working_dtype
+from xrftomo.file_io.recon_sink import open_recon_sink
 
 __author__ = "Francesco De Carlo"
 __copyright__ = "Copyright (c) 2019, UChicago Argonne, LLC."
 __version__ = "0.0.1"
 __docformat__ = 'restructuredtext en'
-__all__ = ['tomo']
+__all__ = ['tomo', 'recon_volume', 'recon_to_sink', 'recon_elements', 'recon_record', 'warm_start', 'save_recon_slices', 'lamino_backproject', 'lamino_project', 'RECON_METHODS']
 
 LOG = logging.getLogger(__name__)
 
@@ -61,4 +68,546 @@ def tomo(params):
 
     rec = True
 
-    return rec
\ No newline at end of file
+    return rec
+
+#order matches the reconstruction method dropdown
+RECON_METHODS = ["mlem", "gridrec", "art", "pml_hybrid", "pml_quad", "fbp", "sirt", "tv"]
+ANALYTIC_METHODS = ("gridrec", "fbp")
+
+
+def recon_volume(tomo, thetas, center, method, beta=1.0, delta=0.01, iters=10, init_recon=None, ncore=None, progress=None, step=None):
+    """
+    Reconstructs all rows of a single element in one batched tomopy call.
+
+    Iterative methods are run in blocks of ``step`` iterations, each block warm
+    started from the previous one, so progress can be reported without going
+    back to one tomopy call per row.
+
+    Parameters
+    ----------
+    tomo : ndarray
+        3D projection stack [projection, y, x]
+    thetas : ndarray
+        projection angles in degrees
+    center : float
+        rotation axis position
+    method : int or str
+        index into RECON_METHODS or the method name
+    beta, delta : float
+        regularization parameters for pml_hybrid, pml_quad and tv
+    iters : int
+        number of iterations for iterative methods
+    init_recon : ndarray, optional
+        initial guess [y, x, x] for iterative methods, see warm_start
+    ncore : int, optional
+        number of cores handed to tomopy, defaults to all cores
+    progress : callable, optional
+        called as progress(done, total) after every block of iterations
+    step : int, optional
+        iterations per block, defaults to about ten progress reports per run
+        with progress and to a single tomopy call without
+
+    Returns
+    -------
+    recon : ndarray
+        3D reconstruction [y, x, x] in the working dtype
+    """
+    if not isinstance(method, str):
+        method = RECON_METHODS[method]
+    if ncore is None:
+        ncore = os.cpu_count()
+    tomo = np.array(tomo, dtype=np.float32)
+    tomo[np.isinf(tomo)] = 1
+    tomo[np.isnan(tomo)] = 1
+    theta = np.asarray(thetas, dtype=np.float32) * np.pi / 180
+    center = np.array(center, dtype=np.float32)
+
+    options = {}
+    if method in ("pml_hybrid", "pml_quad", "tv"):
+        options["reg_par"] = np.array([beta, delta], dtype=np.float32)
+    if method == "mlem":
+        options["accelerated"] = False
+        options["device"] = "cpu"
+
+    if method in ANALYTIC_METHODS:
+        recon = tomopy.recon(tomo, theta, algorithm=method, center=center, ncore=ncore)
+        if progress is not None:
+            progress(1, 1)
+    else:
+        iters = max(1, int(iters))
+        if step is None:
+            #progress is reported by re-entering tomopy, without it run every iteration in one call
+            step = iters if progress is None else max(1, iters // 10)
+        recon = None if init_recon is None else np.array(init_recon, dtype=np.float32)
+        if recon is not None and method == "art":
+            #the guess is in the units of the returned reconstruction
+            recon = recon*1.49
+        done = 0
+        while done < iters:
+            block = min(step, iters - done)
+            recon = tomopy.recon(tomo, theta, algorithm=method, center=center, num_iter=block,
+                                 init_recon=recon, ncore=ncore, **options)
+            done += block
+            if progress is not None:
+                progress(done, iters)
+
+    if method in ("gridrec", "art"):
+        recon = recon/1.49
+    #tomopy.remove_nan() does not remove inf values
+    recon = tomopy.remove_nan(recon)
+    if np.isinf(recon).max():
+        print("WARNING: inf values found in reconstruction, consider reconstructing with less iterations")
+        print("inf values replaced with 0.001")
+        recon[recon == np.inf] = 0.001
+    return as_working(recon)
+
+WARM_START_MIN_FRACTION = 0.2
+
+
+def recon_record(recon, tomo, thetas, center, method, top_row=0):
+    """
+    Keeps what warm_start needs to reuse a finished reconstruction. The
+    projections are not kept, only how far the re-projected reconstruction
+    is from them in every row, so iterative methods re-project once here.
+
+    Parameters
+    ----------
+    recon : ndarray
+        3D reconstruction [y, x, x] as returned by recon_volume
+    tomo : ndarray
+        3D projection stack [projection, y, x] it was reconstructed from
+    thetas, center, method
+        see recon_volume
+    top_row : int
+        row index of the first slice
+
+    Returns
+    -------
+    record : dict
+        {'recon', 'residual', 'thetas', 'center', 'method', 'top_row'}, residual
+        holds the squared re-projection error per row, None for analytic methods
+    """
+    if not isinstance(method, str):
+        method = RECON_METHODS[method]
+    recon = np.asarray(recon)
+    thetas = np.array(thetas, dtype=np.float32)
+    residual = None
+    if method not in ANALYTIC_METHODS:
+        scale = 1.49 if method == "art" else 1.0
+        sim = tomopy.project(np.asarray(recon, dtype=np.float32)*scale, thetas*np.pi/180, center=center, pad=False)
+        tomo = np.nan_to_num(np.asarray(tomo, dtype=np.float32), nan=1, posinf=1, neginf=1)
+        residual = np.sum((sim - tomo)**2, axis=(0, 2), dtype=np.float64)
+    return {"recon": recon,
+            "residual": residual,
+            "thetas": thetas,
+            "center": float(center),
+            "method": method,
+            "top_row": int(top_row)}
+
+
+def warm_start(record, tomo, thetas, center, method, iters, top_row=0, min_fraction=WARM_START_MIN_FRACTION):
+    """
+    Builds an initial guess for an iterative reconstruction from a previous
+    one and scales the iterations down by how much of the way from an empty
+    volume the guess already is. Rows outside the previous window are filled
+    from the nearest reconstructed slice. The distance is measured by
+    re-projecting the guess, so a small re-alignment or a moved row window
+    warm starts while a guess that explains the new data no better than an
+    empty volume falls back to a cold start.
+
+    Parameters
+    ----------
+    record : dict or None
+        previous reconstruction, see recon_record
+    tomo : ndarray
+        3D projection stack [projection, y, x] about to be reconstructed
+    thetas, center, method, iters
+        see recon_volume
+    top_row : int
+        row index of the first slice of tomo
+    min_fraction : float
+        smallest fraction of iters run from a warm start
+
+    Returns
+    -------
+    init_recon : ndarray or None
+        initial guess [y, x, x] for recon_volume, None for a cold start
+    iters : int
+        iterations to run
+    """
+    if not isinstance(method, str):
+        method = RECON_METHODS[method]
+    if record is None or method in ANALYTIC_METHODS or record["residual"] is None:
+        return None, iters
+    thetas = np.asarray(thetas, dtype=np.float32)
+    num_rows, width = tomo.shape[1], tomo.shape[2]
+    previous = record["recon"]
+    if (record["method"] != method or record["center"] != float(center) or previous.shape[2] != width
+            or record["thetas"].shape != thetas.shape or not np.allclose(record["thetas"], thetas)):
+        return None, iters
+    #rows of the new window, clipped to the previous one
+    first = record["top_row"]
+    rows = np.clip(np.arange(top_row, top_row+num_rows) - first, 0, previous.shape[0]-1)
+    overlap = np.arange(max(top_row, first), min(top_row+num_rows, first+previous.shape[0]))
+    if len(overlap) == 0:
+        return None, iters
+
+    scale = 1.49 if method == "art" else 1.0
+    theta = thetas*np.pi/180
+    init_recon = np.array(previous[rows], dtype=np.float32)
+    tomo = np.nan_to_num(np.asarray(tomo, dtype=np.float32), nan=1, posinf=1, neginf=1)
+    sim = tomopy.project(init_recon*scale, theta, center=center, pad=False)
+    #how far the previous reconstruction was from its own data is what iterating cannot remove
+    settled = np.sqrt(np.sum(record["residual"][overlap-first])*num_rows/len(overlap))
+    cold = np.linalg.norm(tomo)
+    warm = np.linalg.norm(sim - tomo)
+    if warm >= cold:
+        return None, iters
+    fraction = np.clip((warm - settled)/max(cold - settled, 1e-12), min_fraction, 1.0)
+    return init_recon, max(1, int(np.ceil(iters*fraction)))
+
+
+def save_recon_slices(recon, prefix, start_idx=0):
+    """
+    Writes each slice of a reconstruction as {prefix}_recon_{0000}.tiff
+
+    Parameters
+    ----------
+    recon : ndarray
+        3D reconstruction [y, x, x]
+    prefix : str
+        path and file name prefix (ex. savedir/Fe/Fe)
+    start_idx : int
+        row index of the first slice
+    """
+    for i in range(recon.shape[0]):
+        io.imsave("{}_recon_{:04d}.tiff".format(prefix, start_idx+i), np.float32(recon[i]), check_contrast=False)
+
+
+def recon_to_sink(tomo, thetas, center, method, sink, name, beta=1.0, delta=0.01, iters=10, rows_per_block=None,
+                  memory_mb=256, ncore=None, progress=None):
+    """
+    Reconstructs one element in blocks of rows and pushes every finished
+    block into a sink, which writes it while the next block is reconstructed.
+
+    Parameters
+    ----------
+    tomo : ndarray
+        3D projection stack [projection, y, x]
+    thetas, center, method, beta, delta, iters, ncore
+        see recon_volume
+    sink : SliceSink
+        receives the slices, see xrftomo.open_recon_sink
+    name : str
+        element name the volume is written under
+    rows_per_block : int, optional
+        rows per tomopy call, by default as many as fit memory_mb
+    memory_mb : float
+        approximate size of one reconstructed block
+    progress : callable, optional
+        called as progress(done, total) with the number of rows finished
+
+    Returns
+    -------
+    recon : ndarray or None
+        3D reconstruction [y, x, x], None when the sink does not keep volumes
+    """
+    num_rows, width = tomo.shape[1], tomo.shape[2]
+    if rows_per_block is None:
+        rows_per_block = int(memory_mb*1e6 // (4*width*width))
+    rows_per_block = max(1, int(rows_per_block))
+    sink.begin(name, (num_rows, width, width))
+    for start in range(0, num_rows, rows_per_block):
+        end = min(start+rows_per_block, num_rows)
+        sink.push(name, start, recon_volume(tomo[:, start:end], thetas, center, method, beta, delta, iters, ncore=ncore))
+        if progress is not None:
+            progress(end, num_rows)
+    return sink.end(name)
+
+
+def _recon_element(name, tomo, thetas, center, method, beta, delta, iters, ncore, savedir, start_idx, sink, keep):
+    if savedir is None:
+        return recon_volume(tomo, thetas, center, method, beta, delta, iters, ncore=ncore)
+    writer = open_recon_sink(sink, savedir, start_idx, keep=keep)
+    try:
+        return recon_to_sink(tomo, thetas, center, method, writer, name, beta, delta, iters, ncore=ncore)
+    finally:
+        writer.close()
+
+
+def recon_elements(data, element_names, thetas, center, method, beta=1.0, delta=0.01, iters=10, workers=0,
+                   savedir=None, start_idx=0, callback=None, cancel=None, sink="tiff", keep=True):
+    """
+    Reconstructs several elements concurrently on a process pool. Each worker
+    gets an equal share of the cores for tomopy and, when savedir is given,
+    streams its slices to disk through a sink while it reconstructs. Workers
+    are spawned rather than forked: this is called from a GUI thread of a
+    process whose OpenMP pool is usually running, and forked children of such
+    a process can hang.
+
+    Parameters
+    ----------
+    data : ndarray
+        4D array [element, projection, y, x], one entry per name in element_names
+    element_names : list
+        element names, used as recon_dict keys and output folder names
+    thetas : ndarray
+        projection angles in degrees, shared by all elements
+    center : float
+        rotation axis position, shared by all elements
+    method, beta, delta, iters
+        see recon_volume
+    workers : int
+        number of elements reconstructed at once, 0 uses one per core
+    savedir : str, optional
+        directory receiving {savedir}/{element}/{element}_recon_{0000}.tiff
+        or {savedir}/{element}/{element}_recon.h5
+    start_idx : int
+        row index of the first slice, used in the saved file names
+    callback : callable, optional
+        called as callback(name, recon, done, total) from the calling thread as elements finish
+    cancel : CancelToken, optional
+        token checked while waiting; elements not yet started are dropped once it is cancelled
+    sink : str
+        'tiff' or 'hdf5' output when savedir is given
+    keep : bool
+        return the volumes; when False saved volumes are only written to disk
+        and recon is None in the callback
+
+    Returns
+    -------
+    recon_dict : dict
+        {element name: 3D reconstruction} of the volumes that were kept
+    """
+    total = len(element_names)
+    recon_dict = {}
+    if total == 0:
+        return recon_dict
+    cores = os.cpu_count() or 1
+    if not workers or workers < 1:
+        workers = cores
+    workers = min(workers, total)
+    ncore = max(1, cores // workers)
+    thetas = np.asarray(thetas)
+    finished = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        queue = list(range(total))
+        jobs = {}
+        while len(queue) > 0 or len(jobs) > 0:
+            if cancel is not None and cancel.cancelled:
+                for job in jobs:
+                    job.cancel()
+                print("reconstruction cancelled after {}/{} elements".format(finished, total))
+                break
+            #keep at most one pending element per worker so only those stacks are pickled
+            while len(queue) > 0 and len(jobs) < workers:
+                i = queue.pop(0)
+                job = pool.submit(_recon_element, element_names[i], np.asarray(data[i]), thetas, center, method,
+                                  beta, delta, iters, ncore, savedir, start_idx, sink, keep)
+                jobs[job] = element_names[i]
+            done, pending = wait(list(jobs), timeout=0.1, return_when=FIRST_COMPLETED)
+            for job in done:
+                name = jobs.pop(job)
+                try:
+                    recon = job.result()
+                except Exception as error:
+                    print(error)
+                    print("reconstruction failed for: {}".format(name))
+                    continue
+                finished += 1
+                if recon is not None:
+                    recon_dict[name] = recon
+                if callback is not None:
+                    callback(name, recon, finished, total)
+    return recon_dict
+
+
+def _lamino_coefficients(theta, tiltangle, geometry):
+    """
+    Detector coordinates of voxel (z, i, j) for one angle, written as
+    u = cu[0]*i + cu[1]*j + n/2 and v = cv[0]*i + cv[1]*j + sin(tilt)*z + nz/2
+    with i, j, z centred on the volume.
+    """
+    if geometry == "victor":
+        #i runs along y, j along x
+        cu = (np.sin(theta), np.cos(theta))
+        cv = (np.cos(tiltangle)*np.cos(theta), np.cos(tiltangle)*np.sin(theta))
+    else:
+        #i runs along x, j along y
+        cu = (np.cos(theta), np.sin(theta))
+        cv = (-np.cos(tiltangle)*np.sin(theta), np.cos(tiltangle)*np.cos(theta))
+    return cu, cv
+
+
+def _lamino_sample(data, v, u, interpolation):
+    nz, n = data.shape
+    if interpolation == "nearest_neighbor":
+        valid = (v >= 0) & (v < nz) & (u >= 0) & (u < n)
+        vi = np.clip(v, 0, nz-1).astype(np.intp)
+        ui = np.clip(u, 0, n-1).astype(np.intp)
+        return np.where(valid, data[vi, ui], 0)
+    if interpolation == "cubic":
+        return ndimage.map_coordinates(data, (v, u), order=3, mode="constant", cval=0.0, prefilter=False)
+    #bilinear, the zero border handles samples that straddle the detector edge
+    padded = np.pad(data, 1)
+    v0 = np.floor(v)
+    u0 = np.floor(u)
+    fv = (v - v0).astype(data.dtype)
+    fu = (u - u0).astype(data.dtype)
+    valid = (v > -1) & (v < nz) & (u > -1) & (u < n)
+    vi = np.clip(v0.astype(np.intp)+1, 0, nz)
+    ui = np.clip(u0.astype(np.intp)+1, 0, n)
+    top = padded[vi, ui]*(1-fu) + padded[vi, ui+1]*fu
+    bottom = padded[vi+1, ui]*(1-fu) + padded[vi+1, ui+1]*fu
+    return np.where(valid, top*(1-fv) + bottom*fv, 0)
+
+
+def _lamino_spread(values, v, u, nz, n):
+    """
+    Adjoint of the bilinear branch of _lamino_sample: spreads values onto a
+    [nz, n] detector with the same weights the backprojection samples with.
+    """
+    v0 = np.floor(v)
+    u0 = np.floor(u)
+    fv = (v - v0).astype(values.dtype)
+    fu = (u - u0).astype(values.dtype)
+    valid = (v > -1) & (v < nz) & (u > -1) & (u < n)
+    vi = np.clip(v0.astype(np.intp)+1, 0, nz)
+    ui = np.clip(u0.astype(np.intp)+1, 0, n)
+    values = np.where(valid, values, 0)
+    index = (vi*(n+2) + ui).ravel()
+    padded = np.zeros((nz+2)*(n+2))
+    for offset, weight in ((0, (1-fv)*(1-fu)), (1, (1-fv)*fu), (n+2, fv*(1-fu)), (n+3, fv*fu)):
+        padded += np.bincount(index + offset, (values*weight).ravel(), minlength=padded.size)
+    return padded.reshape(nz+2, n+2)[1:-1, 1:-1]
+
+
+def lamino_backproject(stack, thetas, tiltangle, interpolation="linear", geometry="lamino", memory_mb=1024, workers=None):
+    """
+    Laminography backprojection of a (filtered) projection stack.
+
+    The in-plane coordinate grids are built once; the detector row of every
+    voxel is that grid plus a z offset, so the volume is processed in z-chunks
+    sized to memory_mb and the chunks are backprojected on a thread pool.
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D projection stack [projection, y, x]
+    thetas : ndarray
+        projection angles in degrees
+    tiltangle : float
+        laminography tilt angle in degrees
+    interpolation : str
+        'nearest_neighbor', 'linear' or 'cubic'
+    geometry : str
+        'lamino' for LaminographyActions.lam, 'victor' for ReconstructionActions.lam
+    memory_mb : float
+        approximate scratch memory budget for all workers together
+    workers : int, optional
+        number of threads, defaults to the number of cores
+
+    Returns
+    -------
+    reconstructed : ndarray
+        3D volume [z, n, n] in the working dtype
+    """
+    stack = np.asarray(stack, dtype=np.float32)
+    num_angles, nz, n = stack.shape
+    theta = np.deg2rad(np.asarray(thetas, dtype=np.float64))
+    tiltangle = np.deg2rad(tiltangle)
+    reconstructed = np.zeros((nz, n, n), dtype=get_working_dtype())
+    if interpolation not in ("nearest_neighbor", "linear", "cubic"):
+        return reconstructed
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if interpolation == "cubic":
+        #spline coefficients once per projection rather than once per chunk, in the boundary mode of the sampling
+        stack = np.stack([ndimage.spline_filter(projection, order=3, output=np.float32, mode="constant") for projection in stack])
+
+    centred = np.arange(n, dtype=np.float32) - n/2
+    I = centred[:, None]
+    J = centred[None, :]
+    zpr = np.arange(nz, dtype=np.float32) - nz/2
+    coefficients = [_lamino_coefficients(theta[k], tiltangle, geometry) for k in range(num_angles)]
+    planes = [(cu[0]*I + cu[1]*J + n/2, cv[0]*I + cv[1]*J + nz/2) for cu, cv in coefficients]
+
+    #about a dozen float32/intp scratch arrays per voxel while sampling
+    voxel_bytes = 64
+    chunk = int(max(1, min(nz, memory_mb*1e6 // (voxel_bytes*n*n*workers))))
+    z_chunks = [(z0, min(nz, z0+chunk)) for z0 in range(0, nz, chunk)]
+
+    def backproject_chunk(z0, z1):
+        z = zpr[z0:z1, None, None]*np.float32(np.sin(tiltangle))
+        out = np.zeros((z1-z0, n, n), dtype=np.float32)
+        for k in range(num_angles):
+            u, v = planes[k]
+            out += _lamino_sample(stack[k], v[None] + z, np.broadcast_to(u, (z1-z0, n, n)), interpolation)
+        reconstructed[z0:z1] = out
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(z_chunks)))) as pool:
+        for job in [pool.submit(backproject_chunk, z0, z1) for z0, z1 in z_chunks]:
+            job.result()
+    return reconstructed
+
+
+def lamino_project(volume, thetas, tiltangle, geometry="lamino", memory_mb=1024, workers=None):
+    """
+    Laminography forward projection of a volume, the adjoint of
+    lamino_backproject with linear interpolation. A tilt angle of 90
+    degrees is parallel beam tomography with one detector row per slice.
+
+    Projections are computed on a thread pool, each one in z-chunks sized
+    to memory_mb.
+
+    Parameters
+    ----------
+    volume : ndarray
+        3D volume [z, n, n]
+    thetas : ndarray
+        projection angles in degrees
+    tiltangle : float
+        laminography tilt angle in degrees
+    geometry : str
+        'lamino' for LaminographyActions.lam, 'victor' for ReconstructionActions.lam
+    memory_mb : float
+        approximate scratch memory budget for all workers together
+    workers : int, optional
+        number of threads, defaults to the number of cores
+
+    Returns
+    -------
+    stack : ndarray
+        3D projection stack [projection, z, n] in float32
+    """
+    volume = np.asarray(volume, dtype=np.float32)
+    nz, n = volume.shape[:2]
+    theta = np.deg2rad(np.asarray(thetas, dtype=np.float64))
+    tiltangle = np.deg2rad(tiltangle)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stack = np.zeros((len(theta), nz, n), dtype=np.float32)
+
+    centred = np.arange(n, dtype=np.float32) - n/2
+    I = centred[:, None]
+    J = centred[None, :]
+    zpr = np.arange(nz, dtype=np.float32) - nz/2
+    voxel_bytes = 96
+    chunk = int(max(1, min(nz, memory_mb*1e6 // (voxel_bytes*n*n*max(1, workers)))))
+
+    def project_angle(k):
+        cu, cv = _lamino_coefficients(theta[k], tiltangle, geometry)
+        u = cu[0]*I + cu[1]*J + n/2
+        v = cv[0]*I + cv[1]*J + nz/2
+        projection = np.zeros((nz, n))
+        for z0 in range(0, nz, chunk):
+            z1 = min(nz, z0+chunk)
+            z = zpr[z0:z1, None, None]*np.float32(np.sin(tiltangle))
+            projection += _lamino_spread(volume[z0:z1], v[None] + z, np.broadcast_to(u, (z1-z0, n, n)), nz, n)
+        stack[k] = projection
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(theta)))) as pool:
+        for job in [pool.submit(project_angle, k) for k in range(len(theta))]:
+            job.result()
+    return stack
@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for registering projection stacks by batched FFT correlation and
+weighted centre of mass.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import fft
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['projection_spectra',
+           'phase_correlate_pairs',
+           'chain_shifts',
+           'phase_correlate_stack',
+           'REGISTRATION_REFERENCES',
+           'register_stack',
+           'register_pairs',
+           'otsu_thresholds',
+           'weighted_centroids',
+           'fit_sinusoid',
+           'center_of_mass_shifts']
+
+REGISTRATION_REFERENCES = ("chained", "fixed")
+
+
+def _wrap(shifts, size):
+    #peaks past the middle of the frame are negative shifts
+    shifts = np.mod(shifts, size)
+    return np.where(shifts > size // 2, shifts - size, shifts)
+
+def projection_spectra(stack, workers=-1):
+    """
+    2D real FFT of every projection in one batched call
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    workers : int
+        FFT threads, -1 uses every core
+
+    Returns
+    -------
+    spectra : ndarray
+        complex array [projection, y, x//2+1]
+    """
+    stack = np.asarray(stack)
+    if stack.dtype != np.float64:
+        stack = stack.astype(np.float32)
+    return fft.rfft2(stack, workers=workers)
+
+def phase_correlate_pairs(stack, spectra=None, workers=-1, block_size=32):
+    """
+    Integer phase correlation peak of every neighbouring projection pair
+    (i, i+1). Each spectrum is computed once and shared by both pairs it is in.
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    spectra : ndarray, optional
+        cached output of projection_spectra(stack)
+    workers : int
+        FFT threads, -1 uses every core
+    block_size : int
+        pairs correlated per batch, bounds the scratch memory
+
+    Returns
+    -------
+    y_shifts, x_shifts : ndarray
+        rows and columns projection i+1 has to be rolled by to match projection i,
+        one entry per pair
+    """
+    shape = np.shape(stack)[-2:]
+    if spectra is None:
+        spectra = projection_spectra(stack, workers)
+    num_pairs = max(0, len(spectra) - 1)
+    y_shifts = np.zeros(num_pairs, dtype=int)
+    x_shifts = np.zeros(num_pairs, dtype=int)
+    block_size = max(1, int(block_size))
+    for start in range(0, num_pairs, block_size):
+        end = min(start + block_size, num_pairs)
+        fa = spectra[start:end]
+        fb = spectra[start+1:end+1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross = fa * fb.conjugate() / (np.abs(fa) * np.abs(fb))
+        c = np.abs(fft.irfft2(cross, s=shape, workers=workers))
+        peaks = np.argmax(c.reshape(end - start, -1), axis=1)
+        y_shifts[start:end], x_shifts[start:end] = np.unravel_index(peaks, shape)
+    return _wrap(y_shifts, shape[0]), _wrap(x_shifts, shape[1])
+
+def chain_shifts(pair_shifts, size):
+    """
+    Accumulates pairwise shifts along the stack, the first projection stays put
+
+    Parameters
+    ----------
+    pair_shifts : ndarray
+        shift of projection i+1 relative to projection i
+    size : int
+        frame size along the shifted axis, cumulative shifts wrap around it
+
+    Returns
+    -------
+    shifts : ndarray
+        shift of every projection relative to the first one
+    """
+    return _wrap(np.concatenate(([0], np.cumsum(pair_shifts))), size)
+
+def phase_correlate_stack(stack, workers=-1, block_size=32):
+    """
+    Chained phase correlation of a projection stack: every projection is
+    registered to its already registered predecessor.
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    workers : int
+        FFT threads, -1 uses every core
+    block_size : int
+        pairs correlated per batch
+
+    Returns
+    -------
+    y_shifts, x_shifts : ndarray
+        integer roll of every projection, ready for shift_projections
+    """
+    shape = np.shape(stack)[-2:]
+    y_pairs, x_pairs = phase_correlate_pairs(stack, workers=workers, block_size=block_size)
+    return chain_shifts(y_pairs, shape[0]), chain_shifts(x_pairs, shape[1])
+
+def _upsampled_dft(product, region_size, upsample_factor, offsets):
+    """
+    Cross correlation around the coarse peak sampled upsample_factor times finer,
+    as a matrix product per image. product is [image, (y,) x], offsets [image, ndim].
+    """
+    im2pi = 2j*np.pi
+    region = np.arange(region_size)
+    kernels = []
+    for axis, size in enumerate(product.shape[1:]):
+        freqs = fft.fftfreq(size, upsample_factor)
+        #exp(-2i pi (r - offset) f) split into a shared kernel and a per image phase
+        base = np.exp(-im2pi*region[:, None]*freqs[None, :]).astype(product.dtype)
+        phase = np.exp(im2pi*offsets[:, axis, None]*freqs[None, :]).astype(product.dtype)
+        kernels.append(base[None]*phase[:, None, :])
+    if product.ndim == 2:
+        return np.matmul(kernels[0], product[:, :, None])[:, :, 0]
+    #[image, uy, y] @ [image, y, x] @ [image, x, ux]
+    return np.matmul(np.matmul(kernels[0], product), kernels[1].transpose(0, 2, 1))
+
+def _register_block(product, upsample_factor, normalization):
+    """
+    Sub-pixel shifts for a block of cross power spectra, following the
+    upsampled DFT method of skimage.registration.phase_cross_correlation
+    """
+    shape = np.array(product.shape[1:])
+    axes = tuple(range(1, product.ndim))
+    num = len(product)
+    if normalization == "phase":
+        eps = np.finfo(product.real.dtype).eps
+        product = product/np.maximum(np.abs(product), 100*eps)
+    cross = np.abs(fft.ifftn(product, axes=axes))
+    peaks = np.argmax(cross.reshape(num, -1), axis=1)
+    shifts = np.stack(np.unravel_index(peaks, tuple(shape)), axis=1).astype(float)
+    midpoints = np.fix(shape/2)
+    shifts = np.where(shifts > midpoints, shifts - shape, shifts)
+    if upsample_factor > 1:
+        shifts = np.round(shifts*upsample_factor)/upsample_factor
+        region_size = int(np.ceil(upsample_factor*1.5))
+        dftshift = np.fix(region_size/2.0)
+        offsets = dftshift - shifts*upsample_factor
+        cross = np.abs(_upsampled_dft(product.conj(), region_size, upsample_factor, offsets))
+        peaks = np.argmax(cross.reshape(num, -1), axis=1)
+        fine = np.stack(np.unravel_index(peaks, cross.shape[1:]), axis=1).astype(float)
+        shifts = shifts + (fine - dftshift)/upsample_factor
+    shifts[:, shape == 1] = 0
+    return shifts
+
+def register_stack(stack, reference="chained", upsample_factor=100, normalization="phase", ref_index=0, workers=None, block_size=64):
+    """
+    Sub-pixel registration of every image in a stack of 1D rows or 2D
+    projections. All spectra come from one batched FFT, the reference spectrum
+    is computed once and blocks of images are registered as stacked arrays,
+    optionally on a thread pool.
+
+    Parameters
+    ----------
+    stack : ndarray
+        [image, x] or [image, y, x]
+    reference : str
+        'fixed' registers every image to stack[ref_index], 'chained' registers
+        image i to image i-1 and accumulates the shifts along the stack
+    upsample_factor : int
+        images are registered to 1/upsample_factor of a pixel
+    normalization : str or None
+        'phase' for phase correlation, None for plain cross correlation
+    ref_index : int
+        reference image of the 'fixed' mode
+    workers : int, optional
+        threads registering blocks concurrently, defaults to one per core
+    block_size : int
+        images registered per batch
+
+    Returns
+    -------
+    shifts : ndarray
+        [image, ndim] shift that registers each image to the reference, in
+        the convention of phase_cross_correlation (rows first)
+    """
+    stack = np.asarray(stack)
+    if stack.dtype != np.float64:
+        stack = stack.astype(np.float32)
+    num = len(stack)
+    axes = tuple(range(1, stack.ndim))
+    spectra = fft.fftn(stack, axes=axes, workers=-1)
+    shifts = np.zeros((num, stack.ndim-1))
+    if reference == "fixed":
+        targets = np.arange(num)
+    else:
+        targets = np.arange(1, num)
+    sources = targets - 1
+    block_size = max(1, int(block_size))
+    blocks = [(start, min(start+block_size, len(targets))) for start in range(0, len(targets), block_size)]
+
+    def register(block):
+        start, end = block
+        if reference == "fixed":
+            source = spectra[int(ref_index)][None]
+        else:
+            source = spectra[sources[start:end]]
+        product = source*spectra[targets[start:end]].conj()
+        return _register_block(product, upsample_factor, normalization)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (start, end), result in zip(blocks, pool.map(register, blocks)):
+            shifts[targets[start:end]] = result
+    if reference != "fixed":
+        shifts = np.cumsum(shifts, axis=0)
+    return shifts
+
+def register_pairs(reference, moving, upsample_factor=100, normalization="phase", workers=None, block_size=64):
+    """
+    Sub-pixel registration of every moving image to the reference image of
+    the same index, phase_cross_correlation(reference[i], moving[i]) for a
+    whole stack
+
+    Parameters
+    ----------
+    reference : ndarray
+        [image, y, x] or [image, x] stack
+    moving : ndarray
+        stack of the same shape as reference
+    upsample_factor : int
+        images are registered to 1/upsample_factor of a pixel
+    normalization : str or None
+        'phase' for phase correlation, None for plain cross correlation
+    workers : int, optional
+        threads registering blocks concurrently, defaults to one per core
+    block_size : int
+        images registered per batch
+
+    Returns
+    -------
+    shifts : ndarray
+        [image, ndim] shift that registers each moving image to its reference (rows first)
+    """
+    reference = np.asarray(reference)
+    moving = np.asarray(moving)
+    if reference.dtype != np.float64 or moving.dtype != np.float64:
+        reference = reference.astype(np.float32)
+        moving = moving.astype(np.float32)
+    axes = tuple(range(1, reference.ndim))
+    num = len(reference)
+    block_size = max(1, int(block_size))
+    blocks = [(start, min(start+block_size, num)) for start in range(0, num, block_size)]
+
+    def register(block):
+        start, end = block
+        product = fft.fftn(reference[start:end], axes=axes)*fft.fftn(moving[start:end], axes=axes).conj()
+        return _register_block(product, upsample_factor, normalization)
+
+    shifts = np.zeros((num, reference.ndim-1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (start, end), result in zip(blocks, pool.map(register, blocks)):
+            shifts[start:end] = result
+    return shifts
+
+def otsu_thresholds(stack, nbins=256):
+    """
+    Otsu threshold of every projection from one batched histogram, same
+    method as skimage.filters.threshold_otsu
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    nbins : int
+        histogram bins per projection
+
+    Returns
+    -------
+    thresholds : ndarray
+        one threshold per projection
+    """
+    stack = np.asarray(stack)
+    num = len(stack)
+    flat = stack.reshape(num, -1)
+    low = flat.min(axis=1).astype(float)
+    high = flat.max(axis=1).astype(float)
+    width = np.where(high > low, high - low, 1.0)
+    bins = np.clip(((flat - low[:, None])/width[:, None]*nbins).astype(np.intp), 0, nbins-1)
+    hist = np.bincount((bins + np.arange(num)[:, None]*nbins).ravel(), minlength=num*nbins).reshape(num, nbins).astype(float)
+    centers = low[:, None] + (np.arange(nbins) + 0.5)[None, :]*(width/nbins)[:, None]
+
+    weight1 = np.cumsum(hist, axis=1)
+    weight2 = np.cumsum(hist[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean1 = np.cumsum(hist*centers, axis=1)/weight1
+        mean2 = (np.cumsum((hist*centers)[:, ::-1], axis=1)/weight2[:, ::-1])[:, ::-1]
+    variance = weight1[:, :-1]*weight2[:, 1:]*(mean1[:, :-1] - mean2[:, 1:])**2
+    thresholds = centers[np.arange(num), np.argmax(np.nan_to_num(variance), axis=1)]
+    #flat images have no threshold, keep their value like threshold_otsu
+    return np.where(high > low, thresholds, low)
+
+def weighted_centroids(stack, thresholds=None):
+    """
+    Intensity weighted centroid of the pixels above threshold in every projection
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    thresholds : ndarray, optional
+        one threshold per projection, defaults to otsu_thresholds(stack)
+
+    Returns
+    -------
+    rows, cols : ndarray
+        centroid of every projection, the frame centre for blank projections
+    """
+    stack = np.asarray(stack)
+    if thresholds is None:
+        thresholds = otsu_thresholds(stack)
+    weights = np.where(stack > np.asarray(thresholds)[:, None, None], stack, 0).astype(float)
+    total = weights.sum(axis=(1, 2))
+    blank = total == 0
+    total[blank] = 1
+    rows = weights.sum(axis=2) @ np.arange(stack.shape[1])/total
+    cols = weights.sum(axis=1) @ np.arange(stack.shape[2])/total
+    rows[blank] = stack.shape[1]//2
+    cols[blank] = stack.shape[2]//2
+    return rows, cols
+
+def fit_sinusoid(thetas, positions):
+    """
+    Least squares fit of positions = a*sin(theta) + b*cos(theta) + c,
+    solved directly as a linear problem
+
+    Parameters
+    ----------
+    thetas : ndarray
+        projection angles in degrees
+    positions : ndarray
+
+    Returns
+    -------
+    fit : ndarray
+        fitted positions
+    params : ndarray
+        (a, b, c)
+    """
+    radians = np.radians(np.asarray(thetas, dtype=float))
+    design = np.stack([np.sin(radians), np.cos(radians), np.ones_like(radians)], axis=1)
+    params = np.linalg.lstsq(design, np.asarray(positions, dtype=float), rcond=None)[0]
+    return design @ params, params
+
+def center_of_mass_shifts(stack, thetas=None, nbins=256):
+    """
+    Centre of mass alignment of a projection stack. Otsu thresholds and
+    weighted centroids come from a few reductions over the whole stack.
+
+    Without thetas every centroid is moved to the frame centre. With thetas
+    the horizontal centroids are fitted with a sinusoid: projections are moved
+    onto the fitted curve and the curve's offset, the rotation axis, onto the
+    frame centre.
+
+    Parameters
+    ----------
+    stack : ndarray
+        3D array [projection, y, x]
+    thetas : ndarray, optional
+        projection angles in degrees
+    nbins : int
+        histogram bins of the Otsu thresholds
+
+    Returns
+    -------
+    x_shifts, y_shifts : ndarray
+        shifts for shift_projections, +x towards higher columns, +y towards higher rows
+    """
+    stack = np.asarray(stack)
+    thresholds = otsu_thresholds(stack, nbins)
+    rows, cols = weighted_centroids(stack, thresholds)
+    center_x = stack.shape[2]//2
+    center_y = stack.shape[1]//2
+    target = np.full(len(cols), float(center_x))
+    #blank projections have no centroid, they keep a zero shift and stay out of the fit
+    valid = (stack > thresholds[:, None, None]).any(axis=(1, 2))
+    if thetas is not None and valid.sum() >= 3:
+        thetas = np.asarray(thetas, dtype=float)
+        fit, params = fit_sinusoid(thetas[valid], cols[valid])
+        target[valid] = fit - params[2] + center_x
+    return np.where(valid, target - cols, 0), np.where(valid, center_y - rows, 0)
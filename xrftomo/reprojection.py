@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for re-projection alignment of a projection stack, with a
+coarse-to-fine pyramid over binned copies of the stack.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import time
+import numpy as np
+import tomopy
+
+from xrftomo.registration import register_pairs
+from xrftomo.shift import shift_projections
+from xrftomo.file_io.reader import bin_planes
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['REPROJECTION_MODES',
+           'PYRAMID_LEVELS',
+           'reprojection_align',
+           'pyramid_align']
+
+
+REPROJECTION_MODES = ("joint", "seq")
+PYRAMID_LEVELS = (4, 2, 1)
+
+
+def reprojection_align(prj, thetas, mode="joint", iters=5, pad=(0, 0), blur=True, rin=0.5, rout=0.8, center=None,
+                       algorithm="sirt", upsample_factor=10, x_shifts=None, y_shifts=None, tol=None, init_recon=None,
+                       return_recon=False):
+    """
+    Re-projection alignment following tomopy.align_joint ('joint', one
+    warm started reconstruction iteration per alignment iteration) and
+    tomopy.align_seq ('seq', a full reconstruction per alignment iteration).
+    Every iteration registers all projections to their re-projections in
+    one batch and re-shifts the original stack by the accumulated shifts.
+
+    Parameters
+    ----------
+    prj : ndarray
+        3D projection stack [projection, y, x]
+    thetas : ndarray
+        projection angles in radians
+    mode : str
+        'joint' or 'seq'
+    iters : int
+        maximum number of iterations
+    pad : tuple
+        (x, y) zero padding
+    blur : bool
+        blur the projection edges between rin and rout before registering
+    rin, rout : float
+        inner and outer blur radius, fraction of the frame radius
+    center : float, optional
+        rotation center
+    algorithm : str
+        tomopy reconstruction algorithm
+    upsample_factor : int
+        projections are registered to 1/upsample_factor of a pixel
+    x_shifts, y_shifts : ndarray, optional
+        starting shifts
+    tol : float, optional
+        stop once no projection moves by more than tol pixels in an iteration
+    init_recon : ndarray, optional
+        reconstruction the 'joint' mode starts from, e.g. the one returned by
+        an earlier run on nearly the same stack. Ignored when its shape does
+        not match the padded stack.
+    return_recon : bool
+        also return the last reconstruction
+
+    Returns
+    -------
+    x_shifts, y_shifts : ndarray
+        accumulated shifts, in the convention of tomopy.align_joint
+    updates : list
+        norm of the shift update of every iteration, like the conv output of tomopy
+    recon : ndarray
+        last reconstruction of the normalized stack, only when return_recon is set
+    """
+    num_projections = prj.shape[0]
+    sx = np.zeros(num_projections) if x_shifts is None else np.array(x_shifts, dtype=float)
+    sy = np.zeros(num_projections) if y_shifts is None else np.array(y_shifts, dtype=float)
+    original = np.nan_to_num(np.asarray(prj, dtype=np.float32), nan=0.0, posinf=0.0, neginf=0.0)
+    original = original/max(float(original.max()), 1e-12)
+    npad = ((0, 0), (pad[1], pad[1]), (pad[0], pad[0]))
+    original = np.pad(original, npad, mode='constant', constant_values=0)
+
+    rec = 1e-12*np.ones((original.shape[1], original.shape[2], original.shape[2]), dtype=np.float32)
+    if init_recon is not None and mode == "joint":
+        if np.shape(init_recon) == rec.shape:
+            rec = np.array(init_recon, dtype=np.float32)
+        else:
+            print("initial reconstruction does not match the stack, starting from an empty volume")
+    extra_kwargs = {}
+    if mode == "joint" and algorithm != 'gridrec':
+        extra_kwargs['num_iter'] = 1
+    updates = []
+    for n in range(iters):
+        #one interpolation of the original stack per iteration
+        aligned = shift_projections(original.copy(), -sx, -sy, mode="spline")
+        if mode == "joint":
+            rec = tomopy.recon(aligned, thetas, center=center, algorithm=algorithm, init_recon=rec, **extra_kwargs)
+        else:
+            rec = tomopy.recon(aligned, thetas, center=center, algorithm=algorithm)
+        sim = tomopy.project(rec, thetas, center=center, pad=False)
+        if blur:
+            aligned = tomopy.blur_edges(aligned, rin, rout)
+            sim = tomopy.blur_edges(sim, rin, rout)
+        shifts = register_pairs(aligned, sim, upsample_factor)
+        sy += shifts[:, 0]
+        sx += shifts[:, 1]
+        err = np.hypot(shifts[:, 0], shifts[:, 1])
+        updates.append(float(np.linalg.norm(err)))
+        if tol is not None and err.max() < tol:
+            break
+    if return_recon:
+        return sx, sy, updates, rec
+    return sx, sy, updates
+
+def pyramid_align(prj, thetas, levels=PYRAMID_LEVELS, iters=5, tol=0.1, center=None, pad=(0, 0), x_shifts=None,
+                  y_shifts=None, init_recon=None, return_recon=False, **kwargs):
+    """
+    Coarse-to-fine re-projection alignment. Shifts are solved on binned
+    copies of the stack, scaled up and used as the starting point of the
+    next level. Every level stops early once no projection moves by more
+    than tol of its own pixels, so coarse levels stop at a coarse precision.
+
+    Parameters
+    ----------
+    prj : ndarray
+        3D projection stack [projection, y, x]
+    thetas : ndarray
+        projection angles in radians
+    levels : sequence of int
+        binning of every level, coarsest first, 1 is full resolution
+    iters : int
+        maximum number of iterations per level
+    tol : float
+        shift update, in pixels of the level, that ends a level
+    center : float, optional
+        rotation center of the full resolution stack
+    pad : tuple
+        (x, y) zero padding of the full resolution stack
+    x_shifts, y_shifts : ndarray, optional
+        full resolution starting shifts
+    init_recon : ndarray, optional
+        starting reconstruction of the full resolution level, see reprojection_align
+    return_recon : bool
+        also return the reconstruction of the last level
+    kwargs :
+        mode, blur, rin, rout, algorithm and upsample_factor of reprojection_align
+
+    Returns
+    -------
+    x_shifts, y_shifts : ndarray
+        full resolution shifts, in the convention of tomopy.align_joint
+    report : list
+        {'binning', 'iterations', 'updates', 'seconds'} for every level,
+        updates in full resolution pixels
+    recon : ndarray
+        reconstruction of the last level, only when return_recon is set
+    """
+    sx = np.zeros(prj.shape[0]) if x_shifts is None else np.array(x_shifts, dtype=float)
+    sy = np.zeros(prj.shape[0]) if y_shifts is None else np.array(y_shifts, dtype=float)
+    rec = None
+    report = []
+    for factor in levels:
+        factor = max(1, int(factor))
+        t0 = time.perf_counter()
+        level_center = None if center is None else center/factor
+        level_pad = (pad[0]//factor, pad[1]//factor)
+        lx, ly, updates, rec = reprojection_align(bin_planes(prj, factor), thetas, iters=iters, pad=level_pad,
+                                                  center=level_center, x_shifts=sx/factor, y_shifts=sy/factor, tol=tol,
+                                                  init_recon=init_recon if factor == 1 else None, return_recon=True,
+                                                  **kwargs)
+        sx = lx*factor
+        sy = ly*factor
+        level = {"binning": factor,
+                 "iterations": len(updates),
+                 "updates": [update*factor for update in updates],
+                 "seconds": time.perf_counter() - t0}
+        report.append(level)
+        print("pyramid level {}x: {} iterations, shift update {} px, {:.2f} s".format(
+            factor, level["iterations"], " -> ".join("{:.3f}".format(update) for update in level["updates"]), level["seconds"]))
+    if return_recon:
+        return sx, sy, report, rec
+    return sx, sy, report
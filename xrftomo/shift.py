@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# #########################################################################
+# Copyright © 2020, UChicago Argonne, LLC. All Rights Reserved.           #
+#                                                                         #
+#                       Software Name: XRFtomo                            #
+#                                                                         #
+#                   By: Argonne National Laboratory                       #
+#                                                                         #
+#                       OPEN SOURCE LICENSE                               #
+#                                                                         #
+# Redistribution and use in source and binary forms, with or without      #
+# modification, are permitted provided that the following conditions      #
+# are met:                                                                #
+#                                                                         #
+# 1. Redistributions of source code must retain the above copyright       #
+#    notice, this list of conditions and the following disclaimer.        #
+#                                                                         #
+# 2. Redistributions in binary form must reproduce the above copyright    #
+#    notice, this list of conditions and the following disclaimer in      #
+#    the documentation and/or other materials provided with the           #
+#    distribution.                                                        #
+#                                                                         #
+# 3. Neither the name of the copyright holder nor the names of its        #
+#    contributors may be used to endorse or promote products derived      #
+#    from this software without specific prior written permission.        #
+#                                                                         #
+#                               DISCLAIMER                                #
+#                                                                         #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS     #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT       #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR   #
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,  #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT        #
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,   #
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY   #
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT     #
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE   #
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.    #
+###########################################################################
+
+"""
+Module for shifting projections by integer and sub-pixel amounts.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from scipy import ndimage
+
+from xrftomo.precision import as_working
+
+__author__ = "Francesco De Carlo, Fabricio S. Marin"
+__copyright__ = "Copyright (c) 2018, UChicago Argonne, LLC."
+__version__ = "0.0.1"
+__docformat__ = 'restructuredtext en'
+__all__ = ['SHIFT_MODES',
+           'shift_projections']
+
+SHIFT_MODES = ("bilinear", "fourier", "spline")
+
+
+def _bilinear_axis(block, shifts, axis):
+    #shifts has one entry per projection, projections are on axis -3
+    size = block.shape[axis]
+    whole = np.floor(shifts).astype(np.intp)
+    frac = (shifts - whole).astype(block.dtype)
+    idx_shape = [1]*block.ndim
+    idx_shape[-3] = len(shifts)
+    idx_shape[axis] = size
+    frac_shape = [1]*block.ndim
+    frac_shape[-3] = len(shifts)
+    positions = np.arange(size)[None, :]
+    lower = np.take_along_axis(block, ((positions - whole[:, None]) % size).reshape(idx_shape), axis=axis)
+    if not frac.any():
+        return lower
+    upper = np.take_along_axis(block, ((positions - whole[:, None] - 1) % size).reshape(idx_shape), axis=axis)
+    frac = frac.reshape(frac_shape)
+    lower *= 1 - frac
+    upper *= frac
+    lower += upper
+    return lower
+
+
+def _spline_axis(block, shifts, axis):
+    #cubic B-spline, same result as ndimage.shift(order=3, mode='grid-wrap')
+    size = block.shape[axis]
+    coefficients = ndimage.spline_filter1d(block, order=3, axis=axis, mode="grid-wrap", output=block.dtype)
+    whole = np.floor(shifts).astype(np.intp)
+    t = (np.ceil(shifts) - shifts).astype(block.dtype)
+    idx_shape = [1]*block.ndim
+    idx_shape[-3] = len(shifts)
+    idx_shape[axis] = size
+    weight_shape = [1]*block.ndim
+    weight_shape[-3] = len(shifts)
+    #source position p - shift = base + t with base = p - ceil(shift)
+    base = np.arange(size)[None, :] - whole[:, None] - (t > 0)[:, None]
+    weights = ((1 - t)**3/6, (3*t**3 - 6*t**2 + 4)/6, (-3*t**3 + 3*t**2 + 3*t + 1)/6, t**3/6)
+    out = np.zeros_like(block)
+    for tap, weight in zip((-1, 0, 1, 2), weights):
+        idx = ((base + tap) % size).reshape(idx_shape)
+        out += np.take_along_axis(coefficients, idx, axis=axis)*weight.reshape(weight_shape)
+    return out
+
+
+def _phase_ramp(freq, shifts, size):
+    ramp = np.exp(-2j*np.pi*freq[None, :]*shifts[:, None])
+    if size % 2 == 0:
+        #a real signal cannot carry a phase at the Nyquist frequency
+        nyquist = np.argmin(np.abs(np.abs(freq) - 0.5))
+        ramp[:, nyquist] = np.cos(np.pi*shifts)
+    return ramp
+
+
+def _fourier_block(block, x_shifts, y_shifts):
+    ny, nx = block.shape[-2:]
+    ramp_y = _phase_ramp(np.fft.fftfreq(ny), y_shifts, ny)
+    ramp_x = _phase_ramp(np.fft.rfftfreq(nx), x_shifts, nx)
+    spectrum = np.fft.rfft2(block)
+    spectrum *= ramp_y[:, :, None]*ramp_x[:, None, :]
+    return np.fft.irfft2(spectrum, s=(ny, nx)).astype(block.dtype, copy=False)
+
+
+def shift_projections(data, x_shifts, y_shifts=None, indices=None, mode="bilinear", block_size=32):
+    """
+    Shift projections in place by integer and sub-pixel amounts.
+    Integer stacks are first promoted to the working dtype, since a sub-pixel
+    shift written back into them would be truncated.
+
+    All elements of the selected projections are shifted together, a block of
+    projections at a time, with wrap-around at the image edges like np.roll.
+    A positive x moves the image towards higher column indices and a positive
+    y towards higher row indices, the same convention as shiftProjection.
+
+    Parameters
+    ----------
+    data : ndarray
+        [elements, projections, y, x] or [projections, y, x] stack
+    x_shifts : float or array
+        column shift, one value or one per selected projection
+    y_shifts : float or array, optional
+        row shift, one value or one per selected projection
+    indices : int or array, optional
+        projections to shift, defaults to all of them
+    mode : str
+        'bilinear', 'fourier' (phase ramp per projection, shared by all
+        elements) or 'spline' (cubic, like ndimage.shift order=3)
+    block_size : int
+        number of projections shifted per batch
+
+    Returns
+    -------
+    data : ndarray
+        the input array shifted in place, or a shifted working-dtype copy
+        when the input is an integer stack
+    """
+    if mode not in SHIFT_MODES:
+        print("unknown shift mode: {}".format(mode))
+        return data
+    num_projections = data.shape[-3]
+    if indices is None:
+        indices = np.arange(num_projections)
+    indices = np.atleast_1d(np.asarray(indices, dtype=np.intp))
+    x_shifts = np.broadcast_to(np.asarray(x_shifts, dtype=np.float64), indices.shape)
+    if y_shifts is None:
+        y_shifts = np.zeros(indices.shape)
+    y_shifts = np.broadcast_to(np.asarray(y_shifts, dtype=np.float64), indices.shape)
+
+    #projections that do not move are skipped
+    moving = (x_shifts != 0) | (y_shifts != 0)
+    indices, x_shifts, y_shifts = indices[moving], x_shifts[moving], y_shifts[moving]
+    if len(indices) and isinstance(data, np.ndarray) and not np.issubdtype(data.dtype, np.inexact):
+        data = as_working(data)
+
+    for start in range(0, len(indices), block_size):
+        sel = indices[start:start+block_size]
+        xs = x_shifts[start:start+block_size]
+        ys = y_shifts[start:start+block_size]
+        block = np.asarray(data[..., sel, :, :])
+        if not np.issubdtype(block.dtype, np.floating):
+            block = block.astype(np.float64)
+        if mode == "fourier":
+            block = _fourier_block(block, xs, ys)
+        elif mode == "spline":
+            block = _spline_axis(block, xs, -1)
+            block = _spline_axis(block, ys, -2)
+        else:
+            block = _bilinear_axis(block, xs, -1)
+            block = _bilinear_axis(block, ys, -2)
+        data[..., sel, :, :] = block
+    return data
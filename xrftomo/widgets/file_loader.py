@@ -51,8 +51,11 @@ import h5py
 import numpy as np
 import os
 import sys
+import threading
 
 class FileTableWidget(QWidget):
+    loadProgressSig = pyqtSignal(int, int, name='loadProgressSig')
+
     def __init__(self, parent):
         super(FileTableWidget, self).__init__()
         self.parent = parent
@@ -263,6 +266,15 @@ class FileTableWidget(QWidget):
                     else:
                         pass
                 vb_files.addLayout(line)
+        self.loadStatusLabel = QLabel("")
+        self.cancelLoadBtn = QPushButton("cancel loading")
+        self.cancelLoadBtn.setFixedWidth(widgetsizes[0])
+        self.cancelLoadBtn.setEnabled(False)
+        self.cancelLoadBtn.clicked.connect(self.cancel_load)
+        self.loadProgressSig.connect(self.update_load_status)
+        vb_files.addWidget(self.loadStatusLabel)
+        vb_files.addWidget(self.cancelLoadBtn)
+        self.cancel_token = xrftomo.CancelToken()
         # vb_files.setSpacing(0)
         # vb_files.setContentsMargins(0, 0, 0, 0)
         self.scroll_widget = QWidget()  # Widget that contains the collection of Vertical Box
@@ -492,9 +504,10 @@ class FileTableWidget(QWidget):
         return
 
     def check_auto_tags(self):
+        #channel names found in the metadata index prove the tag exists without reading it again
         data_tag_exists = self.auto_data_tag in self.img
-        element_tag_exists = self.auto_element_tag in self.img
-        scaler_tag_exists = self.auto_scaler_tag in self.img
+        element_tag_exists = xrftomo.indexed_channel_names(self.img.filename, self.auto_element_tag) is not None or self.auto_element_tag in self.img
+        scaler_tag_exists = xrftomo.indexed_channel_names(self.img.filename, self.auto_scaler_tag) is not None or self.auto_scaler_tag in self.img
         theta_tag_exists = self.auto_theta_tag in self.img
 
         print(f"DEBUG: check_auto_tags - tag existence:")
@@ -1402,8 +1415,7 @@ class FileTableWidget(QWidget):
     def element_tag_changed(self):
         try:
             element_tag = self.element_menu.property("full_path") or self.element_menu.currentText()
-            element_list = list(self.img[element_tag])
-            elements = [x.decode("utf-8") for x in element_list]
+            elements = xrftomo.read_channel_names(self.img.filename, element_tag)
             self.elementTableModel.loadElementNames(elements)
             self.elementTableModel.setAllChecked(False)
             self.elementTableModel.setChecked(self.auto_selected_elements, (True))
@@ -1416,8 +1428,7 @@ class FileTableWidget(QWidget):
     def scaler_tag_changed(self):
         try:
             scaler_tag = self.scaler_menu.property("full_path") or self.scaler_menu.currentText()
-            scaler_list = list(self.img[scaler_tag])
-            scalers = [x.decode("utf-8") for x in scaler_list]
+            scalers = xrftomo.read_channel_names(self.img.filename, scaler_tag)
             self.scalerTableModel.loadElementNames(scalers)
             self.scalerTableModel.setAllChecked(False)
             self.scalerTableModel.setChecked(self.auto_selected_scalers, (True))
@@ -1497,7 +1508,8 @@ class FileTableWidget(QWidget):
                 adjacents = self.auto_adjacents
                 print(f"DEBUG: Using auto adjacents: {adjacents}")
 
-            thetas, files = xrftomo.load_thetas(path_files, theta_path, row=row, col=col)
+            workers = getattr(self.parent.params, 'load_workers', 4)
+            thetas, files = xrftomo.load_thetas(path_files, theta_path, row=row, col=col, workers=workers)
             if len(thetas) == 0:
                 print("no thetas found")
                 just_filenames = [os.path.basename(file) for file in path_files]
@@ -1624,8 +1636,10 @@ class FileTableWidget(QWidget):
         self.parent.reconstructionWidget.recon = []
         self.parent.sinogramWidget.sld.setValue(0)
 
-    def onSaveDataInMemory(self):
+    def onSaveDataInMemory(self, window=None, fnames=None, stride=1, binning=1):
         #TODO: update way in whcih parameters are passsed and how file/element/scaler tables are read
+        #window: (y0, y1, x0, x1) region of the full frame to read, fnames: subset of the checked files
+        #binning: block size of a preview load, 1 for full resolution
         files = [i.filename for i in self.fileTableModel.arrayData]
         if len(files) == 0:
             print('Directory probably not mounted')
@@ -1645,6 +1659,14 @@ class FileTableWidget(QWidget):
         files = [files[j] for j in k if files_bool[j]==True]
         path_files = [self.fileTableModel.directory + '/' + s for s in files]
         thetas = np.asarray([thetas[j] for j in k if files_bool[j]==True])
+        projections = None
+        if fnames is not None or stride > 1:
+            #path_files keeps every checked file: the reader picks the subset itself, so the
+            #frame, and a window taken from it, stay the same as for the whole series
+            projections = None if fnames is None else [files.index(f) for f in fnames if f in files]
+            selection = xrftomo.select_projections(len(files), projections, stride)
+            files = [files[j] for j in selection]
+            thetas = thetas[selection]
         elements = [elements[j] for j in l if elements_bool[j]==True]
         scalers = [scalers[j] for j in s if scalers_bool[j]==True]
         # elements.append("us_ic")
@@ -1711,8 +1733,11 @@ class FileTableWidget(QWidget):
 
         self.parent.clear_all()
         try:
-            #TODO: add file upload status: n / total files uploaded
-            data = xrftomo.read_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_tag)
+            if getattr(self.parent.params, 'lazy_load', False) and window is None and binning == 1:
+                selection = xrftomo.select_projections(len(path_files), projections, stride)
+                data = xrftomo.LazyXRFStack([path_files[j] for j in selection], elements, data_tag, element_tag, scalers, scaler_tag)
+            else:
+                data = self.load_files(path_files, elements, data_tag, element_tag, scalers, scaler_tag, window, binning, projections, stride)
         except:
             print("invalid image/data/element tag combination. Load failed")
             return [], [], [], []
@@ -1723,6 +1748,50 @@ class FileTableWidget(QWidget):
         elements = elements+scalers
         return data, elements, thetas, files
 
+    def load_files(self, path_files, elements, data_tag, element_tag, scalers, scaler_tag, window=None, binning=1, projections=None, stride=1):
+        '''
+        Loads the selected files on a background thread while keeping the GUI responsive.
+        Progress is reported through loadProgressSig and the load can be stopped with the
+        cancel button, in which case None is returned. projections and stride select the
+        files read out of path_files, see xrftomo.select_projections.
+        '''
+        result = {}
+        workers = getattr(self.parent.params, 'load_workers', 4)
+
+        def run():
+            try:
+                result["data"] = xrftomo.load_mic_xrf(path_files, elements, data_tag, element_tag, scalers, scaler_tag,
+                                                      workers=workers, progress=self.loadProgressSig.emit,
+                                                      cancel=self.cancel_token, window=window, projections=projections,
+                                                      stride=stride, binning=binning)
+            except Exception as error:
+                result["error"] = error
+
+        self.cancel_token.reset()
+        self.saveDataBtn.setEnabled(False)
+        self.cancelLoadBtn.setEnabled(True)
+        self.update_load_status(0, len(xrftomo.select_projections(len(path_files), projections, stride)))
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                QApplication.processEvents()
+                worker.join(0.05)
+        finally:
+            self.saveDataBtn.setEnabled(True)
+            self.cancelLoadBtn.setEnabled(False)
+        if "error" in result:
+            raise result["error"]
+        if self.cancel_token.cancelled:
+            self.loadStatusLabel.setText("loading cancelled")
+        return result.get("data")
+
+    def update_load_status(self, loaded, total):
+        self.loadStatusLabel.setText("{} / {} files loaded".format(loaded, total))
+
+    def cancel_load(self):
+        self.cancel_token.cancel()
+
     def create_h5_tree_widget(self, h5_obj, title="H5 Structure"):
         """
         Create a tree widget to display H5 file structure
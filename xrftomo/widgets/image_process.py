@@ -57,7 +57,7 @@ class ImageProcessWidget(QtWidgets.QWidget):
 
     sliderChangedSig = pyqtSignal(int, name='sliderChangedSig')
     elementChangedSig = pyqtSignal(int, int, name='elementCahngedSig')
-    dataChangedSig = pyqtSignal(np.ndarray, name='dataChangedSig')
+    dataChangedSig = pyqtSignal(object, name='dataChangedSig')
     thetaChangedSig = pyqtSignal(int, np.ndarray, name='thetaChangedSig')
     fnamesChanged = pyqtSignal(list,int, name="fnamesChanged")
     alignmentChangedSig = pyqtSignal(np.ndarray, np.ndarray, name="alignmentChangedSig")
@@ -486,7 +486,7 @@ class ImageProcessWidget(QtWidgets.QWidget):
                     x_shifts[i] = x_shifts[i] - x_dimension
                 if y_shifts[i] > y_dimension:
                     y_shifts[i] = y_shifts[i] - y_dimension
-                data = self.actions.shiftProjection(data, x_shifts[i], y_shifts[i], i)
+            data = xrftomo.shift_projections(data, x_shifts, y_shifts)
 
         self.padSig.emit(padding_x,padding_y)
         self.dataChangedSig.emit(data)
@@ -50,6 +50,7 @@ import os
 import sys
 import h5py
 import shutil
+import threading
 
 from matplotlib import pyplot as plt
 # from matplotlib.pyplot import figure, draw, pause, close
@@ -66,6 +67,9 @@ class LaminographyWidget(QtWidgets.QWidget):
     sldRangeChanged = pyqtSignal(int, np.ndarray, np.ndarray, name='sldRangeChanged')
     reconChangedSig = pyqtSignal(np.ndarray, name='reconChangedSig')
     reconArrChangedSig = pyqtSignal(dict, name='reconArrChangedSig')
+    dataChangedSig = pyqtSignal(object, name='dataChangedSig')
+    alignmentChangedSig = pyqtSignal(np.ndarray, np.ndarray, name="alignmentChangedSig")
+    matchingProgressSig = pyqtSignal(int, int, float, name="matchingProgressSig")
 
     def __init__(self, parent):
         super(LaminographyWidget, self).__init__()
@@ -110,6 +114,7 @@ class LaminographyWidget(QtWidgets.QWidget):
         self.ViewControl.recon_stats.clicked.connect(self.get_recon_stats)
         self.sld.valueChanged.connect(self.update_recon_image)
         self.ViewControl.reconstruct.clicked.connect(self.reconstruct_params)
+        self.matchingProgressSig.connect(self.matching_progress)
         self.ViewControl.reset.clicked.connect(self.reset_recon_volume)
         self.ViewControl.apply.clicked.connect(self.apply_clicked)
         self.ViewControl.sld_rot_vol.sliderReleased.connect(self.update_vol_image)
@@ -352,7 +357,7 @@ class LaminographyWidget(QtWidgets.QWidget):
         self.ViewControl.elem.clear()
         for j in self.elements:
             self.ViewControl.elem.addItem(j)
-            self.recon_dict[j] = np.zeros((self.y_range,self.data.shape[3],self.data.shape[3]))
+            self.recon_dict[j] = np.zeros((self.y_range,self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype())
 
         self.ViewControl.cpu_opts.__dict__["fbp-filter"].setCurrentIndex(1)
         self.set_option_checked("fbp-filter",self.ViewControl.cpu_opts)
@@ -388,12 +393,12 @@ class LaminographyWidget(QtWidgets.QWidget):
         self.sld.setValue(0)
         self.sld.setMaximum(ySize)
         for key in self.recon_dict.keys():
-            self.recon_dict[key] = np.zeros((ySize,self.data.shape[3],self.data.shape[3]))
+            self.recon_dict[key] = np.zeros((ySize,self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype())
         return
 
     def xSizeChanged(self, xSize):
         for key in self.recon_dict.keys():
-            self.recon_dict[key] = np.zeros((self.data.shape[2],xSize,xSize))
+            self.recon_dict[key] = np.zeros((self.data.shape[2],xSize,xSize), dtype=xrftomo.get_working_dtype())
         return
 
     def update_y_range(self):
@@ -463,6 +468,39 @@ class LaminographyWidget(QtWidgets.QWidget):
     def updateElementSlot(self, element):
         self.ViewControl.elem.setCurrentIndex(element)
 
+    def run_projection_matching(self, element_idx, thetas, lamino_angle, iterations, stages, rows, momentum):
+        '''
+        runs projection matching on a background thread while keeping the GUI responsive.
+        Progress is reported through matchingProgressSig. Returns (x_shifts, y_shifts, aligned data),
+        or None when the alignment failed.
+        '''
+        result = {}
+
+        def run():
+            try:
+                result["aligned"] = self.actions.projection_matching(self.data.copy(), element_idx, thetas, lamino_angle, iterations,
+                                                                     stages, rows, momentum, progress=self.matchingProgressSig.emit)
+            except Exception as error:
+                result["error"] = error
+
+        self.ViewControl.reconstruct.setEnabled(False)
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                QApplication.processEvents()
+                worker.join(0.05)
+        finally:
+            self.ViewControl.reconstruct.setEnabled(True)
+        QApplication.processEvents()
+        if "error" in result:
+            print(result["error"])
+            return None
+        return result["aligned"]
+
+    def matching_progress(self, binning, iteration, update):
+        print("projection matching {}x: iteration {}, max update {:.3f} px".format(binning, iteration+1, update))
+
     def reconstruct_params(self):
         #TODO: create temporary directory to save structured h5 data in if one is not specified
         print("DEBUG: entering LaminographyWidget.reconstruct_params")
@@ -494,13 +532,38 @@ class LaminographyWidget(QtWidgets.QWidget):
             elements = [i for i in range(num_elements)]
 
 
+        aligned = None
         for element_idx in elements:
             element = self.parent.elements[element_idx]
             self.ViewControl.elem.setCurrentIndex(element_idx)  # required to properly update recon_dict
-            empty_recon = np.zeros((data.shape[2], data.shape[3], data.shape[3]), dtype=np.float32)  # empty array of size [y, x,x]
+            empty_recon = np.zeros((data.shape[2], data.shape[3], data.shape[3]), dtype=xrftomo.get_working_dtype())  # empty array of size [y, x,x]
             recon_dict[element] = empty_recon
             print("running reconstruction for:", element)
-            if "cpu" in method_name.lower():
+            if "matching" in method_name.lower():
+                try:
+                    lamino_angle = float(self.ViewControl.cpu_opts.__dict__["lamino-angle"].text())
+                    iterations = int(self.ViewControl.cpu_opts.__dict__["pm-iterations"].text())
+                    stages = [int(stage) for stage in self.ViewControl.cpu_opts.__dict__["pm-stages"].text().split(",")]
+                    row_range = self.ViewControl.cpu_opts.__dict__["pm-rows"].text().strip()
+                    rows = slice(*[int(row) for row in row_range.split(":")]) if row_range else None
+                except ValueError:
+                    print("invalid projection matching parameters")
+                    return
+                momentum = self.ViewControl.cpu_opts.__dict__["pm-momentum"].isChecked()
+                #align once on the first element, "reconstruct all" then reconstructs the aligned data
+                if aligned is None:
+                    result = self.run_projection_matching(element_idx, thetas, lamino_angle, iterations, stages, rows, momentum)
+                    if result is None:
+                        return
+                    x_shifts, y_shifts, aligned = result
+                    self.dataChangedSig.emit(aligned)
+                    #stored y shifts follow SinogramActions.shift_all, positive moves the image up
+                    self.alignmentChangedSig.emit(self.x_shifts + x_shifts, self.y_shifts - y_shifts)
+                data = aligned.copy()
+                recon = self.actions.reconstruct_cpu(data, element_idx, element, 90 - lamino_angle, None, 0, thetas, parent_dir=parent_dir)
+                recon_dict[element] = np.array(recon)
+                self.recon = np.array(recon)
+            elif "cpu" in method_name.lower():
                 lami_angle = 90 - eval(self.ViewControl.cpu_opts.__dict__["lamino-angle"].text())
                 center_axis = eval(self.ViewControl.cpu_opts.__dict__["rotation-axis"].text())
                 # Note: method parameter might be used by reconstruct_cpu for algo selection
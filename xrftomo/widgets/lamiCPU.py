@@ -66,6 +66,10 @@ class LaminographyCPU(QWidget):
         widget_dict["fbp-filter"] = [["label","dropdown"], "filter choice", ["ramp", "shepp"], "shepp"]
         widget_dict["rotation-axis"] = [["label","linedit"], "rotation axis given by x-position", None, ""]
         widget_dict["lamino-angle"] = [["label","linedit"], "laminography tilt angle", None, "18.25"]
+        widget_dict["pm-iterations"] = [["label","linedit"], "projection matching: maximum iterations per stage", None, "50"]
+        widget_dict["pm-stages"] = [["label","linedit"], "projection matching: downsampling stages, coarsest first", None, "4,2,1"]
+        widget_dict["pm-rows"] = [["label","linedit"], "projection matching: detector rows start:end used for tomography, empty for all", None, ""]
+        widget_dict["pm-momentum"] = [["label","checkbox"], "momentum", None, True]
 
         self.lami_scroll = QScrollArea()             # Scroll Area which contains the widgets, set as the centralWidget
         self.lami_scroll.setWidgetResizable(True)
@@ -45,7 +45,7 @@ import xrftomo
 import os
 import matplotlib.pyplot as plt
 from scipy.fftpack import fftshift, ifftshift, fft, ifft, fft2, ifft2
-from scipy import interpolate, ndimage
+from scipy import ndimage
 import numpy as np
 import h5py
 import subprocess
@@ -331,122 +331,14 @@ class LaminographyActions(QtWidgets.QWidget):
 		return masked
 
 	def shiftProjection(self, data, x, y, index):
-		X = int(x//1)
-		Y = int(y//1)
-		x = x - X
-		y = y - Y 
-
-		if x > 0: 
-			x_dir = 1
-		elif x < 0:
-			x_dir = -1
-		else:
-			x_dir = 0
-
-		if y > 0: 
-			y_dir = 1
-		elif x < 0:
-			y_dir = -1
-		else:
-			y_dir = 0
-
-		data[:,index] = np.roll(data[:,index], Y, axis=1)  #negative because image coordinates are flipped
-		data[:,index] = np.roll(data[:,index], X, axis=2)
-
-		if x_dir == 0 and y_dir == 0:
-			return data
-
-		else:
-			data_a = data*x
-			data_b = data*(1-x)
-			data_b = self.shiftProjection(data_b,x_dir,0, index)
-			data_c = data_a+data_b
-
-			data_a = data_c*y
-			data_b = data_c*(1-y)
-			data_b = self.shiftProjection(data_b,0,y_dir, index)
-			data = data_a+data_b
-
-			return data
+		#bilinear, the shift-mode option only applies to alignment shifts applied by SinogramActions
+		return xrftomo.shift_projections(data, x, y, index)
 
 	def lam(self, stack, thetas, tiltangle, center_axis, interpolation="nearest_neighbor"):
 		# stack[theta,y,x]
 		stack = self.filter(stack)
-		theta = np.deg2rad(thetas)
-		tiltangle = np.deg2rad(tiltangle)
-
-		n = stack.shape[2]
-		nz = stack.shape[1]
-		M = stack.shape[0]
-		reconstructed = np.zeros((nz, n, n))
-
-		for itheta in range(M):
-			data = stack[itheta]
-
-			[Z, X, Y] = np.mgrid[0:nz, 0:n, 0:n]
-			zpr = Z-nz/2
-			ypr = Y-n/2
-			xpr = X-n/2
-
-			# Rotation Ry x Rz - backprojection (works for the tube tiltangle = 0)
-			# u = xpr*np.cos(theta[itheta])*np.cos(tiltangle) + ypr*np.sin(theta[itheta])*np.cos(tiltangle) - zpr*np.sin(tiltangle) + n/2
-			# v = xpr*np.cos(theta[itheta])*np.sin(tiltangle) + ypr*np.sin(theta[itheta])*np.sin(tiltangle) + zpr*np.cos(tiltangle) + nz/2
-
-			# Backprojection Rotation Rz(-theta) x Ry(-fi)
-			# u = xpr*np.cos(theta[itheta])*np.cos(tiltangle) + ypr*np.sin(theta[itheta]) - zpr*np.cos(theta[itheta])*np.sin(tiltangle) + n/2
-			# v = xpr*np.sin(tiltangle) + zpr*np.cos(tiltangle) + nz/2
-
-			# # Geometry from the paper
-			# u = xpr * np.cos(theta[itheta]) + ypr * np.sin(theta[itheta]) + n/2
-			# v = xpr * np.cos(tiltangle) * np.sin(theta[itheta]) - ypr * np.cos(tiltangle) * np.cos(
-			#     theta[itheta]) + zpr * np.sin(tiltangle) + nz/2
-
-			# victor Geometry
-			# u = xpr * np.cos(theta[itheta]) + ypr * np.sin(theta[itheta]) + n/2
-			# v = xpr * np.cos(tiltangle) * np.sin(theta[itheta]) + ypr * np.cos(tiltangle) * np.cos(
-			#     theta[itheta]) + zpr * np.sin(tiltangle) + nz/2
-
-			#cos(o)  -sin(o)
-			#sin(a)sin(o) cos(a) sin(a)cos(o)
-			# u = xpr * np.cos(theta[itheta]) - zpr * np.sin(theta[itheta]) + n/2
-			# v = xpr * np.sin(tiltangle) * np.sin(theta[itheta]) - ypr * np.cos(tiltangle)  \
-			#     + zpr * np.sin(tiltangle)*np.cos(theta[itheta]) + nz/2
-
-			# sin(a)sin(o) cos(a) sin(a)cos(o)
-			#cos(a)sin(o) -sin(a) cos(a)cos(o)
-			# u = xpr * np.sin(tiltangle) * np.sin(theta[itheta]) - ypr * np.cos(tiltangle)  \
-			#     + zpr * np.sin(tiltangle)*np.cos(theta[itheta]) + n/2
-			# v = xpr * np.cos(tiltangle) * np.sin(theta[itheta]) - ypr * np.sin(tiltangle) \
-			#     + zpr * np.cos(tiltangle) * np.cos(theta[itheta]) + nz/2
-
-			#cos(o)  -sin(o)
-			#cos(a)sin(o) -sin(a) cos(a)cos(o)
-			# u = xpr * np.cos(theta[itheta]) - zpr * np.sin(theta[itheta]) + n/2
-			# v = xpr * np.cos(tiltangle) * np.sin(theta[itheta]) - ypr * np.sin(tiltangle) \
-			#     + zpr * np.cos(tiltangle) * np.cos(theta[itheta]) + nz/2
-
-			#THISSSSS
-			u = xpr * np.cos(theta[itheta]) + ypr * np.sin(theta[itheta]) + n/2
-			v = -xpr * np.cos(tiltangle) * np.sin(theta[itheta]) + ypr * np.cos(tiltangle) * np.cos(
-				theta[itheta]) + zpr * np.sin(tiltangle) + nz/2
-
-			if interpolation == 'nearest_neighbor':
-				# Nearest neighbor
-				reconstructed += data[
-					((((v > 0) & (v < nz)) * v)).astype(int),
-					((((u > 0) & (u < n)) * u)).astype(int)]
-			elif interpolation == 'cubic':
-				# Cubic interpolation
-				[gY, gX] = np.mgrid[0:nz, 0:n]
-				reconstructed += interpolate.griddata((gY.ravel(), gX.ravel()), data.ravel(), ((v, u)), method='cubic', fill_value=0.0)
-
-			elif interpolation == "linear":
-				# linear interpolation
-				[gY, gX] = np.mgrid[0:nz, 0:n]
-				reconstructed += interpolate.griddata((gY.ravel(), gX.ravel()), data.ravel(), ((v, u)), method='linear', fill_value=0.0)
-			else:
-				pass
-		return reconstructed
+		# u = x*cos(theta) + y*sin(theta), v = -x*cos(tilt)*sin(theta) + y*cos(tilt)*cos(theta) + z*sin(tilt)
+		return xrftomo.lamino_backproject(stack, thetas, tiltangle, interpolation, geometry="lamino")
 
 	def filter(self, data, bpfilter=3):
 		center = data.shape[1] / 2
@@ -479,6 +371,37 @@ class LaminographyActions(QtWidgets.QWidget):
 				data[:] = tmp[:, :, ne // 2 - n // 2:ne // 2 + n // 2 + 1]
 		return data
 
+	def projection_matching(self, data, element_idx, thetas, lamino_angle, iterations=50, stages=(4, 2, 1), rows=None, momentum=True, progress=None):
+		'''
+		CPU projection-matching alignment of one element, the shifts are applied to every element.
+		Variables
+		-----------
+		data: ndarray
+			4D xrf dataset ndarray [elements, theta, y,x]
+		element_idx: int
+			element the shifts are solved on
+		thetas: ndarray
+			projection angles in degrees
+		lamino_angle: float
+			laminography angle in degrees, 0 for tomography
+		iterations: int
+			maximum iterations per downsampling stage
+		stages: list
+			downsampling factor of every stage, coarsest first
+		rows: slice
+			detector rows used for tomography, None for all
+		momentum: bool
+			accelerate updates that keep pointing the same way
+		progress: callable
+			called with (binning, iteration, max update in pixels) after every iteration
+		'''
+		x_shifts, y_shifts, report = xrftomo.projection_matching_align(data[element_idx], thetas, lamino_angle, iterations,
+																				stages, rows, momentum=momentum, progress=progress)
+		x_shifts = np.round(x_shifts, 2)
+		y_shifts = np.round(y_shifts, 2)
+		data = xrftomo.shift_projections(data, x_shifts, y_shifts, mode="fourier")
+		return x_shifts, y_shifts, data
+
 	def run_pyxalign(self, lamino_angle, results_folder, center_of_rotation, xrf_array_dict, scan_numbers, thetas, primary_channel, file_paths):
 
 		if not PYXALIGN_AVAILABLE:
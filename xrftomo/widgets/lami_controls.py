@@ -60,6 +60,7 @@ class LaminographyControlsWidget(QWidget):
         self.method.setFixedWidth(self.button1size)
         self.method.clear()
         self.method.addItem("lamni-fbp(cpu)")
+        self.method.addItem("projection-matching(cpu)")
         self.method.setCurrentIndex(0)
         self.recon_all = QCheckBox(self)
         self.recon_all.setText("reconstruct all")
@@ -48,6 +48,7 @@ import scipy.ndimage
 import os
 import shutil
 import sys
+import threading
 from matplotlib import pyplot as plt
 # from matplotlib.pyplot import figure, draw, pause, close
 import time
@@ -64,6 +65,7 @@ class ReconstructionWidget(QtWidgets.QWidget):
     sldRangeChanged = pyqtSignal(int, np.ndarray, np.ndarray, name='sldRangeChanged')
     reconChangedSig = pyqtSignal(np.ndarray, name='reconChangedSig')
     reconArrChangedSig = pyqtSignal(dict, name='reconArrChangedSig')
+    reconElementSig = pyqtSignal(str, object, int, int, name='reconElementSig')
 
     def __init__(self, parent):
         super(ReconstructionWidget, self).__init__()
@@ -101,18 +103,22 @@ class ReconstructionWidget(QtWidgets.QWidget):
         self.ViewControl.combo1.currentIndexChanged.connect(self.elementChanged)
         self.ViewControl.combo1.currentIndexChanged.connect(self.update_recon_set)
         self.ViewControl.reconstruct.clicked.connect(self.reconstruct_params)
+        self.ViewControl.cancel_recon.clicked.connect(self.cancel_reconstruction)
         self.ViewControl.remove_hotspot.clicked.connect(self.rm_hotspot_params)
         # self.ViewControl.remove_artifact.clicked.connect(self.ViewControl.artifact_parameters.show)
 
         # self.ViewControl.run_ar.clicked.connect(self.rm_artifact_params)
         self.ViewControl.recon_stats.clicked.connect(self.get_recon_stats)
         self.sld.valueChanged.connect(self.update_recon_image)
+        self.reconElementSig.connect(self.element_reconstructed)
 
         self.x_shifts = None
         self.y_shifts = None
         self.centers = None
         self.recon = None
         self.recon_dict = {}
+        self.recon_records = {}
+        self.cancel_token = xrftomo.CancelToken()
         self.tmp_recon = None
         self.data = None
         self.data_original = None
@@ -172,7 +178,7 @@ class ReconstructionWidget(QtWidgets.QWidget):
             self.ViewControl.method.addItem(methodname[k])
         for l in self.elements:
             # self.ViewControl.recon_set.addItem(l)
-            self.recon_dict[l] = np.zeros((self.y_range,self.data.shape[3],self.data.shape[3]))
+            self.recon_dict[l] = np.zeros((self.y_range,self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype())
 
         self.elementChanged()
         #TODO: recon_array will need to update with any changes to data dimensions as well as re-initialization
@@ -212,12 +218,14 @@ class ReconstructionWidget(QtWidgets.QWidget):
         self.sld.setValue(0)
         self.sld.setMaximum(ySize)
         for key in self.recon_dict.keys():
-            self.recon_dict[key] = np.zeros((ySize,self.data.shape[3],self.data.shape[3]))
+            self.recon_dict[key] = np.zeros((ySize,self.data.shape[3],self.data.shape[3]), dtype=xrftomo.get_working_dtype())
+        self.recon_records = {}
         return
 
     def xSizeChanged(self, xSize):
         for key in self.recon_dict.keys():
-            self.recon_dict[key] = np.zeros((self.data.shape[2],xSize,xSize))
+            self.recon_dict[key] = np.zeros((self.data.shape[2],xSize,xSize), dtype=xrftomo.get_working_dtype())
+        self.recon_records = {}
         return
 
     def update_y_range(self):
@@ -322,6 +330,7 @@ class ReconstructionWidget(QtWidgets.QWidget):
         for key in elements:
             self.recon_dict[key] = np.zeros_like(self.recon)
         self.recon = np.zeros_like(self.recon)
+        self.recon_records = {}
 
     def reconstruct_params(self):
         element = self.ViewControl.combo1.currentIndex()
@@ -333,12 +342,12 @@ class ReconstructionWidget(QtWidgets.QWidget):
         thetas = self.thetas
         bottom_row = int(self.data.shape[2] - eval(self.ViewControl.top_row.text()))
         top_row = int(self.data.shape[2] - eval(self.ViewControl.bottom_row.text()))
-
-        data = self.data[:,:,top_row:bottom_row,:]
+        #slice the selected elements only, a lazy stack then decodes just their planes
+        window = slice(top_row, bottom_row)
         show_stats = self.ViewControl.recon_stats.isChecked()
-        num_xsections = data.shape[2]
-        recons = np.zeros((data.shape[2], data.shape[3], data.shape[3]))  # empty array of size [y, x,x]
-        xsection = np.zeros((1, data.shape[1], 1, data.shape[3]))  # empty array size [1(element), frames, 1(y), x]
+        num_xsections = len(range(self.data.shape[2])[window])
+        sink_kind = getattr(self.parent.params, 'recon_sink', 'tiff')
+        keep = not getattr(self.parent.params, 'recon_discard_volume', False)
         recon_dict = self.recon_dict.copy()
         if self.ViewControl.recon_save.isChecked():
             try: #promps for directory and subdir folder
@@ -362,43 +371,51 @@ class ReconstructionWidget(QtWidgets.QWidget):
         else:
             elements = [self.ViewControl.combo1.currentIndex()]
 
+        if len(elements) > 1:
+            savedir = save_path if self.ViewControl.recon_save.isChecked() else None
+            self.reconstruct_elements(self.data[elements, :, window, :], elements, center, method, beta, delta, iters, thetas, savedir)
+            return
+
         for element in elements:
             self.ViewControl.combo1.setCurrentIndex(element)    #required to properly update recon_dict
-            recons = np.zeros((data.shape[2], data.shape[3], data.shape[3]))  # empty array of size [y, x,x]
+            element_name = self.ViewControl.combo1.itemText(element)
             if self.ViewControl.recon_save.isChecked():
-                #get list of element names from list of elemnt indices
-                element_names = [self.ViewControl.combo1.itemText(idx) for idx in elements]
-                print("running reconstruction for:", element_names[element])
-                savepath = save_path + '/' + element_names[element]
-                savedir = savepath + '/' + element_names[element]
-
+                print("running reconstruction for:", element_name)
+                savepath = save_path + '/' + element_name
                 if os.path.exists(savepath):
                     shutil.rmtree(savepath)
-                os.makedirs(savepath)
 
             top_row = int(eval(self.ViewControl.top_row.text()))
-            print("working fine")
+            #rows are stored bottom-up, reconstruct them top-down
+            rows = self.data[element:element+1, :, window, :][:, :, ::-1, :]
+            if self.ViewControl.recon_save.isChecked():
+                #slices are written by the sink while the next block of rows is reconstructed
+                sink = xrftomo.open_recon_sink(sink_kind, save_path, top_row, keep, getattr(self.parent.params, 'export_workers', 4))
+                try:
+                    recons = self.actions.reconstruct_to_sink(rows, 0, center, method, beta, delta, iters, thetas, sink, element_name,
+                                                              progress=lambda done, total: self.recon_progress(element_name, done, total, "row"))
+                finally:
+                    sink.close()
+                if recons is None:
+                    print("{} written to {}, not kept in memory".format(element_name, save_path))
+                    continue
+            else:
+                guess, warm_iters = None, iters
+                if self.ViewControl.recon_warm.isChecked():
+                    #reuse the last reconstruction of this element when the rows changed only a little
+                    guess, warm_iters = xrftomo.warm_start(self.recon_records.get(element_name), rows[0], thetas, center, method, iters, top_row)
+                    if guess is not None:
+                        print("warm start for {}: {} of {} iterations".format(element_name, warm_iters, iters))
+                recons = self.actions.reconstruct_volume(rows, 0, center, method, beta, delta, warm_iters, thetas, guess=guess,
+                                                         progress=lambda done, total: self.recon_progress(element_name, done, total))
+            if self.ViewControl.recon_warm.isChecked():
+                self.recon_records[element_name] = xrftomo.recon_record(recons, rows[0], thetas, center, method, top_row)
+            else:
+                #a record only serves the next warm start, drop it rather than paying for the residual
+                self.recon_records.pop(element_name, None)
             for i in range(num_xsections):
-                if method ==8:
-                    break
-                j = num_xsections - i - 1
-                xsection[0, :, 0] = data[element, :, j]
-                cent = center
-
-                if method!= 1 and method !=8:  #all methods other than gridrec
-                    recon = self.actions.reconstruct(xsection, 0, cent, method, beta, delta, 1, thetas, None)
-                    for k in range(1, iters):
-                        recon = self.actions.reconstruct(xsection, 0, cent, method, beta, delta, 1, thetas, recon)
-                        print("reconstructing row {}/{} on iteration{}".format(i+1,num_xsections,k))
-
-                if method == 1:        #gridrec
-                    recon = self.actions.reconstruct(xsection, 0, cent, method, beta, delta, 1, thetas, None)
-                    print("reconstructing row{}/{}".format(i+1, num_xsections))
-
-                recons[i] = recon[0]
-                if self.ViewControl.recon_save.isChecked():
-                    self.writer.save_reconstruction(recon, savedir, top_row+i)
-                err, mse = self.actions.assessRecon(recon, xsection[0,:,0], thetas, show_plots=False)
+                recon = recons[i:i+1]
+                err, mse = self.actions.assessRecon(recon, rows[0, :, i], thetas, show_plots=False)
                 print("mse: ",mse)
 
             #TODO: Update recon_dict and recon display.
@@ -413,11 +430,80 @@ class ReconstructionWidget(QtWidgets.QWidget):
         self.reconArrChangedSig.emit(recon_dict)
         return
 
+    def recon_progress(self, element_name, done, total, unit="iteration"):
+        print("reconstructing {}: {} {}/{}".format(element_name, unit, done, total))
+        QApplication.processEvents()
+
+    def reconstruct_elements(self, data, elements, center, method, beta, delta, iters, thetas, savedir=None):
+        '''
+        reconstruct several elements in parallel. Each volume is placed in recon_dict as soon
+        as it finishes and, when savedir is given, written to savedir/element/ by its worker.
+        data holds the selected rows of these elements only, in the order of elements.
+        '''
+        element_names = [self.ViewControl.combo1.itemText(idx) for idx in elements]
+        top_row = int(eval(self.ViewControl.top_row.text()))
+        #rows are stored bottom-up, reconstruct them top-down
+        rows = np.asarray(data)[:, :, ::-1, :]
+        workers = getattr(self.parent.params, 'recon_workers', 0)
+        sink = getattr(self.parent.params, 'recon_sink', 'tiff')
+        keep = not getattr(self.parent.params, 'recon_discard_volume', False)
+        if savedir is not None:
+            for name in element_names:
+                if os.path.exists(os.path.join(savedir, name)):
+                    shutil.rmtree(os.path.join(savedir, name))
+        result = {}
+
+        def run():
+            try:
+                result["recon_dict"] = self.actions.reconstructAll(rows, element_names, center, method, beta, delta, iters, thetas,
+                                                                   top_row, savedir, callback=self.reconElementSig.emit, workers=workers,
+                                                                   sink=sink, keep=keep or savedir is None, cancel=self.cancel_token)
+            except Exception as error:
+                result["error"] = error
+
+        self.cancel_token.reset()
+        self.ViewControl.reconstruct.setEnabled(False)
+        self.ViewControl.cancel_recon.setEnabled(True)
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while worker.is_alive():
+                QApplication.processEvents()
+                worker.join(0.05)
+        finally:
+            self.ViewControl.reconstruct.setEnabled(True)
+            self.ViewControl.cancel_recon.setEnabled(False)
+        QApplication.processEvents()
+        if "error" in result:
+            print(result["error"])
+            return
+
+        self.recon_dict.update(result["recon_dict"])
+        #multi-element runs start cold and are not recorded, older records no longer match recon_dict
+        for name in element_names:
+            self.recon_records.pop(name, None)
+        elem = self.ViewControl.combo1.currentText()
+        if elem in self.recon_dict:
+            self.recon = self.recon_dict[elem]
+        self.update_recon_image()
+        self.reconChangedSig.emit(self.recon)
+        self.reconArrChangedSig.emit(self.recon_dict.copy())
+        return
+
+    def cancel_reconstruction(self):
+        self.cancel_token.cancel()
+
+    def element_reconstructed(self, name, recon, done, total):
+        print("{}/{} elements reconstructed: {}".format(done, total, name))
+        if recon is None:
+            return
+        self.recon_dict[name] = recon
+        if name == self.ViewControl.combo1.currentText():
+            self.recon = recon
+            self.update_recon_image()
+
     def reconstruct_all_params(self):
-        #figure out how to get a list of all selected elements
         num_elements = self.ViewControl.combo1.count()
-        element_names = [self.ViewControl.combo1.itemText(i) for i in range(num_elements)]
-        # box_checked = self.ViewControl.cbox.isChecked()
         center = np.array(float(self.data.shape[3]), dtype=np.float32)/2
         method = self.ViewControl.method.currentIndex()
         beta = float(self.ViewControl.beta.text())
@@ -426,11 +512,11 @@ class ReconstructionWidget(QtWidgets.QWidget):
         thetas = self.thetas
         bottom_row = int(self.data.shape[2] - eval(self.ViewControl.top_row.text()))
         top_row = int(self.data.shape[2] - eval(self.ViewControl.bottom_row.text()))
-        data = self.data[:,:,top_row:bottom_row,:]
-
-        self.recon = self.actions.reconstructAll(data, element_names, center, method, beta, delta, iters, thetas,top_row)
-        self.ViewControl.mulBtn.setEnabled(True)
-        self.ViewControl.divBtn.setEnabled(True)
-        self.update_recon_image()
-        self.reconChangedSig.emit(self.recon)
-        return
\ No newline at end of file
+        elements = list(range(num_elements))
+        data = self.data[elements, :, top_row:bottom_row, :]
+        save_path = QFileDialog.getExistingDirectory(self, "Open Folder", QtCore.QDir.currentPath())
+        if save_path == "":
+            print("type the header name")
+            return
+        self.reconstruct_elements(data, elements, center, method, beta, delta, iters, thetas, save_path)
+        return
@@ -49,7 +49,7 @@ import os
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.fftpack import fftshift, ifftshift, fft, ifft, fft2, ifft2
-from scipy import interpolate, ndimage
+from scipy import ndimage
 import sys
 from skimage import exposure
 import matplotlib
@@ -109,74 +109,35 @@ class ReconstructionActions(QtWidgets.QWidget):
 			print("inf values replaced with 0.001")
 			recon[recon == np.inf] = 0.001
 
-		return recon
+		return xrftomo.as_working(recon)
+
+	def reconstruct_volume(self, data, element, center, method, beta, delta, iters, thetas, guess=None, progress=None):
+		'''
+		reconstruct every row of data[element] in one batched tomopy call.
+		progress(done, total) is called after each block of iterations.
+		'''
+		return xrftomo.recon_volume(data[element], thetas, center, method, beta, delta, iters, init_recon=guess, progress=progress)
+
+	def reconstruct_to_sink(self, data, element, center, method, beta, delta, iters, thetas, sink, name, progress=None):
+		'''
+		reconstruct data[element] in blocks of rows, pushing each block into sink as it finishes.
+		returns the volume, or None when the sink does not keep it.
+		'''
+		return xrftomo.recon_to_sink(data[element], thetas, center, method, sink, name, beta, delta, iters, progress=progress)
 
-	def reconstructAll(self, data, element_names, center, method, beta, delta, iters, thetas,start_idx):
+	def reconstructAll(self, data, element_names, center, method, beta, delta, iters, thetas, start_idx, savedir=None, callback=None, workers=0, sink="tiff", keep=True, cancel=None):
+		'''
+		reconstruct every element in data concurrently, optionally streaming slices to savedir.
+		rows in data are expected top-down, as handed to reconstruct_volume.
+		elements that have not started are dropped once cancel is cancelled.
+		'''
 		print("This will take a while")
-		save_path = QFileDialog.getExistingDirectory(self, "Open Folder", QtCore.QDir.currentPath())
-		num_elements = data.shape[0]
-		for i in range(num_elements):
-			print("running reconstruction for:", element_names[i])
-			savepath = save_path+'/'+element_names[i]
-			savedir = savepath+'/'+element_names[i]
-			os.makedirs(savepath)
-			num_xsections = data.shape[2]
-			recons = np.zeros((data.shape[2], data.shape[3], data.shape[3]))  # empty array of size [y, x,x]
-			xsection = np.zeros((1, data.shape[1], 1, data.shape[3]))  # empty array size [1(element), frames, 1(y), x]
-			for l in range(num_xsections):
-				j = num_xsections - l - 1
-				xsection[0, :, 0] = data[i, :, j]
-				guess = self.reconstruct(xsection, 0, center, method, beta, delta, 5, thetas, 0, False, None)
-				for k in range(5, iters):
-					guess = self.reconstruct(xsection, 0, center, method, beta, delta, 1, thetas, 0, False,guess)
-					recons[i] = guess[0]
-					print("reconstructing row {} on iteration{}".format(l, k))
-				self.writer.save_reconstruction(guess, savedir, start_idx + l)
-		return np.array(recons)
+		return xrftomo.recon_elements(data, element_names, thetas, center, method, beta, delta, iters,
+									workers=workers, savedir=savedir, start_idx=start_idx, callback=callback, cancel=cancel, sink=sink, keep=keep)
 
 	def lam(self, stack, thetas, tiltangle, interpolation="nearest_neighbor"):
-		# stack[theta,y,x]
-		theta = np.deg2rad(thetas)
-		tiltangle = np.deg2rad(tiltangle)
-
-		n = stack.shape[2]
-		nz = stack.shape[1]
-		M = stack.shape[0]
-		reconstructed = np.zeros((nz, n, n))
-
-		for itheta in range(M):
-			data = stack[itheta]
-
-			[Z, Y, X] = np.mgrid[0:nz, 0:n, 0:n]
-			zpr = Z - nz / 2
-			ypr = Y - n / 2
-			xpr = X - n / 2
-
-			# victor Geometry
-			u = xpr * np.cos(theta[itheta]) + ypr * np.sin(theta[itheta]) + n / 2
-			v = xpr * np.cos(tiltangle) * np.sin(theta[itheta]) + ypr * np.cos(tiltangle) * np.cos(
-				theta[itheta]) + zpr * np.sin(tiltangle) + nz / 2
-
-			if interpolation == 'nearest_neighbor':
-				# Nearest neighbor
-				reconstructed += data[
-					((((v > 0) & (v < nz)) * v)).astype(np.int),
-					((((u > 0) & (u < n)) * u)).astype(np.int)]
-			elif interpolation == 'cubic':
-				# Cubic interpolation
-				[gY, gX] = np.mgrid[0:nz, 0:n]
-				reconstructed += interpolate.griddata((gY.ravel(), gX.ravel()), data.ravel(), ((v, u)), method='cubic',
-													  fill_value=0.0)
-
-			elif interpolation == "linear":
-				# linear interpolation
-				[gY, gX] = np.mgrid[0:nz, 0:n]
-				reconstructed += interpolate.griddata((gY.ravel(), gX.ravel()), data.ravel(), ((v, u)), method='linear',
-													  fill_value=0.0)
-			else:
-				pass
-
-		return reconstructed
+		# stack[theta,y,x], victor geometry
+		return xrftomo.lamino_backproject(stack, thetas, tiltangle, interpolation, geometry="victor")
 
 	def assessRecon(self,recon, data, thetas,show_plots=False):
 		#TODO: make sure cros-section index does not exceed the data height
@@ -335,43 +296,8 @@ class ReconstructionActions(QtWidgets.QWidget):
 		return mask
 
 	def shiftProjection(self, data, x, y, index):
-		X = int(x//1)
-		Y = int(y//1)
-		x = x - X
-		y = y - Y 
-
-		if x > 0: 
-			x_dir = 1
-		elif x < 0:
-			x_dir = -1
-		else:
-			x_dir = 0
-
-		if y > 0: 
-			y_dir = 1
-		elif x < 0:
-			y_dir = -1
-		else:
-			y_dir = 0
-
-		data[:,index] = np.roll(data[:,index], Y, axis=1)  #negative because image coordinates are flipped
-		data[:,index] = np.roll(data[:,index], X, axis=2)
-
-		if x_dir == 0 and y_dir == 0:
-			return data
-
-		else:
-			data_a = data*x
-			data_b = data*(1-x)
-			data_b = self.shiftProjection(data_b,x_dir,0, index)
-			data_c = data_a+data_b
-
-			data_a = data_c*y
-			data_b = data_c*(1-y)
-			data_b = self.shiftProjection(data_b,0,y_dir, index)
-			data = data_a+data_b
-
-			return data
+		#bilinear, the shift-mode option only applies to alignment shifts applied by SinogramActions
+		return xrftomo.shift_projections(data, x, y, index)
 
 	def reconMultiply(self, recon):
 		'''
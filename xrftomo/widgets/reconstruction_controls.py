@@ -84,10 +84,12 @@ class ReconstructionControlsWidget(QtWidgets.QWidget):
         item_dict["iterations"] = ["label", "number of reconsturction iteration"]
         item_dict["recon_all"] = ["checkbox", "reconstruct all loaded elements"]
         item_dict["recon_save"] = ["checkbox", "reconstruct and save simultaneously"]
+        item_dict["recon_warm"] = ["checkbox", "warm start from the last reconstruction"]
         item_dict["beta"] = ["label", "mlem parameter"]
         item_dict["delta"] = ["label", "mlem parameter"]
         item_dict["lower_thresh"] = ["label", "cut-off display value"]
         item_dict["reconstruct"] = ["button", "run reconstruction"]
+        item_dict["cancel_recon"] = ["button", "stop a multi-element reconstruction once the running elements finish"]
         item_dict["recon_stats"] = ["button", "show reconstruction statisticks"]
         item_dict["remove_hotspot"] = ["button", "remove hotspots from reconstruction"]
         # item_dict["remove_artifact"] = ["button", "remove line artifacts"]
@@ -130,6 +132,8 @@ class ReconstructionControlsWidget(QtWidgets.QWidget):
         self.top_row.setText("0")
         self.bottom_row.setText("0")
         self.iterations.setText("10")
+        self.recon_warm.setChecked(True)
+        self.cancel_recon.setEnabled(False)
         self.beta.setText("1")
         self.delta.setText("0.01")
         self.lower_thresh.setText("0.0")
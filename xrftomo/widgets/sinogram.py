@@ -49,7 +49,7 @@ import sys
 
 class SinogramWidget(QtWidgets.QWidget):
     elementChangedSig = pyqtSignal(int, int, name='elementCahngedSig')
-    dataChangedSig = pyqtSignal(np.ndarray, name='dataChangedSig')
+    dataChangedSig = pyqtSignal(object, name='dataChangedSig')
     alignmentChangedSig = pyqtSignal(np.ndarray, np.ndarray, name="alignmentChangedSig")
     sinoChangedSig = pyqtSignal(np.ndarray, name="sinoChangedSig")
     restoreSig = pyqtSignal(name="restoreSig")
@@ -58,6 +58,7 @@ class SinogramWidget(QtWidgets.QWidget):
         super(SinogramWidget, self).__init__()
         self.parent = parent
         self.initUI()
+        self.actions.shift_mode = getattr(self.parent.params, 'shift_mode', 'spline')
         sys.stdout = xrftomo.gui.Stream(newText=self.parent.onUpdateText)
 
     def initUI(self):
@@ -482,6 +483,7 @@ class SinogramWidget(QtWidgets.QWidget):
             self.ViewControl.combo1.addItem(j)
 
         self.actions = xrftomo.SinogramActions()
+        self.actions.shift_mode = getattr(self.parent.params, 'shift_mode', 'spline')
         self.elementChanged()
         self.sld.setRange(1, self.data.shape[2])
         self.lcd.display(1)
@@ -733,17 +735,12 @@ class SinogramWidget(QtWidgets.QWidget):
             return
 
         try: #TODO: fails when loading new dataset, be sure to clear absolutely everything or raise exception
-            sinodata = self.data[element, :, :, :]
+            sinodata = self.data[element, :, self.sld.value()-1, :]
         except TypeError:
             return
-        self.sinogramData = np.zeros([sinodata.shape[0] * 10, sinodata.shape[2]], dtype=np.float32)
-        num_projections = self.data.shape[1]
-
-        try: #TODO: fails when cropping
-            for i in range(num_projections):
-                self.sinogramData[i * 10:(i + 1) * 10, :] = sinodata[i, self.sld.value()-1, :]
-        except IndexError:
+        except IndexError: #TODO: fails when cropping
             return
+        self.sinogramData = np.repeat(np.asarray(sinodata, dtype=np.float32), 10, axis=0)
         self.sinogramData[np.isinf(self.sinogramData)] = 0.001
         self.sinoView.projView.setImage(self.sinogramData, border='w')
         if len(self.thetas) > 0:
@@ -755,9 +752,9 @@ class SinogramWidget(QtWidgets.QWidget):
         element, row, data, thetas = self.get_params()
         if self.ViewControl.constrain_roi.isChecked():
             roi_data = self.get_roi_data(data)
-            dummy , x_shifts, y_shifts = self.actions.runCenterOfMass(element, roi_data)
+            dummy, x_shifts, y_shifts = self.actions.runCenterOfMass(element, roi_data, thetas, apply=False)
         else:
-            dummy, x_shifts, y_shifts = self.actions.runCenterOfMass(element, data)
+            dummy, x_shifts, y_shifts = self.actions.runCenterOfMass(element, data, thetas, apply=False)
 
         x_shifts = self.actions.discontinuity_check(data,x_shifts,40)
         x_shifts, y_shifts = self.actions.validate_alignment(data, x_shifts, y_shifts)
@@ -830,10 +827,10 @@ class SinogramWidget(QtWidgets.QWidget):
         element = self.ViewControl.combo1.currentIndex()
         if self.ViewControl.constrain_roi.isChecked():
             roi_data = self.get_roi_data(data)
-            dummy , x_shifts, y_shifts = self.actions.crossCorrelate2(element, roi_data)
+            dummy , x_shifts, y_shifts = self.actions.crossCorrelate2(element, roi_data, apply=False)
             # x_shifts, y_shifts = self.actions.crossCorrelate(element, roi_data)
         else:
-            dummy, x_shifts, y_shifts = self.actions.crossCorrelate2(element, data)
+            dummy, x_shifts, y_shifts = self.actions.crossCorrelate2(element, data, apply=False)
             # x_shifts, y_shifts = self.actions.crossCorrelate(element, data)
 
         x_shifts = self.actions.discontinuity_check(data,x_shifts,40)
@@ -984,16 +981,30 @@ class SinogramWidget(QtWidgets.QWidget):
             rin = None
             rout = None
 
+        pyramid = None
+        try:
+            tol = float(self.ViewControl.pyramid_tol_textbox.text())
+        except ValueError:
+            print("tolerance must be a number of pixels, e.g. 0.1")
+            return
+        if self.ViewControl.pyramid_checkbox.isChecked():
+            try:
+                pyramid = [int(level) for level in self.ViewControl.pyramid_textbox.text().split(",")]
+            except ValueError:
+                print("pyramid levels must be comma separated integers, e.g. 4,2,1")
+                return
+        warm = self.ViewControl.warm_checkbox.isChecked()
+
         #TODO: if sender from seq, run seq_align, else run iter_align
         if self.ViewControl.seq_btn.isChecked():
             x_shifts, y_shifts, data = self.actions.sequential_align(element, data, thetas, pad, blur_bool, rin, rout,
                                                                     center, algorithm, upsample_factor, save_bool,
-                                                                    debug_bool, iters)
+                                                                    debug_bool, iters, pyramid, tol)
 
         else:
             x_shifts, y_shifts, data = self.actions.iterative_align(element, data, thetas, pad, blur_bool, rin, rout,
                                                                     center, algorithm, upsample_factor, save_bool,
-                                                                    debug_bool, iters)
+                                                                    debug_bool, iters, pyramid, tol, warm)
         self.dataChangedSig.emit(data)
         self.alignmentChangedSig.emit(self.x_shifts+x_shifts, self.y_shifts+y_shifts)
         return
@@ -42,8 +42,7 @@ from PyQt5 import QtGui, QtCore, QtWidgets
 import scipy.fftpack as spf
 from scipy import ndimage, optimize, signal
 import tomopy
-from skimage import filters
-from skimage.measure import regionprops
+import xrftomo
 import numpy as np
 from matplotlib import pyplot as plt
 from skimage.color import rgb2gray
@@ -61,6 +60,8 @@ class SinogramActions(QtWidgets.QWidget):
         self.y_shifts = None
         self.original_data = None
         self.padding = None
+        self.shift_mode = "spline"
+        self.align_recon = None
 
     def run_fit_peaks(self,element,data):
         stack = data[element]
@@ -79,8 +80,7 @@ class SinogramActions(QtWidgets.QWidget):
             maxy_index = np.argmax(col)
             x_shifts[i] = x_midpt - maxx_index
             y_shifts[i] = y_midpt - maxy_index
-            data = self.shiftProjection(data,x_shifts[i],y_shifts[i],i)
-            # data[:,i] = scipy.ndimage.shift(data[element,i], x_shifts[i], output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
+        data = xrftomo.shift_projections(data, x_shifts, y_shifts)
         print("pause")
         return data, x_shifts, y_shifts
 
@@ -114,7 +114,7 @@ class SinogramActions(QtWidgets.QWidget):
         return data
 
 
-    def runCenterOfMass(self, element, data):
+    def runCenterOfMass(self, element, data, thetas=None, apply=True):
         '''
         Center of mass alignment
         Variables
@@ -124,121 +124,44 @@ class SinogramActions(QtWidgets.QWidget):
         data: ndarray
             4D xrf dataset ndarray [elements, theta, y,x]
         thetas: ndarray
-            sorted projection angle list
+            sorted projection angle list, fits the horizontal centers with a sinusoid when given
+        apply: bool
+            shift data by the found shifts, callers that shift_all the shifts themselves pass False
         '''
-        num_projections = data.shape[1]
-        view_center_x = data.shape[3]//2
-        view_center_y = data.shape[2]//2
-
-        w_x_shifts = []
-        w_y_shifts = []
-        for i in range(num_projections):
-            image = data[element, i]
-            threshold_value = filters.threshold_otsu(image)
-            labeled_foreground = (image > threshold_value).astype(int)
-            properties = regionprops(labeled_foreground, image)
-            #TODO: if input image is blank, WCoM will fail, create an exception case.
-            weighted_center_of_mass = properties[0].weighted_centroid
-            w_x_shifts.append(int(round(view_center_x - weighted_center_of_mass[1])))
-            w_y_shifts.append(int(round(view_center_y - weighted_center_of_mass[0])))
-            data = self.shiftProjection(data, w_x_shifts[i], 0, i)
-            data = self.shiftProjection(data, 0, w_y_shifts[i], i)
-
-        return data, np.asarray(w_x_shifts), -np.asarray(w_y_shifts)
-
-
-    def shift_all(self, data, x_shifts, y_shifts = None):
-        num_elements = data.shape[0]
-        num_projections = data.shape[1]
-        if y_shifts is None:
-            for i in range(num_elements):
-                for j in range(num_projections):
-                    data[i,j] = scipy.ndimage.shift(data[i,j], (np.zeros_like(x_shifts)[j],x_shifts[j]), output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
-        else:
-            for i in range(num_elements):
-                for j in range(num_projections):
-                    data[i,j] = scipy.ndimage.shift(data[i,j],(-y_shifts[j],x_shifts[j]), output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
-
-        return data
-    def shiftProjection(self, data, x, y, index):
-        X = int(x//1)
-        Y = int(y//1)
-        x = x - X
-        y = y - Y
-
-        if x > 0:
-            x_dir = 1
-        elif x < 0:
-            x_dir = -1
-        else:
-            x_dir = 0
-
-        if y > 0:
-            y_dir = 1
-        elif x < 0:
-            y_dir = -1
-        else:
-            y_dir = 0
-
-        data[:,index] = np.roll(data[:,index], Y, axis=1)  #negative because image coordinates are flipped
-        data[:,index] = np.roll(data[:,index], X, axis=2)
+        x_shifts, y_shifts = xrftomo.center_of_mass_shifts(data[element], thetas)
+        w_x_shifts = np.round(x_shifts).astype(int)
+        w_y_shifts = np.round(y_shifts).astype(int)
+        if apply:
+            data = xrftomo.shift_projections(data, w_x_shifts, w_y_shifts)
 
-        if x_dir == 0 and y_dir == 0:
-            return data
+        return data, w_x_shifts, -w_y_shifts
 
-        else:
-            data_a = data*x
-            data_b = data*(1-x)
-            data_b = self.shiftProjection(data_b,x_dir,0, index)
-            data_c = data_a+data_b
 
-            data_a = data_c*y
-            data_b = data_c*(1-y)
-            data_b = self.shiftProjection(data_b,0,y_dir, index)
-            data = data_a+data_b
+    def shift_all(self, data, x_shifts, y_shifts = None, mode = None):
+        '''
+        shifts every projection of every element by its x and y shift.
+        Variables
+        -----------
+        data: ndarray
+            4D xrf dataset ndarray [elements, theta, y,x]
+        x_shifts: ndarray
+            horizontal shift per projection
+        y_shifts: ndarray
+            vertical shift per projection, positive moves the image up
+        mode: str
+            'spline', 'fourier' or 'bilinear', defaults to self.shift_mode
+        '''
+        if mode is None:
+            mode = self.shift_mode
+        if y_shifts is None:
+            return xrftomo.shift_projections(data, x_shifts, None, mode=mode)
+        return xrftomo.shift_projections(data, x_shifts, -np.asarray(y_shifts), mode=mode)
 
-            return data
+    def shiftProjection(self, data, x, y, index):
+        return xrftomo.shift_projections(data, x, y, index, mode=self.shift_mode)
 
     def shiftStack(self, data, x, y):
-        X = int(x//1)
-        Y = int(y//1)
-        x = x - X
-        y = y - Y
-
-        if x > 0:
-            x_dir = 1
-        elif x < 0:
-            x_dir = -1
-        else:
-            x_dir = 0
-
-        if y > 0:
-            y_dir = 1
-        elif x < 0:
-            y_dir = -1
-        else:
-            y_dir = 0
-
-        for i in range(data.shape[1]):
-            data[:,i] = np.roll(data[:,i],Y,axis=1)
-        for i in range(data.shape[1]):
-            data[:,i] = np.roll(data[:,i],X, axis=2)
-
-        if x_dir == 0 and y_dir == 0:
-            return data
-
-        else:
-            data_a = data*x
-            data_b = data*(1-x)
-            data_b = self.shiftStack(data_b,x_dir,0)
-            data_c = data_a+data_b
-
-            data_a = data_c*y
-            data_b = data_c*(1-y)
-            data_b = self.shiftStack(data_b,0,y_dir)
-            data = data_a+data_b
-
-            return data
+        return xrftomo.shift_projections(data, x, y, mode=self.shift_mode)
 
     def shift(self, sinogramData, data, shift_number, col_number):
         '''
@@ -257,9 +180,7 @@ class SinogramActions(QtWidgets.QWidget):
         regShift = np.zeros(sinogramData.shape[0], dtype="int")
         sinogramData[col_number * 10:col_number * 10 + 10, :] = np.roll(sinogramData[col_number * 10:col_number * 10 + 10, :], shift_number, axis=1)
         regShift[col_number] += shift_number
-        for i in range(num_projections):
-            # data[:,i,:,:] = np.roll(data[:,i,:,:], regShift[i], axis=2)
-            data = self.shiftProjection(data, regShift[i],0,i)
+        data = xrftomo.shift_projections(data, regShift[:num_projections])
         return data, sinogramData
 
     def slope_adjust(self, sinogramData, data, shift, delta):
@@ -326,7 +247,7 @@ class SinogramActions(QtWidgets.QWidget):
         self.alignmentDone()
         return x_shifts, -y_shifts
 
-    def crossCorrelate2(self, element, data):
+    def crossCorrelate2(self, element, data, apply=True):
         '''
         cross correlate image registration aplies to all loaded elements.
         Variables
@@ -334,17 +255,16 @@ class SinogramActions(QtWidgets.QWidget):
         element: index of 0th  element in data.
         data: ndarray
             4D xrf dataset ndarray [elements, theta, y,x]
+        apply: bool
+            shift data in place, otherwise only the shifts are returned
         '''
-        num_projections = data.shape[1]
-        x_shifts = np.zeros(num_projections)
-        y_shifts = np.zeros(num_projections)
-        for i in range(1, num_projections):
-            shift, error, diffphase = phase_cross_correlation(data[element,i-1], data[element,i],upsample_factor=100)
-            x_shifts[i] += round(shift[1],2)
-            y_shifts[i] += round(shift[0],2)
-            # data[:,i] = scipy.ndimage.shift(data[:,i],(y_shifts[i],x_shifts[i]), output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
-            for j in range(data.shape[0]):
-                data[j,i] = scipy.ndimage.shift(data[j,i], (y_shifts[i], x_shifts[i]), output=None, order=3, mode='grid-wrap', cval=0.0, prefilter=True)
+        #each projection registered to its predecessor, all pairs in one batch and the
+        #chained shifts accumulated, equivalent to registering against the shifted predecessor
+        shifts = xrftomo.register_stack(data[element], "chained", upsample_factor=100)
+        x_shifts = np.round(shifts[:, 1], 2)
+        y_shifts = np.round(shifts[:, 0], 2)
+        if apply:
+            data = xrftomo.shift_projections(data, x_shifts, y_shifts, mode="spline")
 
         self.alignmentDone()
         return data, x_shifts, -y_shifts
@@ -699,10 +619,8 @@ class SinogramActions(QtWidgets.QWidget):
                 sino = data[element, :, i, :]
 
         sino = data[element,:,layer,:] #TODO: IndexError when contrained to ROI
-        x_shifts = np.zeros(data.shape[1])
-        for i in range(1,sino.shape[0]):
-            shift, error, diffphase = phase_cross_correlation(sino[0], sino[i], upsample_factor=100)
-            x_shifts[i] = shift[0]
+        #every row registered against the first one, reference spectrum computed once
+        x_shifts = xrftomo.register_stack(sino, "fixed", upsample_factor=100)[:, 0]
 
 
         return x_shifts
@@ -717,31 +635,12 @@ class SinogramActions(QtWidgets.QWidget):
         data: ndarray
             4D xrf dataset ndarray [elements, theta, y,x]
         '''
-        num_projections = data.shape[1]
-        x_shifts = np.zeros(num_projections)
-        y_shifts = np.zeros(num_projections)
-        for i in range(num_projections - 1):
-            # onlyfilenameIndex=self.fileNames[i+1].rfind("/")
-            a = data[element, i, :, :]
-            b = data[element, i + 1, :, :]
-
-            fa = spf.fft2(a)
-            fb = spf.fft2(b)
-
-            shape = a.shape
-            c = abs(spf.ifft2(fa * fb.conjugate() / (abs(fa) * abs(fb))))
-            t0, t1 = np.unravel_index(np.argmax(c), a.shape)
-            if t0 > shape[0] // 2:
-                t0 -= shape[0]
-            if t1 > shape[1] // 2:
-                t1 -= shape[1]
-
-            # data[:, i + 1] = np.roll(data[:, i + 1], t0, axis=1)
-            # data[:, i + 1] = np.roll(data[:, i + 1], t1, axis=2)
-            data = self.shiftProjection(data,t1,t0,i+1)
-
-            x_shifts[i + 1] += t1
-            y_shifts[i + 1] += -t0
+        #every spectrum is computed once, all pairs are correlated in batches and the
+        #chained integer shifts are applied in a single pass
+        t0, t1 = xrftomo.phase_correlate_stack(data[element])
+        data = self.shiftStack(data, t1, t0)
+        x_shifts = t1.astype(float)
+        y_shifts = -t0.astype(float)
         self.alignmentDone()
         return data, x_shifts, y_shifts
     # def align_y_top(self, element, data):
@@ -854,7 +753,7 @@ class SinogramActions(QtWidgets.QWidget):
                     break
         return bounds
 
-    def iterative_align(self, element, data, thetas, pad, blur_bool, rin, rout, center, algorithm, upsample_factor, save_bool, debug_bool, iters=5):
+    def iterative_align(self, element, data, thetas, pad, blur_bool, rin, rout, center, algorithm, upsample_factor, save_bool, debug_bool, iters=5, pyramid=None, tol=0.1, warm=False):
         '''
         iterative alignment method from TomoPy
         Variables
@@ -866,7 +765,16 @@ class SinogramActions(QtWidgets.QWidget):
         thetas: ndarray
             sorted projection angle list
         iters: int
-            number of iterations
+            number of iterations, per level in pyramid mode
+        pyramid: list
+            binning of every pyramid level, coarsest first, e.g. [4, 2, 1].
+            Shifts found on binned stacks start the next level.
+        tol: float
+            pyramid levels stop once no projection moves by more than tol pixels
+        warm: bool
+            start from the reconstruction kept by the last warm run on the same element,
+            angles and shape, and stop once no projection moves by more than tol pixels.
+            data already carries the shifts of that run, so they are the starting point.
         '''
         num_projections = data.shape[1]
         x_shifts = np.zeros(num_projections)
@@ -877,17 +785,29 @@ class SinogramActions(QtWidgets.QWidget):
 
         thetas = thetas*np.pi/180
 
-        prj, sx, sy, conv = tomopy.align_joint(prj, thetas, iters=iters, pad=pad,
-                            blur=blur_bool, rin=rin, rout=rout, center=center, algorithm=algorithm,
-                            upsample_factor=upsample_factor, save=save_bool, debug=debug_bool)
+        if pyramid or warm:
+            init_recon = None
+            key = (element, algorithm, prj.shape, tuple(pad), tuple(np.round(thetas, 4)))
+            if warm and self.align_recon is not None and self.align_recon[0] == key:
+                init_recon = self.align_recon[1]
+                print("warm start from the last joint alignment")
+            sx, sy, report, recon = xrftomo.pyramid_align(prj, thetas, pyramid or [1], iters, tol, center, pad, mode="joint",
+                                blur=blur_bool, rin=rin, rout=rout, algorithm=algorithm,
+                                upsample_factor=upsample_factor, init_recon=init_recon, return_recon=True)
+            self.align_recon = (key, recon) if warm else None
+            #the engine returns how far each projection is displaced, shift it back
+            sx, sy = -sx, -sy
+        else:
+            prj, sx, sy, conv = tomopy.align_joint(prj, thetas, iters=iters, pad=pad,
+                                blur=blur_bool, rin=rin, rout=rout, center=center, algorithm=algorithm,
+                                upsample_factor=upsample_factor, save=save_bool, debug=debug_bool)
         x_shifts = np.round(sx,2)
         y_shifts = np.round(sy,2)
 
-        for i in range(num_projections):
-            data = self.shiftProjection(data, x_shifts[i], y_shifts[i], i)
+        data = xrftomo.shift_projections(data, x_shifts, y_shifts)
 
         return x_shifts, y_shifts, data
-    def sequential_align(self, element, data, thetas, pad, blur_bool, rin, rout, center, algorithm, upsample_factor, save_bool, debug_bool, iters=5):
+    def sequential_align(self, element, data, thetas, pad, blur_bool, rin, rout, center, algorithm, upsample_factor, save_bool, debug_bool, iters=5, pyramid=None, tol=0.1):
         '''
         sequential re-projection algorithm from TomoPy
         Variables
@@ -899,7 +819,12 @@ class SinogramActions(QtWidgets.QWidget):
         thetas: ndarray
             sorted projection angle list
         iters: int
-            number of iterations
+            number of iterations, per level in pyramid mode
+        pyramid: list
+            binning of every pyramid level, coarsest first, e.g. [4, 2, 1].
+            Shifts found on binned stacks start the next level.
+        tol: float
+            pyramid levels stop once no projection moves by more than tol pixels
         '''
         num_projections = data.shape[1]
         x_shifts = np.zeros(num_projections)
@@ -910,14 +835,19 @@ class SinogramActions(QtWidgets.QWidget):
 
         thetas = thetas*np.pi/180
 
-        prj, sx, sy, conv = tomopy.align_seq(prj, thetas, iters=iters, pad=pad,
-                            blur=blur_bool, rin=rin, rout=rout, center=center, algorithm=algorithm,
-                            upsample_factor=upsample_factor, save=save_bool, debug=debug_bool)
+        if pyramid:
+            sx, sy, report = xrftomo.pyramid_align(prj, thetas, pyramid, iters, tol, center, pad, mode="seq",
+                                blur=blur_bool, rin=rin, rout=rout, algorithm=algorithm,
+                                upsample_factor=upsample_factor)
+            sx, sy = -sx, -sy
+        else:
+            prj, sx, sy, conv = tomopy.align_seq(prj, thetas, iters=iters, pad=pad,
+                                blur=blur_bool, rin=rin, rout=rout, center=center, algorithm=algorithm,
+                                upsample_factor=upsample_factor, save=save_bool, debug=debug_bool)
         x_shifts = np.round(sx,2)
         y_shifts = np.round(sy,2)
 
-        for i in range(num_projections):
-            data = self.shiftProjection(data, x_shifts[i], y_shifts[i], i)
+        data = xrftomo.shift_projections(data, x_shifts, y_shifts)
 
         return x_shifts, y_shifts, data
 
@@ -927,7 +857,7 @@ class SinogramActions(QtWidgets.QWidget):
             file = np.load(fileName[0])
             x_shifts = np.array([eval(item) for item in file[1]])
             y_shifts = np.array([eval(item) for item in file[2]])
-            datacopy = np.zeros(data.shape)
+            datacopy = np.zeros(data.shape, dtype=data.dtype)
             datacopy[...] = data[...]
             data[np.isnan(data)] = 1
             data = self.shift_all(data, x_shifts, y_shifts)
@@ -949,7 +879,7 @@ class SinogramActions(QtWidgets.QWidget):
             fnames = []
             file = open(fileName[0], 'r')
             read = file.readlines()
-            datacopy = np.zeros(data.shape)
+            datacopy = np.zeros(data.shape, dtype=data.dtype)
             datacopy[...] = data[...]
             data[np.isnan(data)] = 1
             num_projections = data.shape[1]
@@ -1010,14 +940,12 @@ class SinogramActions(QtWidgets.QWidget):
         return
 
 
-    def subpixshift_data(self,data,x_shifts,y_shifts):
+    def subpixshift_data(self,data,x_shifts,y_shifts, mode = None):
         dim = len(data.shape)
         if dim > 4:
             print("ERR: array dimensions too big, expected dim <=4")
         if dim == 4:
-            for i in range(data.shape[0]):
-                for j in range(data.shape[1]):
-                    data[i,j] = scipy.ndimage.shift(data[i,j], (-y_shifts[j], x_shifts[j]), output=None, order=3, mode='wrap', cval=0.0, prefilter=True)
+            data = self.shift_all(data, x_shifts, y_shifts, mode)
         return data
 
 
@@ -1198,13 +1126,15 @@ class SinogramActions(QtWidgets.QWidget):
         num_projections = data.shape[1]
         y_shifts = np.zeros(num_projections)
         x_shifts = np.zeros(num_projections)
+        applied_x = np.zeros(num_projections)
+        applied_y = np.zeros(num_projections)
         for j in range(num_projections):
 
             if hs_x_pos[j] != 0 and hs_y_pos[j] != 0:
                 yyshift = int(round(y_size//2 - hotSpotY[j] - hs_y_pos[j] + hs_y_pos[firstPosOfHotSpot]))
                 xxshift = int(round(x_size//2 - hotSpotX[j] - hs_x_pos[j] + hs_x_pos[firstPosOfHotSpot]))
-                # data[:, j, :, :] = np.roll(np.roll(data[:, j, :, :], xxshift, axis=2), yyshift, axis=1)
-                data = self.shiftProjection(data, xxshift,yyshift,j)
+                applied_x[j] = xxshift
+                applied_y[j] = yyshift
             if hs_x_pos[j] == 0:
                 xxshift = 0
             if hs_y_pos[j] == 0:
@@ -1213,6 +1143,7 @@ class SinogramActions(QtWidgets.QWidget):
             x_shifts[j] = xxshift
             y_shifts[j] = yyshift
 
+        data = xrftomo.shift_projections(data, applied_x, applied_y)
         print("align done")
         return data, x_shifts, y_shifts
 
@@ -1278,8 +1209,7 @@ class SinogramActions(QtWidgets.QWidget):
         ## yfit
         for i in hotspotProj:
             y_shifts[i] = int(hotspotYPos[hotspotProj[0]]) - int(hotspotYPos[i])
-            # data[:, i] = np.roll(data[:, i], y_shifts[i], axis=1)
-            data = self.shiftProjection(data, 0,y_shifts[i],i)
+        data = xrftomo.shift_projections(data, 0, y_shifts[hotspotProj], hotspotProj)
 
         #update reconstruction slider value
         # self.recon.sld.setValue(self.centers[2])
@@ -1314,17 +1244,18 @@ class SinogramActions(QtWidgets.QWidget):
         hs_x_pos, hs_y_pos, firstPosOfHotSpot, hotSpotX, hotSpotY, data = self.alignment_parameters(element, x_size, y_size, hs_group, self.posMat, data)
         num_projections = data.shape[1]
         y_shifts = np.zeros(num_projections)
+        applied_y = np.zeros(num_projections)
         for j in range(num_projections):
             if hs_x_pos[j] != 0 and hs_y_pos[j] != 0:
                 yyshift = int(round(y_size//2 - hotSpotY[j] - hs_y_pos[j] + hs_y_pos[firstPosOfHotSpot]))
-                # data[:, j] = np.roll(data[:, j], yyshift, axis=1)
-                data = self.shiftProjection(data,0, yyshift,j)
+                applied_y[j] = yyshift
 
             if hs_y_pos[j] == 0:
                 yyshift = 0
 
             y_shifts[j] = -yyshift
 
+        data = xrftomo.shift_projections(data, 0, applied_y)
         print("align done")
 
         return data, y_shifts
@@ -1408,11 +1339,8 @@ class SinogramActions(QtWidgets.QWidget):
         j = 0
         for i in hotspotProj:
             self.x_shifts[i] += int(self.centerOfMassDiff[j])
-
-            # data[:, i] = np.roll(data[:, i], int(round(self.x_shifts[i])), axis=2)
-
-            data = self.shiftProjection(data, self.x_shifts[i],0,i)
             j += 1
+        data = xrftomo.shift_projections(data, np.asarray(self.x_shifts)[hotspotProj], 0, hotspotProj)
 
       #set some label to be show that the alignment has completed. perhaps print this in a logbox
 
@@ -156,6 +156,22 @@ class SinogramControlsWidget(QtWidgets.QWidget):
         self.debug_checkbox.setChecked(True)
         self.debug_checkbox.setFixedWidth(button2size)
 
+        self.pyramid_checkbox = QtWidgets.QCheckBox("pyramid")
+        self.pyramid_checkbox.setChecked(False)
+        self.pyramid_checkbox.setFixedWidth(button2size)
+        self.pyramid_textbox = QtWidgets.QLineEdit("4,2,1")
+        self.pyramid_textbox.setFixedWidth(button2size)
+
+        tol_label = QtWidgets.QLabel("tolerance")
+        tol_label.setFixedWidth(button2size)
+        self.pyramid_tol_textbox = QtWidgets.QLineEdit("0.1")
+        self.pyramid_tol_textbox.setFixedWidth(button2size)
+
+        self.warm_checkbox = QtWidgets.QCheckBox("warm start")
+        self.warm_checkbox.setChecked(False)
+        self.warm_checkbox.setFixedWidth(button2size)
+        self.warm_checkbox.setToolTip("joint alignment starts from the reconstruction of the last joint alignment")
+
         self.run_alignmnet = QtWidgets.QPushButton("run alignment")
         self.run_alignmnet.setFixedWidth(button1size)
 
@@ -193,6 +209,14 @@ class SinogramControlsWidget(QtWidgets.QWidget):
         hb07.addWidget(self.joint_btn)
         hb07.addWidget(self.seq_btn)
 
+        hb08 = QtWidgets.QHBoxLayout()
+        hb08.addWidget(self.pyramid_checkbox)
+        hb08.addWidget(self.pyramid_textbox)
+
+        hb09 = QtWidgets.QHBoxLayout()
+        hb09.addWidget(tol_label)
+        hb09.addWidget(self.pyramid_tol_textbox)
+
         vb00 = QtWidgets.QVBoxLayout()
         vb00.addLayout(hb00)
         vb00.addLayout(hb01)
@@ -205,6 +229,9 @@ class SinogramControlsWidget(QtWidgets.QWidget):
         vb00.addWidget(self.debug_checkbox)
         vb00.addLayout(hb06)
         vb00.addLayout(hb07)
+        vb00.addLayout(hb08)
+        vb00.addLayout(hb09)
+        vb00.addWidget(self.warm_checkbox)
         vb00.addWidget(self.run_alignmnet)
 
         #parameter setting logic